@@ -0,0 +1,351 @@
+import ast
+import asyncio
+import builtins
+import io
+import os
+import sys
+import threading
+import uuid
+import contextvars
+from multiprocessing import Pipe, Process
+
+from .artifacts import load_artifact
+from .metrics import AGENT_SPAWN_SECONDS
+
+# Calls that block the shared event loop and therefore make code unfit for hosting
+BLOCKING_CALLS = {("time", "sleep"), ("os", "fork"), ("os", "system"), ("subprocess", "run"), ("subprocess", "call")}
+
+_current_agent = contextvars.ContextVar("hosted_agent", default=None)
+
+
+def _is_main_guard(node) -> bool:
+    return (
+        isinstance(node, ast.If) and isinstance(node.test, ast.Compare)
+        and isinstance(node.test.left, ast.Name) and node.test.left.id == "__name__"
+        and any(isinstance(c, ast.Constant) and c.value == "__main__" for c in node.test.comparators)
+    )
+
+
+def _import_time_nodes(tree: ast.Module):
+    """Nodes that run when the module is executed: outside function bodies and the __main__ guard."""
+    stack = [node for node in tree.body if not _is_main_guard(node)]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            continue
+        yield node
+        stack.extend(ast.iter_child_nodes(node))
+
+
+def is_host_compatible(code: str) -> tuple[bool, str | None]:
+    """Checks that agent code can share an event loop with other agents."""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return False, f"syntax error: {e}"
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            target = node.func.value
+            if isinstance(target, ast.Name) and (target.id, node.func.attr) in BLOCKING_CALLS:
+                return False, f"blocking call {target.id}.{node.func.attr}() at line {node.lineno}"
+    # agent.run() / asyncio.run() at import time would own the host's loop; hosts drive agents via run_async()
+    for node in _import_time_nodes(tree):
+        if (
+            isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "run" and isinstance(node.func.value, ast.Name)
+        ):
+            return False, (
+                f"{node.func.value.id}.run() at line {node.lineno} runs at import; "
+                f"put it under if __name__ == \"__main__\":"
+            )
+    return True, None
+
+
+class _AgentStream(io.TextIOBase):
+    """stdout/stderr replacement that tags output with the hosted agent it came from."""
+
+    def __init__(self, host_id: str, stream):
+        self.host_id = host_id
+        self.stream = stream
+        self._partial: dict[str, str] = {}
+
+    def write(self, data):
+        agent_id = _current_agent.get()
+        if not agent_id:
+            self.stream.write(data)
+            return len(data)
+        # Buffer per agent until a full line is available so output never interleaves
+        buffered = self._partial.pop(agent_id, "") + data
+        *lines, rest = buffered.split("\n")
+        if rest:
+            self._partial[agent_id] = rest
+        if lines:
+            self.stream.write("".join(f"[{agent_id}] {line}\n" for line in lines))
+        return len(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class _HostedAgent:
+    def __init__(self, agent_id: str, namespace: dict, task: asyncio.Task | None):
+        self.agent_id = agent_id
+        self.namespace = namespace
+        self.task = task
+
+
+def host_runner(host_id: str, conn):
+    """
+    Entry point of a host process: runs many agents on one asyncio loop.
+
+    Each agent is executed in its own globals dict (with a `__name__` other
+    than "__main__", so the generated `agent.run()` guard does not fire) and
+    its uagents `Agent` is driven through `run_async()` on the shared loop.
+    """
+    sys.stdout = _AgentStream(host_id, sys.stdout)
+    sys.stderr = _AgentStream(host_id, sys.stderr)
+    hosted: dict[str, _HostedAgent] = {}
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    def add(agent_id: str, spec: dict):
+        if agent_id in hosted:
+            remove(agent_id)
+        if spec.get("artifact"):
+            code = load_artifact(spec["artifact"])
+        else:
+            code = compile(spec["code"], f"<agent {agent_id}>", "exec")
+        namespace = {
+            "__name__": f"__hosted_{agent_id.replace('-', '_')}__",
+            "__builtins__": builtins,
+            "__agent_port__": spec.get("port"),
+        }
+        token = _current_agent.set(agent_id)
+        try:
+            exec(code, namespace)
+        finally:
+            _current_agent.reset(token)
+        agent = namespace.get("agent")
+        task = None
+        if agent is not None and hasattr(agent, "run_async"):
+            ctx = contextvars.copy_context()
+            ctx.run(_current_agent.set, agent_id)
+            task = loop.create_task(agent.run_async(), context=ctx)
+        hosted[agent_id] = _HostedAgent(agent_id, namespace, task)
+
+    def remove(agent_id: str) -> bool:
+        entry = hosted.pop(agent_id, None)
+        if not entry:
+            return False
+        if entry.task:
+            entry.task.cancel()
+        bars = entry.namespace.get("bars")
+        if hasattr(bars, "flush"):
+            # The prelude's persister thread would die with the host and drop the bars it still holds
+            bars.flush()
+        entry.namespace.clear()
+        return True
+
+    def handle_command():
+        try:
+            command, *args = conn.recv()
+        except EOFError:
+            loop.stop()
+            return
+        try:
+            if command == "add":
+                add(*args)
+                reply = ("ok", None)
+            elif command == "remove":
+                reply = ("ok", remove(*args))
+            elif command == "list":
+                reply = ("ok", sorted(hosted))
+            elif command == "stop":
+                for agent_id in list(hosted):
+                    remove(agent_id)
+                conn.send(("ok", None))
+                loop.stop()
+                return
+            else:
+                reply = ("error", f"unknown command {command}")
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        conn.send(reply)
+
+    loop.add_reader(conn.fileno(), handle_command)
+    try:
+        loop.run_forever()
+        pending = asyncio.all_tasks(loop)
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+    finally:
+        loop.close()
+
+
+class AgentHost:
+    """Parent-side handle to one host process."""
+
+    def __init__(self, host_id: str, capacity: int):
+        self.host_id = host_id
+        self.capacity = capacity
+        self.agents: dict[str, dict] = {}  # agent_id -> spec ({"code"|"artifact", "port"}) currently hosted
+        self._lock = threading.Lock()
+        self._conn, child_conn = Pipe()
+        self.process = Process(target=host_runner, args=(host_id, child_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def free_slots(self) -> int:
+        return self.capacity - len(self.agents)
+
+    def request(self, *command, timeout: float = 30.0):
+        with self._lock:
+            self._conn.send(command)
+            if not self._conn.poll(timeout):
+                raise TimeoutError(f"Host {self.host_id} did not answer {command[0]!r}")
+            status, value = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(value)
+        return value
+
+    def add(self, agent_id: str, spec: dict):
+        self.request("add", agent_id, spec)
+        self.agents[agent_id] = spec
+
+    def remove(self, agent_id: str) -> bool:
+        self.agents.pop(agent_id, None)
+        return self.request("remove", agent_id)
+
+    def stop(self, timeout: float = 5.0):
+        try:
+            self.request("stop", timeout=timeout)
+        except Exception:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+class AgentHostPool:
+    """Packs shared-mode agents into a bounded number of host processes."""
+
+    def __init__(self, capacity: int = int(os.environ.get("AGENT_HOST_CAPACITY", "50"))):
+        self.capacity = capacity
+        self.hosts: dict[str, AgentHost] = {}
+        self.placement: dict[str, str] = {}  # agent_id -> host_id
+        self._lock = threading.Lock()
+        # Callbacks(host) so the supervisor can watch hosts and ignore planned exits
+        self.on_host_started = None
+        self.on_host_stopped = None
+
+    def _new_host(self) -> AgentHost:
+        with AGENT_SPAWN_SECONDS.labels("host").time():
+            host = AgentHost(f"host-{uuid.uuid4().hex[:8]}", self.capacity)
+        self.hosts[host.host_id] = host
+        if self.on_host_started:
+            self.on_host_started(host)
+        return host
+
+    def _retire(self, host: AgentHost):
+        if self.on_host_stopped:
+            self.on_host_stopped(host)
+        host.stop()
+        self.hosts.pop(host.host_id, None)
+
+    def _pick_host(self, exclude: str = None) -> AgentHost:
+        candidates = [h for h in self.hosts.values() if h.host_id != exclude and h.free_slots > 0]
+        if not candidates:
+            return self._new_host()
+        # Fill the fullest host first so hosts can be drained and stopped
+        return min(candidates, key=lambda h: h.free_slots)
+
+    def place(self, agent_id: str, code: str = None, artifact: str = None, port: int = None, host_id: str = None) -> str:
+        """Hosts an agent from source code or a compiled artifact (see cogs/artifacts.py)."""
+        spec = {"code": code, "artifact": artifact, "port": port}
+        with self._lock:
+            self._remove_locked(agent_id)
+            host = self.hosts.get(host_id) if host_id else self._pick_host()
+            if host is None:
+                raise KeyError(f"Unknown host {host_id}")
+            host.add(agent_id, spec)
+            self.placement[agent_id] = host.host_id
+            return host.host_id
+
+    def remove(self, agent_id: str) -> bool:
+        with self._lock:
+            return self._remove_locked(agent_id)
+
+    def _remove_locked(self, agent_id: str) -> bool:
+        host_id = self.placement.pop(agent_id, None)
+        host = self.hosts.get(host_id)
+        if not host:
+            return False
+        host.remove(agent_id)
+        if not host.agents:
+            self._retire(host)
+        return True
+
+    def migrate(self, agent_id: str, target_host_id: str = None) -> str:
+        """Moves a hosted agent to another host (a new one if none has room)."""
+        with self._lock:
+            source_id = self.placement.get(agent_id)
+            source = self.hosts.get(source_id)
+            if not source:
+                raise KeyError(f"Agent {agent_id} is not hosted")
+            spec = source.agents[agent_id]
+            target = self.hosts.get(target_host_id) if target_host_id else self._pick_host(exclude=source_id)
+            if target is None or target.host_id == source_id:
+                raise KeyError(f"Invalid migration target {target_host_id}")
+            # Stop it on the source first: the target binds the same port and agent identity
+            source.remove(agent_id)
+            try:
+                target.add(agent_id, spec)
+            except Exception:
+                source.add(agent_id, spec)
+                if not target.agents:
+                    self._retire(target)
+                raise
+            self.placement[agent_id] = target.host_id
+            if not source.agents:
+                self._retire(source)
+            return target.host_id
+
+    def host_of(self, agent_id: str) -> str | None:
+        return self.placement.get(agent_id)
+
+    def respawn(self, host_id: str):
+        """Recreates a crashed host and re-adds the agents that lived on it."""
+        with self._lock:
+            old = self.hosts.pop(host_id, None)
+            if not old:
+                return
+            host = self._new_host()
+            for agent_id, spec in old.agents.items():
+                try:
+                    host.add(agent_id, spec)
+                    self.placement[agent_id] = host.host_id
+                except Exception as e:
+                    print(f"Failed to re-host agent {agent_id}: {e}")
+                    self.placement.pop(agent_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "hosts": {
+                host_id: {"pid": host.pid, "agents": sorted(host.agents), "free_slots": host.free_slots}
+                for host_id, host in self.hosts.items()
+            },
+            "hosted_agents": len(self.placement),
+        }
+
+    def shutdown(self):
+        with self._lock:
+            for host in list(self.hosts.values()):
+                self._retire(host)
+            self.placement.clear()
@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# Reload cached records at least this often so updates and deletes made by other API workers show up
+RECORD_MAX_AGE_S = 5.0
+
+
+@dataclass(slots=True)
+class AgentRuntime:
+    """In-memory state of an agent that has been started at least once."""
+    agent_id: str
+    status: str = "stopped"
+    process: object = None
+    queue: object = None
+
+
+class AgentRegistry:
+    """
+    Runtime state for agents that have run, plus a bounded LRU of full agent
+    records (code and metadata) loaded from the database on demand.
+
+    Nothing is read at startup, so catalog size does not affect startup time
+    or memory; only agents that are touched get cached. Writes through this
+    worker update the cache directly; a cached record older than `max_age`
+    is reloaded, which bounds how long another worker's write goes unseen.
+    """
+
+    def __init__(self, db, cache_size: int = 1024, max_age: float = RECORD_MAX_AGE_S):
+        self.db = db
+        self.cache_size = cache_size
+        self.max_age = max_age
+        self.runtime: dict[str, AgentRuntime] = {}
+        # agent_id -> (record, loaded_at)
+        self._records: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, agent_id: str) -> dict | None:
+        """Returns the stored agent row (shared, do not mutate) or None if it does not exist."""
+        with self._lock:
+            cached = self._records.get(agent_id)
+            if cached is not None and time.monotonic() - cached[1] < self.max_age:
+                self._records.move_to_end(agent_id)
+                self.hits += 1
+                return cached[0]
+        record = self.db.get_agent(agent_id)
+        with self._lock:
+            self.misses += 1
+            if record is not None:
+                self._put_locked(agent_id, record)
+            else:
+                # Deleted by another worker
+                self._records.pop(agent_id, None)
+        return record
+
+    def exists(self, agent_id: str) -> bool:
+        return agent_id in self.runtime or self.record(agent_id) is not None
+
+    def runtime_of(self, agent_id: str, create: bool = False) -> AgentRuntime | None:
+        runtime = self.runtime.get(agent_id)
+        if runtime is None and create:
+            runtime = self.runtime.setdefault(agent_id, AgentRuntime(agent_id))
+        return runtime
+
+    def status(self, agent_id: str) -> str:
+        runtime = self.runtime.get(agent_id)
+        return runtime.status if runtime else "stopped"
+
+    def add(self, agent_id: str, record: dict):
+        with self._lock:
+            self._put_locked(agent_id, record)
+
+    def update(self, agent_id: str, **fields):
+        """Applies a write that already went to the database to the cached copy."""
+        with self._lock:
+            cached = self._records.get(agent_id)
+            if cached is not None:
+                self._records[agent_id] = ({**cached[0], **fields}, cached[1])
+
+    def remove(self, agent_id: str):
+        with self._lock:
+            self._records.pop(agent_id, None)
+        self.runtime.pop(agent_id, None)
+
+    def _put_locked(self, agent_id: str, record: dict):
+        self._records[agent_id] = (record, time.monotonic())
+        self._records.move_to_end(agent_id)
+        while len(self._records) > self.cache_size:
+            self._records.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "runtime_entries": len(self.runtime),
+            "cached_records": len(self._records),
+            "cache_size": self.cache_size,
+            "max_age_s": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -1,13 +1,67 @@
-from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from cogs.strategy_manager import StrategyManager
-from fastapi.responses import JSONResponse
+from cogs.code_compiler import CodeCompileError
+from cogs.catalog_cache import CachedBody, body_etag, etag_matches
+from cogs.compression import MINIMUM_SIZE, choose_encoding
+from cogs.fast_json import FastJSONResponse, dumps
+from cogs.shared_state import FORWARDED_HEADER, forward_request
+from cogs.spawn_scheduler import AdmissionRejected
+from cogs.subsystems import SUBSYSTEMS, lazy
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+# Built by the app lifespan's warm-up, or by the first request that needs it
+manager = lazy("manager", StrategyManager)
+# More threads than this only queue behind the spawn scheduler's in-flight limit
+MAX_PARALLELISM = 64
+
+
+async def manager_built():
+    """Waits for the manager on a worker thread, so touching `manager` in a route never blocks the event loop."""
+    subsystem = SUBSYSTEMS["manager"]
+    if subsystem.state != "ready":
+        await run_in_threadpool(subsystem.get)
+
+
+router = APIRouter(dependencies=[Depends(manager_built)])
+
+
+async def forward_to_owner(request: Request, agent_id: str) -> Response | None:
+    """
+    If another worker holds the agent's lease, replays the request there and
+    returns its response. Returns None when this worker should handle it.
+    """
+    if request.headers.get(FORWARDED_HEADER):
+        return None
+    owner = await run_in_threadpool(manager.shared.foreign_owner, agent_id)
+    if not owner:
+        return None
+    if not owner.get("endpoint"):
+        raise HTTPException(status_code=409, detail=f"Agent is running on worker {owner['owner']}")
+    body = await request.body()
+    status_code, headers, content = await run_in_threadpool(
+        forward_request, owner["endpoint"], request.method, request.url.path, request.url.query, body, manager.shared.owner
+    )
+    return Response(content=content, status_code=status_code, media_type=headers.get("Content-Type"))
+
+
+def too_busy(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def admitted(future):
+    """Waits for a queued start/deploy without holding the event loop; 429 if it was not admitted."""
+    try:
+        return await asyncio.wrap_future(future)
+    except AdmissionRejected as e:
+        raise too_busy(e)
 
-router = APIRouter()
-manager = StrategyManager()
 
 # Model for agent creation (all fields)
-from typing import Optional
+from typing import List, Optional
 class AgentCode(BaseModel):
     code: str
     agentverse_id: Optional[str] = None
@@ -27,10 +81,69 @@ class AgentCode(BaseModel):
     summary: Optional[str] = None
     description: Optional[str] = None
     type: Optional[str] = None
+    # Supervisor restart policy: "never", "on-failure" or "always"
+    restart_policy: Optional[str] = "never"
+    max_restarts: Optional[int] = 5
+    # Resource limits applied when the agent process is spawned
+    mem_limit_mb: Optional[int] = None
+    cpu_limit_s: Optional[int] = None
+    nice: Optional[int] = None
+    cpu_affinity: Optional[str] = None
+    # "process" (own interpreter) or "shared" (packed into a host process on deploy)
+    hosting: Optional[str] = "process"
+    # {"fn": "producer_agent_id"} or {"fn": {"agent_id": "...", "args": "arg_name"}}
+    function_agent_mapping: Optional[dict | str] = None
+    # "ignore" or "stop": whether stopping one of this agent's producers also stops it
+    on_producer_stop: Optional[str] = "ignore"
 
 class ReputationUpdate(BaseModel):
     reputation: int
 
+class RatingSubmit(BaseModel):
+    rating: float = Field(ge=1, le=5)
+
+class AgentLimits(BaseModel):
+    mem_limit_mb: Optional[int] = None
+    cpu_limit_s: Optional[int] = None
+    nice: Optional[int] = None
+    cpu_affinity: Optional[str] = None
+
+class ThrottleRequest(BaseModel):
+    nice: int
+
+class PortReservation(BaseModel):
+    start: int
+    end: int
+    reason: Optional[str] = None
+
+class BacktestRequest(BaseModel):
+    # Producer whose history is replayed; defaults to the first mapped producer
+    data_agent_id: Optional[str] = None
+    arguments: Optional[str] = None
+    params: Optional[dict] = None
+    fee_bps: float = 10.0
+    start: Optional[float] = None
+    end: Optional[float] = None
+    write_perf: bool = True
+
+class GraphRunRequest(BaseModel):
+    agent_ids: List[str]
+    # Also start/deploy every (transitive) producer of agent_ids
+    include_upstream: bool = True
+    parallelism: int = Field(16, ge=1, le=MAX_PARALLELISM)
+
+class BulkFilter(BaseModel):
+    search: Optional[str] = None
+    type: Optional[str] = None
+    creator: Optional[str] = None
+    status: Optional[str] = None
+
+class BulkRequest(BaseModel):
+    agent_ids: Optional[List[str]] = None
+    filter: Optional[BulkFilter] = None
+    parallelism: int = Field(16, ge=1, le=MAX_PARALLELISM)
+    timeout: float = 10.0
+
 
 # Handle preflight OPTIONS request
 @router.options("/")
@@ -39,101 +152,300 @@ async def options_agents():
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_agent(payload: AgentCode):
-    agent_id = manager.create_agent(
-        code=payload.code,
-        agentverse_id=payload.agentverse_id,
-        # New strategy parameters
-        risk=payload.risk,
-        assetClass=payload.assetClass,
-        time=payload.time,
-        currentStateOfMarket=payload.currentStateOfMarket,
-        interest=payload.interest,
-        perf=payload.perf or 0,
-        isNew=payload.isNew or False,
-        reputation=payload.reputation or 0,
-        # Old parameters (kept as requested)
-        name=payload.name,
-        creator=payload.creator,
-        title=payload.title,
-        summary=payload.summary,
-        description=payload.description,
-        type=payload.type,
-    )
+    try:
+        agent_id = await run_in_threadpool(
+            manager.create_agent,
+            code=payload.code,
+            agentverse_id=payload.agentverse_id,
+            # New strategy parameters
+            risk=payload.risk,
+            assetClass=payload.assetClass,
+            time=payload.time,
+            currentStateOfMarket=payload.currentStateOfMarket,
+            interest=payload.interest,
+            perf=payload.perf or 0,
+            isNew=payload.isNew or False,
+            reputation=payload.reputation or 0,
+            # Old parameters (kept as requested)
+            name=payload.name,
+            creator=payload.creator,
+            title=payload.title,
+            summary=payload.summary,
+            description=payload.description,
+            type=payload.type,
+            restart_policy=payload.restart_policy or "never",
+            max_restarts=payload.max_restarts if payload.max_restarts is not None else 5,
+            mem_limit_mb=payload.mem_limit_mb,
+            cpu_limit_s=payload.cpu_limit_s,
+            nice=payload.nice,
+            cpu_affinity=payload.cpu_affinity,
+            hosting=payload.hosting or "process",
+            function_agent_mapping=payload.function_agent_mapping,
+            on_producer_stop=payload.on_producer_stop or "ignore",
+        )
+    except CodeCompileError as e:
+        raise HTTPException(status_code=400, detail={"message": "Agent code does not compile", "errors": e.errors})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"agent_id": agent_id, "message": "Agent created"}
 
 
+def cached_response(request: Request, body: bytes, etag: str, cached: CachedBody = None) -> Response:
+    """Serves pre-serialized JSON with an ETag; 304 when the client's If-None-Match still matches."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if cached is not None and encoding and len(body) >= MINIMUM_SIZE:
+        # Compressed once per catalog version instead of by the middleware on every poll
+        headers.update({"ETag": f"W/{etag}", "Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+        return Response(content=cached.encoded(encoding), media_type="application/json", headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/")
-async def list_agents(search: str = None, type: str = None):
-    agents = manager.list_agents(search=search, type = type)
-    return {"agents": agents}
+async def list_agents(request: Request, search: str = None, type: str = None):
+    cached = await run_in_threadpool(manager.catalog_listing, search, type)
+    return cached_response(request, cached.body, cached.etag, cached)
 # Add search endpoint (alias for list with search param)
 @router.get("/search")
-async def search_agents(q: str):
-    agents = manager.list_agents(search=q)
-    return {"agents": agents}
+async def search_agents(request: Request, q: str):
+    cached = await run_in_threadpool(manager.catalog_listing, q)
+    return cached_response(request, cached.body, cached.etag, cached)
+
+@router.get("/catalog/stats")
+def catalog_stats():
+    return manager.catalog.stats()
+
+@router.get("/supervisor")
+def supervisor_stats():
+    return manager.supervisor.stats()
+
+@router.get("/hosts")
+def host_stats():
+    return manager.hosts.stats()
+
+@router.get("/spawns")
+def spawn_stats():
+    """Admission queue depth, wait times and limits for start/deploy."""
+    return manager.spawns.stats()
+
+@router.post("/bulk/{action}")
+async def bulk_action(action: str, payload: BulkRequest):
+    if action not in ("start", "stop", "deploy", "restart"):
+        raise HTTPException(status_code=404, detail=f"Unknown bulk action {action}")
+    if payload.agent_ids is None and payload.filter is None:
+        raise HTTPException(status_code=400, detail="Provide agent_ids or a filter")
+    filters = payload.filter.model_dump(exclude_none=True) if payload.filter else {}
+    agent_ids = await run_in_threadpool(manager.resolve_agent_ids, payload.agent_ids, filters)
+
+    if action == "stop":
+        results = manager.bulk_stop(agent_ids, timeout=payload.timeout)
+    elif action == "restart":
+        results = manager.bulk_restart(agent_ids, parallelism=payload.parallelism, timeout=payload.timeout)
+    else:
+        results = manager.bulk_run(action, agent_ids, parallelism=payload.parallelism)
+
+    # One JSON object per line, sent as each agent finishes
+    def stream():
+        for result in results:
+            yield json.dumps({"action": action, **result}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.get("/ratings")
+async def get_ratings(agent_ids: Optional[str] = None):
+    """On-chain rating totals for every agent (or a comma-separated agent_ids list) in one call."""
+    ids = [a for a in agent_ids.split(",") if a] if agent_ids else None
+    return await run_in_threadpool(manager.get_ratings, ids)
+
+@router.get("/graph")
+async def dependency_graph():
+    graph = await run_in_threadpool(manager.dependency_graph)
+    return FastJSONResponse(graph.to_dict())
+
+@router.post("/graph/{action}")
+async def run_graph(action: str, payload: GraphRunRequest):
+    if action not in ("start", "deploy"):
+        raise HTTPException(status_code=404, detail=f"Unknown graph action {action}")
+    results = manager.run_graph(action, payload.agent_ids, payload.include_upstream, payload.parallelism)
+
+    # Levels run one after another; results stream as NDJSON like /bulk
+    def stream():
+        try:
+            for result in results:
+                yield json.dumps({"action": action, **result}) + "\n"
+        except ValueError as e:
+            yield json.dumps({"action": action, "ok": False, "error": str(e)}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.get("/ports")
+async def port_stats():
+    return await run_in_threadpool(manager.ports.stats)
+
+@router.post("/ports/reservations", status_code=status.HTTP_201_CREATED)
+async def reserve_ports(payload: PortReservation):
+    if payload.start > payload.end:
+        raise HTTPException(status_code=400, detail="start must not be greater than end")
+    await run_in_threadpool(manager.ports.reserve, payload.start, payload.end, payload.reason)
+    return await run_in_threadpool(manager.ports.stats)
+
+@router.get("/stats")
+def aggregate_stats(top: int = 10):
+    return manager.monitor.aggregate(top=top)
 # Add endpoint to update reputation/reactions
 @router.post("/{agent_id}/reputation")
 async def update_reputation(agent_id: str, payload: ReputationUpdate):
-    if not manager.update_reputation(agent_id, payload.reputation):
+    if not await run_in_threadpool(manager.update_reputation, agent_id, payload.reputation):
         raise HTTPException(status_code=404, detail="Agent not found")
     return {"agent_id": agent_id, "reputation": payload.reputation, "message": "Reputation updated"}
 
+@router.post("/{agent_id}/rating")
+async def rate_agent(agent_id: str, payload: RatingSubmit):
+    result = await run_in_threadpool(manager.rate_agent, agent_id, payload.rating)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return {"agent_id": agent_id, **result}
+
 
 @router.get("/{agent_id}")
-async def get_agent(agent_id: str):
-    details = manager.get_agent(agent_id)
+async def get_agent(request: Request, agent_id: str):
+    details = await run_in_threadpool(manager.get_agent, agent_id)
     if not details:
         raise HTTPException(status_code=404, detail="Agent not found")
-    return details
+    # Includes live runtime state, so only the bytes are validated, not cached
+    body = dumps(details)
+    return cached_response(request, body, body_etag(body))
 
 
 @router.put("/{agent_id}")
-async def update_agent(agent_id: str, payload: AgentCode):
-    if not manager.update_agent_code(agent_id, payload.code):
+async def update_agent(request: Request, agent_id: str, payload: AgentCode):
+    if forwarded := await forward_to_owner(request, agent_id):
+        return forwarded
+    try:
+        updated = await run_in_threadpool(manager.update_agent_code, agent_id, payload.code, payload.function_agent_mapping)
+    except CodeCompileError as e:
+        raise HTTPException(status_code=400, detail={"message": "Agent code does not compile", "errors": e.errors})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not updated:
         raise HTTPException(status_code=404, detail="Agent not found")
     return {"agent_id": agent_id, "message": "Agent updated (stopped if running)"}
 
 
 @router.delete("/{agent_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_agent(agent_id: str):
-    if not manager.delete_agent(agent_id):
+async def delete_agent(request: Request, agent_id: str):
+    if forwarded := await forward_to_owner(request, agent_id):
+        return forwarded
+    if not await run_in_threadpool(manager.delete_agent, agent_id):
         raise HTTPException(status_code=404, detail="Agent not found")
 
 
 @router.post("/{agent_id}/start")
-async def start_agent(agent_id: str):
-    if not manager.start_agent(agent_id):
+async def start_agent(request: Request, agent_id: str):
+    if forwarded := await forward_to_owner(request, agent_id):
+        return forwarded
+    if not await admitted(await run_in_threadpool(manager.request_start, agent_id)):
         raise HTTPException(status_code=409, detail="Agent not found or already running")
     return {"agent_id": agent_id, "message": "Agent started"}
 
 
 @router.post("/{agent_id}/stop")
-async def stop_agent(agent_id: str):
-    if not manager.stop_agent(agent_id):
+async def stop_agent(request: Request, agent_id: str, propagate: str = "policy"):
+    """propagate: "policy" (consumers' on_producer_stop), "all" or "none"."""
+    if forwarded := await forward_to_owner(request, agent_id):
+        return forwarded
+    if propagate not in ("policy", "all", "none"):
+        raise HTTPException(status_code=400, detail="propagate must be policy, all or none")
+    results = await run_in_threadpool(manager.stop_with_dependents, agent_id, propagate)
+    own = next((r for r in results if r["agent_id"] == agent_id), None)
+    if not own or not own["ok"]:
         raise HTTPException(status_code=409, detail="Agent not found or already stopped")
-    return {"agent_id": agent_id, "message": "Agent stopped"}
+    dependents = [r["agent_id"] for r in results if r["agent_id"] != agent_id and r["ok"]]
+    return {"agent_id": agent_id, "message": "Agent stopped", "stopped_dependents": dependents}
 
 
 @router.get("/{agent_id}/logs")
-async def get_logs(agent_id: str):
-    logs = manager.get_logs(agent_id)
+async def get_logs(request: Request, agent_id: str):
+    if forwarded := await forward_to_owner(request, agent_id):
+        return forwarded
+    logs = await run_in_threadpool(manager.get_logs, agent_id)
     if logs is None:
         raise HTTPException(status_code=404, detail="Agent not found or not running")
     return {"agent_id": agent_id, "logs": logs}
 
 @router.get("/{agent_id}/address")
-async def get_agent_address(agent_id: str):
-    address = manager.get_agent_address(agent_id)
+async def get_agent_address(request: Request, agent_id: str):
+    if forwarded := await forward_to_owner(request, agent_id):
+        return forwarded
+    try:
+        address = await run_in_threadpool(manager.get_agent_address, agent_id)
+    except AdmissionRejected as e:
+        raise too_busy(e)
     if not address:
         raise HTTPException(status_code=404, detail="Agent address not found in logs")
     return {"agent_id": agent_id, "address": address}
 
 @router.post("/deploy")
-async def deploy_agent(agent_id: str):
-    if not manager.deploy_agent(agent_id):
+async def deploy_agent(request: Request, agent_id: str):
+    if forwarded := await forward_to_owner(request, agent_id):
+        return forwarded
+    if not await admitted(await run_in_threadpool(manager.request_deploy, agent_id)):
         raise HTTPException(status_code=404, detail="Agent Not Found")
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
         content={"agent_id": agent_id, "status": "deployed"}
     )
+
+@router.post("/{agent_id}/backtest")
+async def backtest_agent(agent_id: str, payload: BacktestRequest):
+    try:
+        result = await run_in_threadpool(manager.backtest_agent, agent_id, **payload.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return result
+
+@router.get("/{agent_id}/lineage-metrics")
+async def lineage_metrics(agent_id: str):
+    result = await run_in_threadpool(manager.lineage_metrics, agent_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return FastJSONResponse(result)
+
+@router.get("/{agent_id}/stats")
+async def get_agent_stats(request: Request, agent_id: str):
+    if forwarded := await forward_to_owner(request, agent_id):
+        return forwarded
+    stats = await run_in_threadpool(manager.get_stats, agent_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Agent not found or not running")
+    return {"agent_id": agent_id, "stats": stats}
+
+@router.put("/{agent_id}/limits")
+async def update_agent_limits(agent_id: str, payload: AgentLimits):
+    if not await run_in_threadpool(manager.update_limits, agent_id, **payload.model_dump(exclude_unset=True)):
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return {"agent_id": agent_id, "message": "Limits updated (applied on next start)"}
+
+@router.post("/{agent_id}/throttle")
+async def throttle_agent(request: Request, agent_id: str, payload: ThrottleRequest):
+    if forwarded := await forward_to_owner(request, agent_id):
+        return forwarded
+    if not await run_in_threadpool(manager.throttle_agent, agent_id, payload.nice):
+        raise HTTPException(status_code=404, detail="Agent not found or not running")
+    return {"agent_id": agent_id, "nice": payload.nice, "message": "Agent throttled"}
+
+@router.post("/{agent_id}/migrate")
+async def migrate_agent(request: Request, agent_id: str, host_id: str = None):
+    if forwarded := await forward_to_owner(request, agent_id):
+        return forwarded
+    try:
+        new_host = await run_in_threadpool(manager.migrate_agent, agent_id, host_id)
+    except KeyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not new_host:
+        raise HTTPException(status_code=404, detail="Agent not found or not hosted")
+    return {"agent_id": agent_id, "host_id": new_host, "message": "Agent migrated"}
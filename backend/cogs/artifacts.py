@@ -0,0 +1,74 @@
+import importlib.util
+import marshal
+import os
+import tempfile
+import threading
+
+from .database import DATA_DIR
+
+ARTIFACT_DIR = os.path.join(DATA_DIR, "artifacts")
+
+
+def _atomic_write(path: str, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def load_artifact(pyc_path: str):
+    """Loads the code object from a compiled artifact without re-parsing the source."""
+    with open(pyc_path, "rb") as f:
+        data = f.read()
+    if data[:4] != importlib.util.MAGIC_NUMBER:
+        raise ValueError(f"{pyc_path} was compiled by a different Python version")
+    return marshal.loads(data[16:])
+
+
+class ArtifactStore:
+    """
+    Content-addressed store of generated agent sources and their bytecode.
+
+    An artifact is named after the compiler's content hash of everything that
+    goes into the generated code (except the port, which the generated code
+    reads at runtime), so redeploying an unchanged agent only costs a hash and
+    a stat. The bytecode is written from the already compiled code object, so
+    the generated source is never parsed a second time.
+    """
+
+    def __init__(self, root: str = ARTIFACT_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def paths(self, key: str) -> tuple[str, str]:
+        return os.path.join(self.root, f"{key}.py"), os.path.join(self.root, f"{key}.pyc")
+
+    def get_or_build(self, key: str, compile_agent) -> str:
+        """Returns the .pyc path for key, calling compile_agent() for a CompiledAgent on a miss."""
+        source_path, pyc_path = self.paths(key)
+        if os.path.exists(pyc_path):
+            self.hits += 1
+            return pyc_path
+        with self._lock:
+            if os.path.exists(pyc_path):
+                self.hits += 1
+                return pyc_path
+            self.misses += 1
+            compiled = compile_agent()
+            # The source is kept next to the bytecode for debugging and tracebacks only
+            _atomic_write(source_path, compiled.source.encode())
+            # Unchecked hash-based pyc header (flags=0b11): never revalidated against the .py
+            header = importlib.util.MAGIC_NUMBER + (0b11).to_bytes(4, "little") + bytes.fromhex(compiled.key[:16])
+            _atomic_write(pyc_path, header + marshal.dumps(compiled.code))
+        return pyc_path
+
+    def stats(self) -> dict:
+        return {"root": self.root, "hits": self.hits, "misses": self.misses}
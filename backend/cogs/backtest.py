@@ -0,0 +1,149 @@
+import ast
+import math
+import time
+
+import numpy as np
+
+from .code_compiler import CodeCompileError, load_mappings, parse_agent_code
+
+HISTORY_FIELDS = ("open", "high", "low", "close", "volume", "timestamp")
+# Modules agent code imports for running as an agent; not needed (or available) in a backtest.
+# cogs.indicators stays importable so strategies can reuse the batch indicators.
+SKIPPED_MODULES = ("uagents", "cogs.database", "cogs.bar_channel")
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+
+class BacktestError(ValueError):
+    """Raised when an agent cannot be backtested (no signal function, no history, bad output)."""
+
+
+def _skipped(module: str) -> bool:
+    return any(module == name or module.startswith(name + ".") for name in SKIPPED_MODULES)
+
+
+def _is_pure(node: ast.AST) -> bool:
+    return not any(isinstance(child, (ast.Call, ast.Await, ast.Yield)) for child in ast.walk(node))
+
+
+def _strategy_statements(tree: ast.Module) -> list:
+    """Top-level statements safe to run outside the agent: imports, plain defs and constant assignments."""
+    kept = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            if not any(_skipped(alias.name) for alias in node.names):
+                kept.append(node)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level == 0 and not _skipped(node.module or ""):
+                kept.append(node)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            # Decorated definitions are agent handlers (@agent.on_interval, @inject_selected, ...)
+            if not node.decorator_list:
+                kept.append(node)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None and _is_pure(node.value):
+            kept.append(node)
+    return kept
+
+
+def load_strategy(code: str, filename: str = "<strategy>") -> dict:
+    """
+    Loads the backtestable part of agent code without starting the agent.
+
+    A strategy exposes either `signals(bars, **params)`, which gets the whole
+    history as NumPy arrays (open/high/low/close/volume/timestamp) and returns
+    one target position per bar in [-1, 1], or `on_bar(bar, **params)`, which
+    is called once per bar with a dict of scalars and returns the position.
+    """
+    try:
+        tree, _ = parse_agent_code(code)
+    except CodeCompileError as e:
+        raise BacktestError(str(e))
+    namespace = {"__name__": "__backtest__", "np": np}
+    for node in _strategy_statements(tree):
+        try:
+            exec(compile(ast.Module(body=[node], type_ignores=[]), filename, "exec"), namespace)
+        except Exception:
+            # A helper depending on something the agent runtime provides; the signal function may not need it
+            continue
+    if not callable(namespace.get("signals")) and not callable(namespace.get("on_bar")):
+        raise BacktestError("Agent code defines neither signals(bars) nor on_bar(bar)")
+    return namespace
+
+
+def load_history(pubsub, agent_id: str, arguments=None, start: float = None, end: float = None,
+                 limit: int = None) -> dict:
+    rows = pubsub.get_history(agent_id, arguments, start, end, limit)
+    if len(rows) < 2:
+        raise BacktestError(f"Not enough history for agent {agent_id} ({len(rows)} bars)")
+    columns = np.array(rows, dtype=np.float64)
+    return {name: np.ascontiguousarray(columns[:, i]) for i, name in enumerate(HISTORY_FIELDS)}
+
+
+def strategy_positions(strategy: dict, bars: dict, params: dict = None) -> tuple[np.ndarray, str]:
+    """Returns (positions, mode) where mode is "vectorized" or "event"."""
+    params = params or {}
+    count = len(bars["close"])
+    if callable(strategy.get("signals")):
+        positions = np.asarray(strategy["signals"](bars, **params), dtype=np.float64)
+        if positions.shape != (count,):
+            raise BacktestError(f"signals() returned shape {positions.shape}, expected ({count},)")
+        mode = "vectorized"
+    else:
+        on_bar = strategy["on_bar"]
+        columns = [bars[name] for name in HISTORY_FIELDS]
+        positions = np.empty(count)
+        for i in range(count):
+            bar = {name: float(column[i]) for name, column in zip(HISTORY_FIELDS, columns)}
+            position = on_bar(bar, **params)
+            positions[i] = 0.0 if position is None else position
+        mode = "event"
+    return np.clip(np.nan_to_num(positions), -1.0, 1.0), mode
+
+
+def periods_per_year(timestamps: np.ndarray) -> float:
+    steps = np.diff(timestamps)
+    steps = steps[steps > 0]
+    return SECONDS_PER_YEAR / float(np.median(steps)) if len(steps) else 252.0
+
+
+def compute_metrics(close: np.ndarray, positions: np.ndarray, fee_bps: float = 0.0,
+                    annualization: float = 252.0) -> dict:
+    """
+    Position held at bar t earns the close-to-close return of bar t+1; every
+    change of position pays fee_bps on the traded fraction.
+    """
+    returns = close[1:] / close[:-1] - 1.0
+    turnover = np.abs(np.diff(positions, prepend=0.0))[:-1]
+    strategy_returns = positions[:-1] * returns - turnover * fee_bps / 10_000
+    equity = np.cumprod(1.0 + strategy_returns)
+    drawdown = equity / np.maximum.accumulate(equity) - 1.0
+    std = strategy_returns.std()
+    sharpe = float(strategy_returns.mean() / std * math.sqrt(annualization)) if std > 0 else 0.0
+    return {
+        "bars": int(len(close)),
+        "total_return": float(equity[-1] - 1.0),
+        "sharpe": sharpe,
+        "max_drawdown": float(drawdown.min()),
+        "trades": int(np.count_nonzero(turnover)),
+        "exposure": float(np.mean(positions != 0)),
+    }
+
+
+def data_source(agent: dict) -> str:
+    """History a strategy trades on by default: its first mapped producer, else its own pushes."""
+    agent_mapping, _ = load_mappings(agent.get("function_agent_mapping"))
+    producers = [producer for producer in agent_mapping.values() if producer]
+    return producers[0] if producers else agent["agent_id"]
+
+
+def run_backtest(code: str, bars: dict, params: dict = None, fee_bps: float = 0.0,
+                 annualization: float = None) -> dict:
+    return backtest_strategy(load_strategy(code), bars, params, fee_bps, annualization)
+
+
+def backtest_strategy(strategy: dict, bars: dict, params: dict = None, fee_bps: float = 0.0,
+                      annualization: float = None) -> dict:
+    started = time.perf_counter()
+    positions, mode = strategy_positions(strategy, bars, params)
+    annualization = annualization or periods_per_year(bars["timestamp"])
+    metrics = compute_metrics(bars["close"], positions, fee_bps, annualization)
+    return {**metrics, "mode": mode, "params": params or {}, "elapsed_s": time.perf_counter() - started}
@@ -0,0 +1,39 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from cogs.api_router import manager
+from cogs.fast_json import FastJSONResponse
+
+router = APIRouter()
+
+
+class BacktestSweep(BaseModel):
+    agent_ids: List[str]
+    # {"param": [values, ...]}; every combination is run for every agent
+    param_grid: Optional[dict] = None
+    data_agent_id: Optional[str] = None
+    arguments: Optional[str] = None
+    fee_bps: float = 10.0
+    start: Optional[float] = None
+    end: Optional[float] = None
+    # Store each agent's best Sharpe as its perf when the sweep completes
+    write_perf: bool = False
+
+
+@router.post("/", status_code=status.HTTP_202_ACCEPTED)
+async def submit_backtest(payload: BacktestSweep):
+    try:
+        return await run_in_threadpool(manager.backtests.submit, **payload.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/{job_id}")
+async def get_backtest(job_id: str, limit: int = 20):
+    job = await run_in_threadpool(manager.backtests.get, job_id, limit)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Backtest not found")
+    return FastJSONResponse(job)
@@ -0,0 +1,397 @@
+import hashlib
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from .artifacts import _atomic_write
+from .backtest import (
+    HISTORY_FIELDS, BacktestError, backtest_strategy, data_source, load_history, load_strategy, run_backtest,
+)
+from .database import DATA_DIR
+from .resources import apply_limits, limits_from_record
+
+BACKTEST_DIR = os.path.join(DATA_DIR, "backtests")
+MAX_CELLS = 100_000
+# Strategy code runs in a child process: killed after this long, and capped at this much memory
+# unless the agent record sets its own mem_limit_mb
+BACKTEST_TIMEOUT_S = float(os.environ.get("BACKTEST_TIMEOUT_S", "120"))
+BACKTEST_MEM_LIMIT_MB = int(os.environ.get("BACKTEST_MEM_LIMIT_MB", "2048"))
+
+# A fresh process from the fork server instead of a fork of the threaded API process
+_mp_context = multiprocessing.get_context("forkserver")
+
+logger = logging.getLogger(__name__)
+
+
+def cell_key(agent_id: str, params: dict) -> str:
+    return f"{agent_id}:{json.dumps(params, sort_keys=True, separators=(',', ':'))}"
+
+
+def expand_grid(param_grid: dict) -> list[dict]:
+    """{"fast": [5, 10], "slow": [50]} -> [{"fast": 5, "slow": 50}, {"fast": 10, "slow": 50}]"""
+    if not param_grid:
+        return [{}]
+    names = sorted(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[n] for n in names))]
+
+
+def _open_history(path: str) -> dict:
+    # Memory-mapped: every worker shares the page cache instead of receiving a pickled copy
+    columns = np.load(path, mmap_mode="r")
+    return {name: columns[i] for i, name in enumerate(HISTORY_FIELDS)}
+
+
+class _CellTimedOut(BaseException):
+    # BaseException, so a strategy's own `except Exception` does not swallow it
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _CellTimedOut()
+
+
+def _run_chunk(code: str, history_path: str, agent_id: str, params_list: list, fee_bps: float,
+               timeout: float = BACKTEST_TIMEOUT_S) -> list:
+    """
+    Worker entry point: loads the strategy once and backtests every parameter
+    set in the chunk. SIGALRM stops a cell (or the strategy's import) after
+    `timeout` seconds; the scheduler recycles workers that ignore it.
+    """
+    signal.signal(signal.SIGALRM, _on_alarm)
+    timed_out = f"Backtest timed out after {timeout:.0f} s"
+    try:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+        strategy = load_strategy(code)
+    except _CellTimedOut:
+        return [{"agent_id": agent_id, "params": params, "error": timed_out} for params in params_list]
+    except Exception as e:
+        return [{"agent_id": agent_id, "params": params, "error": str(e)} for params in params_list]
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    bars = _open_history(history_path)
+    results = []
+    for params in params_list:
+        try:
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+            results.append({"agent_id": agent_id, **backtest_strategy(strategy, bars, params, fee_bps)})
+        except _CellTimedOut:
+            results.append({"agent_id": agent_id, "params": params, "error": timed_out})
+        except Exception as e:
+            results.append({"agent_id": agent_id, "params": params, "error": str(e)})
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    return results
+
+
+def _chunk_errors(agent_id: str, params_list: list, error: str) -> list:
+    return [{"agent_id": agent_id, "params": params, "error": error} for params in params_list]
+
+
+def _run_isolated(conn, limits: dict, code: str, bars: dict, params: dict, fee_bps: float):
+    """Child entry point for BacktestScheduler.run_one."""
+    try:
+        apply_limits(limits)
+        conn.send(("ok", run_backtest(code, bars, params, fee_bps)))
+    except BaseException as e:
+        conn.send(("error", str(e) if isinstance(e, BacktestError) else f"Strategy failed: {type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+class BacktestJob:
+    def __init__(self, job_id: str, root: str, spec: dict):
+        self.job_id = job_id
+        self.dir = os.path.join(root, job_id)
+        self.spec = spec
+        self.status = "pending"
+        self.error = None
+        self.total = 0
+        self.started_at = None
+        self.finished_at = None
+        self.results: dict[str, dict] = {}
+        # Cells restored from the checkpoint, excluded from this run's throughput
+        self.resumed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def checkpoint_path(self) -> str:
+        return os.path.join(self.dir, "cells.jsonl")
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash; that cell simply runs again
+                    continue
+                # Checkpoints written before errors were skipped may still hold failed cells
+                if "error" not in result:
+                    self.results[cell_key(result["agent_id"], result["params"])] = result
+        self.resumed = len(self.results)
+
+    def record(self, results: list):
+        with self._lock:
+            with open(self.checkpoint_path, "a") as f:
+                for result in results:
+                    # Failed cells are reported but not checkpointed, so a resumed job retries them
+                    if "error" not in result:
+                        f.write(json.dumps(result) + "\n")
+                    self.results[cell_key(result["agent_id"], result["params"])] = result
+
+    def save(self):
+        state = {
+            "job_id": self.job_id, "spec": self.spec, "status": self.status, "error": self.error,
+            "total": self.total, "started_at": self.started_at, "finished_at": self.finished_at,
+        }
+        _atomic_write(os.path.join(self.dir, "job.json"), json.dumps(state).encode())
+
+    def failed(self) -> int:
+        with self._lock:
+            return sum(1 for r in self.results.values() if "error" in r)
+
+    def summary(self, limit: int = 20) -> dict:
+        with self._lock:
+            results = list(self.results.values())
+        ok = sorted((r for r in results if "error" not in r), key=lambda r: r["sharpe"], reverse=True)
+        best = {}
+        for result in ok:
+            best.setdefault(result["agent_id"], result)
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "error": self.error,
+            "total": self.total,
+            "done": len(results),
+            "failed": len(results) - len(ok),
+            "elapsed_s": elapsed,
+            "resumed": self.resumed,
+            "cells_per_s": (len(results) - self.resumed) / elapsed if elapsed else None,
+            "best": best,
+            "results": ok[:limit],
+            "errors": [r for r in results if "error" in r][:limit],
+        }
+
+
+class BacktestScheduler:
+    """
+    Runs strategy x parameter-grid backtests on a process pool.
+
+    A job's id is the hash of its spec and the strategies' code, so
+    re-submitting an interrupted sweep picks up its checkpoint file and only
+    runs the cells that have not finished. OHLCV history is written once
+    per job as a .npy file that workers memory-map.
+    """
+
+    def __init__(self, get_record, pubsub, root: str = BACKTEST_DIR, workers: int = None, on_best=None,
+                 timeout: float = BACKTEST_TIMEOUT_S):
+        self.get_record = get_record
+        self.pubsub = pubsub
+        self.root = root
+        self.workers = workers or int(os.environ.get("BACKTEST_WORKERS", os.cpu_count() or 1))
+        # Per cell, in the pool as well as in run_one
+        self.timeout = timeout
+        # Called with (agent_id, best_result) when a job with write_perf finishes
+        self.on_best = on_best
+        self.jobs: dict[str, BacktestJob] = {}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Forking this threaded process can deadlock a worker; the fork server is a clean,
+                # single-threaded parent. Workers run strategy code, so they get the memory cap too.
+                self._pool = ProcessPoolExecutor(
+                    self.workers, mp_context=_mp_context,
+                    initializer=apply_limits, initargs=({"mem_limit_mb": BACKTEST_MEM_LIMIT_MB},),
+                )
+            return self._pool
+
+    def _recycle(self):
+        """Kills the pool's workers so the next _executor() call starts fresh ones."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        for process in list((pool._processes or {}).values()):
+            process.kill()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def run_one(self, record: dict, bars: dict, params: dict = None, fee_bps: float = 0.0,
+                timeout: float = None) -> dict:
+        """
+        Backtests one strategy in its own process, under the agent's resource
+        limits, killed after `timeout` seconds. Raises BacktestError.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        limits = {"mem_limit_mb": BACKTEST_MEM_LIMIT_MB, **limits_from_record(record)}
+        parent, child = _mp_context.Pipe(duplex=False)
+        process = _mp_context.Process(
+            target=_run_isolated, args=(child, limits, record["code"], bars, params, fee_bps), daemon=True,
+        )
+        process.start()
+        child.close()
+        try:
+            if not parent.poll(timeout):
+                raise BacktestError(f"Backtest timed out after {timeout:.0f} s")
+            status, value = parent.recv()
+        except EOFError:
+            process.join()
+            raise BacktestError(f"Backtest process died (exit code {process.exitcode})")
+        finally:
+            if process.is_alive():
+                process.kill()
+            process.join()
+            parent.close()
+        if status != "ok":
+            raise BacktestError(value)
+        return value
+
+    def submit(self, agent_ids: list, param_grid: dict = None, data_agent_id: str = None, arguments: str = None,
+               fee_bps: float = 10.0, start: float = None, end: float = None, write_perf: bool = False) -> dict:
+        records = {}
+        for agent_id in agent_ids:
+            record = self.get_record(agent_id)
+            if not record:
+                raise BacktestError(f"Agent {agent_id} not found")
+            records[agent_id] = record
+        grid = expand_grid(param_grid)
+        if len(grid) * len(records) > MAX_CELLS:
+            raise BacktestError(f"Sweep has {len(grid) * len(records)} cells, limit is {MAX_CELLS}")
+
+        spec = {
+            "agent_ids": list(agent_ids), "param_grid": param_grid or {}, "data_agent_id": data_agent_id,
+            "arguments": arguments, "fee_bps": fee_bps, "start": start, "end": end, "write_perf": write_perf,
+        }
+        code_hashes = {agent_id: hashlib.sha256(r["code"].encode()).hexdigest() for agent_id, r in records.items()}
+        job_id = hashlib.sha256(json.dumps([spec, code_hashes], sort_keys=True).encode()).hexdigest()[:16]
+
+        with self._lock:
+            job = self.jobs.get(job_id)
+            # A completed job with failed cells runs again; its checkpoint skips the cells that succeeded
+            if job and (job.status in ("pending", "running") or job.status == "completed" and not job.failed()):
+                return job.summary()
+            job = self.jobs[job_id] = BacktestJob(job_id, self.root, spec)
+        os.makedirs(job.dir, exist_ok=True)
+        job.load_checkpoint()
+        job.total = len(grid) * len(records)
+        job.status = "running"
+        job.started_at = time.time()
+        job.save()
+        threading.Thread(target=self._run, args=(job, records, grid), name=f"backtest-{job_id}", daemon=True).start()
+        return job.summary()
+
+    def _history_path(self, job: BacktestJob, data_agent_id: str) -> str:
+        spec = job.spec
+        name = hashlib.sha256(f"{data_agent_id}:{spec['arguments']}".encode()).hexdigest()[:16]
+        path = os.path.join(job.dir, f"history-{name}.npy")
+        if not os.path.exists(path):
+            bars = load_history(self.pubsub, data_agent_id, spec["arguments"], spec["start"], spec["end"])
+            tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, np.stack([bars[name] for name in HISTORY_FIELDS]))
+            os.replace(tmp_path, path)
+        return path
+
+    def _run(self, job: BacktestJob, records: dict, grid: list):
+        try:
+            chunks = []
+            for agent_id, record in records.items():
+                pending = [params for params in grid if cell_key(agent_id, params) not in job.results]
+                if not pending:
+                    continue
+                history_path = self._history_path(job, job.spec["data_agent_id"] or data_source(record))
+                # Several chunks per worker keep the pool busy when strategies differ in cost
+                size = max(1, math.ceil(len(pending) / (self.workers * 4)))
+                for i in range(0, len(pending), size):
+                    chunks.append((record["code"], history_path, agent_id, pending[i:i + size], job.spec["fee_bps"]))
+            self._run_chunks(job, chunks)
+            job.status = "completed"
+            if job.spec["write_perf"] and self.on_best:
+                for agent_id, best in job.summary(limit=0)["best"].items():
+                    self.on_best(agent_id, best)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.exception("Backtest job %s failed", job.job_id)
+        finally:
+            job.finished_at = time.time()
+            job.save()
+
+    def _run_chunks(self, job: BacktestJob, chunks: list):
+        """
+        Runs chunks on the pool and records their results. A chunk should end
+        within timeout per cell thanks to the workers' alarm; if nothing
+        finishes for longer than the biggest chunk may take, the running
+        chunks are failed, the pool is recycled and queued chunks resubmitted.
+        """
+        stall = self.timeout * (max((len(chunk[3]) for chunk in chunks), default=0) + 1)
+        executor = self._executor()
+        futures = {executor.submit(_run_chunk, *chunk, self.timeout): chunk for chunk in chunks}
+        while futures:
+            done, _ = wait(futures, timeout=stall, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                _, _, agent_id, params_list, _ = chunk = futures.pop(future)
+                try:
+                    job.record(future.result())
+                except BrokenProcessPool:
+                    # A worker died (e.g. hit the memory cap); errors are not checkpointed, so a resubmit retries
+                    broken = True
+                    job.record(_chunk_errors(agent_id, params_list, "Backtest worker died"))
+                except Exception as e:
+                    job.record(_chunk_errors(agent_id, params_list, str(e)))
+            if done and not broken:
+                continue
+            stuck = [chunk for future, chunk in futures.items() if future.running()]
+            queued = [chunk for future, chunk in futures.items() if not future.running()]
+            if not done:
+                logger.warning("Backtest job %s: no chunk finished in %.0f s; recycling workers", job.job_id, stall)
+                for _, _, agent_id, params_list, _ in stuck:
+                    job.record(_chunk_errors(agent_id, params_list, f"Backtest timed out after {stall:.0f} s"))
+            else:
+                queued += stuck
+            self._recycle()
+            executor = self._executor()
+            futures = {executor.submit(_run_chunk, *chunk, self.timeout): chunk for chunk in queued}
+
+    def get(self, job_id: str, limit: int = 20) -> dict | None:
+        job = self.jobs.get(job_id)
+        if job is None:
+            job = self._load(job_id)
+            if job is None:
+                return None
+        return job.summary(limit)
+
+    def _load(self, job_id: str) -> BacktestJob | None:
+        """Reads a job left on disk by an earlier process; unfinished ones report as interrupted."""
+        path = os.path.join(self.root, os.path.basename(job_id), "job.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            state = json.load(f)
+        job = BacktestJob(state["job_id"], self.root, state["spec"])
+        job.status = "interrupted" if state["status"] in ("pending", "running") else state["status"]
+        job.error = state["error"]
+        job.total = state["total"]
+        job.started_at = state["started_at"]
+        job.finished_at = state["finished_at"]
+        job.load_checkpoint()
+        return job
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,355 @@
+import atexit
+import glob
+import hashlib
+import os
+import queue
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Segment header: magic, layout version, capacity, record size, total records written
+_HEADER = struct.Struct("<4sIIIQ")
+_HEADER_SIZE = 64
+_MAGIC = b"BAR1"
+_VERSION = 2
+# Slot: seqlock counter, bar id, open, high, low, close, volume, bar timestamp,
+# wall clock nanoseconds at publish (differs from the bar timestamp for backfills)
+_SLOT = struct.Struct("<QQddddddQ")
+_COUNT = struct.Struct("<Q")
+_SLOT_DTYPE = np.dtype([
+    ("seq", "<u8"), ("id", "<u8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"),
+    ("close", "<f8"), ("volume", "<f8"), ("timestamp", "<f8"), ("produced_ns", "<u8"),
+])
+WINDOW_FIELDS = ("id", "open", "high", "low", "close", "volume", "timestamp")
+_COUNT_OFFSET = 16
+
+RING_CAPACITY = int(os.environ.get("BAR_RING_CAPACITY", "1024"))
+# How long a reader remembers that a producer has no segment yet before trying shm_open again
+MISSING_RETRY_S = 1.0
+_READ_RETRIES = 64
+
+
+def segment_name(agent_id: str, arguments=None) -> str:
+    """Shared memory name for a producer's ring; short enough for macOS (31 chars)."""
+    agent_part = hashlib.sha1(agent_id.encode()).hexdigest()[:12]
+    args_part = "all" if arguments is None else hashlib.sha1(str(arguments).encode()).hexdigest()[:8]
+    return f"bar_{agent_part}_{args_part}"
+
+
+def _attach(name: str, create: bool, size: int = 0):
+    if create:
+        segment = shared_memory.SharedMemory(name=name, create=True, size=size)
+    else:
+        segment = shared_memory.SharedMemory(name=name)
+    # Segments outlive the processes that touch them so a restarted producer keeps its
+    # history and readers keep their mapping; StrategyManager unlinks them on delete
+    try:
+        resource_tracker.unregister(segment._name, "shared_memory")
+    except Exception:
+        pass
+    return segment
+
+
+class BarRing:
+    """
+    Fixed-size ring of OHLCV records in one shared memory segment.
+
+    Single writer, many readers. Each slot carries its own seqlock counter:
+    the writer makes it odd, writes the record, then makes it even again; a
+    reader retries if the counter was odd or changed while it copied the
+    record. Reads are plain memory loads on the mapped segment.
+    """
+
+    def __init__(self, segment, capacity: int):
+        self.segment = segment
+        self.buf = segment.buf
+        self.capacity = capacity
+
+    @classmethod
+    def create_or_attach(cls, name: str, capacity: int = RING_CAPACITY) -> "BarRing":
+        size = _HEADER_SIZE + capacity * _SLOT.size
+        try:
+            segment = _attach(name, create=True, size=size)
+            _HEADER.pack_into(segment.buf, 0, _MAGIC, _VERSION, capacity, _SLOT.size, 0)
+            return cls(segment, capacity)
+        except FileExistsError:
+            try:
+                return cls.attach(name)
+            except ValueError:
+                # Left behind by an older layout; the producer owns its rings, so replace it
+                os.unlink(f"/dev/shm/{name}")
+                return cls.create_or_attach(name, capacity)
+
+    @classmethod
+    def attach(cls, name: str) -> "BarRing":
+        segment = _attach(name, create=False)
+        magic, version, capacity, slot_size, _ = _HEADER.unpack_from(segment.buf, 0)
+        if magic != _MAGIC or version != _VERSION or slot_size != _SLOT.size:
+            segment.close()
+            raise ValueError(f"Shared memory segment {name} has an unknown layout")
+        return cls(segment, capacity)
+
+    def count(self) -> int:
+        return _COUNT.unpack_from(self.buf, _COUNT_OFFSET)[0]
+
+    def write(self, open_price, high_price, low_price, close_price, volume, timestamp, produced_ns: int = 0) -> int:
+        count = self.count()
+        offset = _HEADER_SIZE + (count % self.capacity) * _SLOT.size
+        seq = _COUNT.unpack_from(self.buf, offset)[0]
+        _COUNT.pack_into(self.buf, offset, seq + 1)
+        _SLOT.pack_into(
+            self.buf, offset, seq + 1, count + 1,
+            open_price, high_price, low_price, close_price, volume, timestamp, produced_ns,
+        )
+        _COUNT.pack_into(self.buf, offset, seq + 2)
+        _COUNT.pack_into(self.buf, _COUNT_OFFSET, count + 1)
+        return count + 1
+
+    def read(self, bar_id: int):
+        """Returns the slot tuple for bar_id (1-based), or None if it was overwritten or torn."""
+        offset = _HEADER_SIZE + ((bar_id - 1) % self.capacity) * _SLOT.size
+        for _ in range(_READ_RETRIES):
+            record = _SLOT.unpack_from(self.buf, offset)
+            if record[0] & 1:
+                continue
+            if _COUNT.unpack_from(self.buf, offset)[0] == record[0]:
+                return record if record[1] == bar_id else None
+        return None
+
+    def latest(self):
+        for _ in range(_READ_RETRIES):
+            count = self.count()
+            if count == 0:
+                return None
+            record = self.read(count)
+            if record is not None:
+                return record
+        return None
+
+    def window(self, n: int) -> np.ndarray | None:
+        """
+        Copies the last n records (oldest first) as a structured array, or None
+        if the writer kept overwriting them. Uses the same seqlock check as
+        read(), applied to the whole copied window at once.
+        """
+        for _ in range(_READ_RETRIES):
+            count = self.count()
+            n = min(n, count, self.capacity)
+            slots = np.frombuffer(self.buf, _SLOT_DTYPE, count=self.capacity, offset=_HEADER_SIZE)
+            indices = np.arange(count - n, count) % self.capacity
+            records = slots[indices]
+            stable = (
+                not (records["seq"] & 1).any()
+                and np.array_equal(slots["seq"][indices], records["seq"])
+                and np.array_equal(records["id"], np.arange(count - n + 1, count + 1, dtype=np.uint64))
+            )
+            del slots
+            if stable:
+                return records
+        return None
+
+    def close(self):
+        self.buf = None
+        self.segment.close()
+
+
+def _as_row(agent_id: str, arguments, record) -> dict:
+    _, bar_id, open_price, high_price, low_price, close_price, volume, timestamp, produced_ns = record
+    return {
+        "id": bar_id,
+        "agent_id": agent_id,
+        "open_price": open_price,
+        "high_price": high_price,
+        "low_price": low_price,
+        "close_price": close_price,
+        "volume": volume,
+        "timestamp": timestamp,
+        "arguments": "" if arguments is None else str(arguments),
+        "produced_ns": produced_ns,
+    }
+
+
+class BarChannels:
+    """
+    Latest-bar transport between producer and consumer agents on one host.
+
+    `publish` writes the bar into the producer's shared memory rings (one per
+    arguments value plus one for "any arguments") and queues it for SQLite,
+    which a background thread persists in batches. `read_latest` serves
+    consumers from the ring and only falls back to SQLite when the producer
+    has never published on this host.
+
+    With a `lineage` recorder (cogs/lineage.py), the persister also reports
+    how long each bar took from publish to its SQLite commit.
+    """
+
+    def __init__(self, pubsub, capacity: int = RING_CAPACITY, persist: bool = True, lineage=None):
+        self.pubsub = pubsub
+        self.lineage = lineage
+        self.capacity = capacity
+        self._writers: dict[str, BarRing] = {}
+        self._readers: dict[str, BarRing] = {}
+        self._missing: dict[str, float] = {}
+        self._persist = persist
+        self._pending = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._atexit_registered = False
+
+    def publish(self, agent_id: str, open_price, high_price, low_price, close_price, volume, arguments: str = "",
+                timestamp: float = None) -> int:
+        produced_ns = time.time_ns()
+        timestamp = produced_ns / 1e9 if timestamp is None else timestamp
+        bar_id = 0
+        for key in {arguments: None, None: None}:
+            bar_id = self._writer(agent_id, key).write(
+                open_price, high_price, low_price, close_price, volume, timestamp, produced_ns,
+            )
+        if self._persist:
+            self._ensure_persister()
+            self._pending.put(
+                (agent_id, open_price, high_price, low_price, close_price, volume, timestamp, arguments, produced_ns)
+            )
+        return bar_id
+
+    def read_latest(self, agent_id: str, arguments=None) -> dict | None:
+        ring = self._reader(agent_id, arguments)
+        if ring is not None:
+            record = ring.latest()
+            if record is not None:
+                return _as_row(agent_id, arguments, record)
+        return self.pubsub.get_latest_row(agent_id, arguments=arguments)
+
+    def read_window(self, agent_id: str, n: int, arguments=None) -> dict:
+        """
+        Returns the producer's last n bars, oldest first, as NumPy arrays keyed
+        by id/open/high/low/close/volume/timestamp. Windows longer than the
+        ring capacity (or producers without a ring on this host) come from SQLite.
+        """
+        ring = self._reader(agent_id, arguments)
+        if ring is not None and n <= ring.capacity:
+            records = ring.window(n)
+            if records is not None:
+                return {name: records[name].astype(np.int64 if name == "id" else np.float64) for name in WINDOW_FIELDS}
+        rows = self.pubsub.get_bars_after(agent_id, arguments, 0, n)
+        columns = np.array(rows, dtype=np.float64).reshape(len(rows), len(WINDOW_FIELDS))
+        return {
+            name: columns[:, i].astype(np.int64) if name == "id" else columns[:, i]
+            for i, name in enumerate(WINDOW_FIELDS)
+        }
+
+    def bars_since(self, agent_id: str, arguments=None, after_id: int = 0, source: str = None) -> tuple[str, list, bool]:
+        """
+        Returns (source, bars, reset) with the bars published after `after_id`,
+        oldest first, as (id, open, high, low, close, volume) tuples. Ids are
+        only comparable within one source ("ring" or "sqlite").
+
+        `reset` is True when bars is a warm-up window instead of the
+        continuation of after_id: on the first call, when `source` differs from
+        where bars come from now, or when bars after after_id were overwritten
+        (the consumer fell more than a ring behind, or the writer lapped it
+        mid-read). The caller must then drop state built from earlier bars.
+        """
+        ring = self._reader(agent_id, arguments)
+        if ring is not None:
+            if source == "ring":
+                count = ring.count()
+                if 0 <= count - after_id <= ring.capacity:
+                    bars = []
+                    for bar_id in range(after_id + 1, count + 1):
+                        record = ring.read(bar_id)
+                        if record is None:
+                            break
+                        bars.append(record[1:7])
+                    else:
+                        return "ring", bars, False
+            records = ring.window(ring.capacity)
+            if records is not None:
+                return "ring", records[list(WINDOW_FIELDS[:6])].tolist(), True
+        # No ring on this host, or the writer kept overwriting the window
+        reset = source != "sqlite"
+        rows = self.pubsub.get_bars_after(agent_id, arguments, 0 if reset else after_id, self.capacity)
+        return "sqlite", [row[:6] for row in rows], reset
+
+    def _writer(self, agent_id: str, arguments) -> BarRing:
+        name = segment_name(agent_id, arguments)
+        ring = self._writers.get(name)
+        if ring is None:
+            ring = self._writers[name] = BarRing.create_or_attach(name, self.capacity)
+        return ring
+
+    def _reader(self, agent_id: str, arguments) -> BarRing | None:
+        name = segment_name(agent_id, arguments)
+        ring = self._readers.get(name) or self._writers.get(name)
+        if ring is not None:
+            return ring
+        if time.monotonic() < self._missing.get(name, 0):
+            return None
+        try:
+            ring = self._readers[name] = BarRing.attach(name)
+        except (FileNotFoundError, ValueError):
+            self._missing[name] = time.monotonic() + MISSING_RETRY_S
+            return None
+        return ring
+
+    def _ensure_persister(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._persist_loop, name="bar-persist", daemon=True)
+                    self._thread.start()
+                    # flush() stops the thread, so a later publish restarts it; register the exit flush once
+                    if not self._atexit_registered:
+                        atexit.register(self.flush)
+                        self._atexit_registered = True
+
+    def _persist_loop(self):
+        while True:
+            rows = [self._pending.get()]
+            while len(rows) < 500:
+                try:
+                    rows.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in rows
+            rows = [row for row in rows if row is not None]
+            try:
+                if rows:
+                    self.pubsub.insert_rows(rows)
+                    if self.lineage is not None:
+                        committed_ns = time.time_ns()
+                        for row in rows:
+                            self.lineage.observe("", row[0], "persist_lag", (committed_ns - row[8]) / 1e9)
+            except Exception as e:
+                print(f"Persisting {len(rows)} bars failed: {e}")
+            if stop:
+                return
+
+    def flush(self, timeout: float = 5.0):
+        """Writes every queued bar to SQLite and stops the persister thread."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._pending.put(None)
+        thread.join(timeout)
+        self._thread = None
+
+    def close(self):
+        self.flush()
+        for ring in [*self._writers.values(), *self._readers.values()]:
+            ring.close()
+        self._writers.clear()
+        self._readers.clear()
+
+
+def unlink_segments(agent_id: str):
+    """Removes every ring a producer created on this host (Linux only; no-op elsewhere)."""
+    prefix = segment_name(agent_id).rsplit("_", 1)[0]
+    for path in glob.glob(f"/dev/shm/{prefix}_*"):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
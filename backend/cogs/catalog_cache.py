@@ -0,0 +1,90 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from .compression import compress
+from .fast_json import dumps
+
+# Rebuild entries at least this often so writes made by other API workers show up
+CATALOG_MAX_AGE_S = 5.0
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    body: bytes
+    etag: str
+    version: int
+    built_at: float
+    # Compressed copies by Content-Encoding, made on first request
+    _encoded: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def encoded(self, encoding: str) -> bytes:
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = self._encoded[encoding] = compress(self.body, encoding)
+        return body
+
+
+def body_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match check; accepts lists, weak validators and *."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+class CatalogCache:
+    """
+    Serialized catalog responses keyed by query shape, valid for one catalog version.
+
+    StrategyManager bumps the version on every write that changes what the
+    catalog shows (create, update, delete, reputation, limits, perf). A
+    request for the current version reuses the cached bytes and ETag without
+    touching SQLite; the ETag is derived from the bytes, so a rebuild that
+    produces the same JSON keeps the client's copy valid.
+    """
+
+    def __init__(self, max_entries: int = 256, max_age: float = CATALOG_MAX_AGE_S):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.version = 0
+        self._entries: OrderedDict[tuple, CachedBody] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def get(self, key: tuple, build) -> CachedBody:
+        """Returns the cached body for key, calling build() -> JSON-able object on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached.version == self.version and now - cached.built_at < self.max_age:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            version = self.version
+            self.misses += 1
+        body = dumps(build())
+        cached = CachedBody(body, body_etag(body), version, now)
+        with self._lock:
+            # A write that landed while building makes this result stale; serve it once, do not keep it
+            if version == self.version:
+                self._entries[key] = cached
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return cached
+
+    def stats(self) -> dict:
+        return {"version": self.version, "entries": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,359 @@
+import ast
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import CodeType
+
+# Bump whenever the generated prelude changes so cached code/artifacts are not reused
+TEMPLATE_VERSION = 6
+
+INJECT_DECORATOR = "inject_selected"
+
+# Names below are placeholders replaced by AST substitution, never by string formatting
+_PRELUDE = '''
+import os
+import signal
+import sys
+from functools import partial, wraps
+from uagents import Agent, Context, Model
+from cogs.database import PubSubDatabase
+from cogs.bar_channel import BarChannels
+from cogs.indicators import IndicatorEngine
+from cogs.lineage import LineageRecorder
+
+class Request(Model):
+    message: str
+
+AGENT_PORT = __PORT__
+
+agent = Agent(
+    name=__AGENT_NAME__,
+    port=AGENT_PORT,
+    endpoint=[f"http://localhost:{AGENT_PORT}/submit"],
+)
+
+pubsub = PubSubDatabase()
+lineage = LineageRecorder(pubsub, __AGENT_ID__)
+bars = BarChannels(pubsub, lineage=lineage)
+bar_indicators = IndicatorEngine(bars)
+
+def _exit_on_sigterm(signum, frame):
+    # SIGTERM (stop_agent) would otherwise skip atexit and drop bars still queued for SQLite
+    bars.flush()
+    sys.exit(128 + signum)
+
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+'''
+
+_INJECT_SELECTED = '''
+def inject_selected(*func_names):
+    def decorator(main_func):
+        # Create a new function that directly injects the dependencies
+        async def injected_func(ctx: Context):
+            injected_kwargs = {}
+            for name in func_names:
+                if name in AVAILABLE_FUNCTIONS:
+                    injected_kwargs[name] = AVAILABLE_FUNCTIONS[name]
+            return await main_func(ctx, **injected_kwargs)
+
+        injected_func.__name__ = main_func.__name__
+        injected_func.__doc__ = main_func.__doc__
+        return injected_func
+    return decorator
+'''
+
+_BUILTINS = '''
+def push(open, high, low, close, volume):
+    bars.publish(__AGENT_ID__, open, high, low, close, volume, "")
+
+def swap(fromCrypto, toCrypto, wallet_address, ammount):
+    return "successfully bought"
+'''
+
+_MAPPED_FUNCTION = '''
+def __FUNC__(__ARG__):
+    try:
+        _lineage_started = lineage.clock()
+        result = bars.read_latest(__PRODUCER__, arguments=__ARG__)
+        lineage.record_read(__PRODUCER__, result, _lineage_started)
+        print(f"Function {__FUNC_NAME__} called - got data for agent {__PRODUCER__}: {result}")
+        return result
+    except Exception as e:
+        print(f"Error in {__FUNC_NAME__}: {e}")
+        return None
+'''
+
+# fn.window(n, arguments=None) -> dict of NumPy arrays; fn.indicators(arguments=None) -> dict
+_MAPPED_HELPERS = '''
+__FUNC__.window = partial(bars.read_window, __PRODUCER__)
+__FUNC__.indicators = partial(bar_indicators.latest, __PRODUCER__)
+'''
+
+_UNMAPPED_FUNCTION = '''
+def __FUNC__(__ARG__):
+    print(f"Function {__FUNC_NAME__} called - no agent mapping found")
+    return None
+'''
+
+_RUNTIME_PORT = 'int(globals().get("__agent_port__") or os.environ["AGENT_PORT"])'
+
+
+def load_mappings(raw) -> tuple[dict, dict]:
+    """
+    Parses the stored function_agent_mapping.
+
+    The column holds JSON, either {"fn": "producer_agent_id"} or
+    {"fn": {"agent_id": "producer_agent_id", "args": "arg_name"}}.
+    Returns (function_agent_mapping, function_args_mapping).
+    """
+    if not raw:
+        return {}, {}
+    mapping = json.loads(raw) if isinstance(raw, str) else dict(raw)
+    agent_mapping, args_mapping = {}, {}
+    for func_name, target in mapping.items():
+        if isinstance(target, dict):
+            agent_mapping[func_name] = target.get("agent_id")
+            if target.get("args"):
+                args_mapping[func_name] = target["args"]
+        else:
+            agent_mapping[func_name] = target
+    return agent_mapping, args_mapping
+
+
+class CodeCompileError(ValueError):
+    """Raised when agent code or its function mapping cannot be compiled."""
+
+    def __init__(self, errors: list[dict]):
+        self.errors = errors
+        super().__init__("; ".join(f"line {e['line']}: {e['message']}" if e.get("line") else e["message"] for e in errors))
+
+
+@dataclass(frozen=True)
+class CompiledAgent:
+    key: str
+    source: str
+    code: CodeType
+    injected: tuple
+
+
+class _Substitute(ast.NodeTransformer):
+    """Replaces placeholder names with the given expression nodes / identifiers."""
+
+    def __init__(self, values: dict, names: dict = None, args: dict = None):
+        self.values = values
+        self.names = names or {}
+        self.args = args or {}
+
+    def visit_Name(self, node):
+        if node.id in self.values:
+            return copy.deepcopy(self.values[node.id])
+        return node
+
+    def visit_JoinedStr(self, node):
+        # Fold substituted constants into the literal text: f"{'name'}" -> f"name"
+        self.generic_visit(node)
+        parts = []
+        for part in node.values:
+            if isinstance(part, ast.FormattedValue) and isinstance(part.value, ast.Constant) and part.format_spec is None:
+                part = ast.Constant(str(part.value.value))
+            if isinstance(part, ast.Constant) and parts and isinstance(parts[-1], ast.Constant):
+                parts[-1] = ast.Constant(parts[-1].value + part.value)
+            else:
+                parts.append(part)
+        node.values = parts
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.name = self.names.get(node.name, node.name)
+        new_args = []
+        for arg in node.args.args:
+            replacement = self.args.get(arg.arg, arg.arg)
+            if replacement is not None:
+                arg.arg = replacement
+                new_args.append(arg)
+        node.args.args = new_args
+        self.generic_visit(node)
+        return node
+
+
+_template_cache: dict[str, list] = {}
+
+
+def _template(source: str) -> list:
+    if source not in _template_cache:
+        _template_cache[source] = ast.parse(source).body
+    return copy.deepcopy(_template_cache[source])
+
+
+def find_inject_sites(tree: ast.Module) -> tuple[list[str], list[dict]]:
+    """Returns every function name requested through @inject_selected(...) and any errors."""
+    names, errors = [], []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decorator in node.decorator_list:
+            if not (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Name)
+                    and decorator.func.id == INJECT_DECORATOR):
+                continue
+            for arg in decorator.args:
+                if not (isinstance(arg, ast.Constant) and isinstance(arg.value, str)):
+                    errors.append({"line": arg.lineno, "message": f"{INJECT_DECORATOR} arguments must be string literals"})
+                    continue
+                name = arg.value.strip()
+                if not name:
+                    continue
+                if not name.isidentifier():
+                    errors.append({"line": arg.lineno, "message": f"{name!r} is not a valid function name"})
+                elif name not in names:
+                    names.append(name)
+    return names, errors
+
+
+def _check_mappings(names: list[str], tree: ast.Module, agent_mapping: dict, args_mapping: dict) -> list[dict]:
+    errors = []
+    for func_name in list(agent_mapping) + list(args_mapping):
+        if func_name not in names:
+            errors.append({"line": None, "message": f"mapping for {func_name!r} but no {INJECT_DECORATOR} site requests it"})
+    for func_name, producer in agent_mapping.items():
+        if producer is not None and not isinstance(producer, str):
+            errors.append({"line": None, "message": f"agent mapping for {func_name!r} must be an agent id string"})
+    for func_name, arg in args_mapping.items():
+        if not (isinstance(arg, str) and arg.isidentifier()):
+            errors.append({"line": None, "message": f"argument name for {func_name!r} must be an identifier"})
+    defined = {
+        node.name for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+    }
+    for func_name in names:
+        if func_name in defined:
+            errors.append({"line": None, "message": f"{func_name!r} is injected but also defined in the agent code"})
+    return sorted({json.dumps(e, sort_keys=True): e for e in errors}.values(), key=lambda e: e["message"])
+
+
+def _data_function(func_name: str, producer: str | None, arg: str | None) -> list:
+    template = _MAPPED_FUNCTION if producer else _UNMAPPED_FUNCTION
+    node = _template(template)[0]
+    arguments = ast.Name(arg, ast.Load()) if arg else ast.Constant(None)
+    values = {
+        "__FUNC_NAME__": ast.Constant(func_name),
+        "__PRODUCER__": ast.Constant(producer),
+        "__ARG__": arguments,
+    }
+    node = _Substitute(values, names={"__FUNC__": func_name}, args={"__ARG__": arg}).visit(node)
+    doc = f"Auto-generated function for {func_name}"
+    if producer:
+        doc += f" - calls get_latest_row for agent {producer}"
+    node.body.insert(0, ast.Expr(ast.Constant(doc)))
+    if not producer:
+        return [node]
+    values["__FUNC__"] = ast.Name(func_name, ast.Load())
+    return [node] + [_Substitute(values).visit(helper) for helper in _template(_MAPPED_HELPERS)]
+
+
+def generate_prelude(names: list[str], agent_mapping: dict, args_mapping: dict, port: int | None,
+                     agent_name: str, agent_id: str) -> list:
+    port_node = ast.parse(_RUNTIME_PORT, mode="eval").body if port is None else ast.Constant(port)
+    values = {"__PORT__": port_node, "__AGENT_NAME__": ast.Constant(agent_name), "__AGENT_ID__": ast.Constant(agent_id)}
+    body = _template(_PRELUDE)
+    if names:
+        body += _template(_INJECT_SELECTED)
+    body += _template(_BUILTINS)
+    body = [_Substitute(values).visit(node) for node in body]
+    if names:
+        for name in names:
+            body += _data_function(name, agent_mapping.get(name), args_mapping.get(name))
+        body.append(ast.Assign(
+            targets=[ast.Name("AVAILABLE_FUNCTIONS", ast.Store())],
+            value=ast.Dict(keys=[ast.Constant(n) for n in names], values=[ast.Name(n, ast.Load()) for n in names]),
+        ))
+    return body
+
+
+def compile_key(code: str, agent_mapping: dict, args_mapping: dict, port, agent_name: str, agent_id: str) -> str:
+    payload = json.dumps(
+        [TEMPLATE_VERSION, code, agent_mapping, args_mapping, port, agent_name, agent_id],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def parse_agent_code(code: str, agent_mapping: dict = None, args_mapping: dict = None) -> tuple[ast.Module, list[str]]:
+    """Parses and validates agent code and its mapping; raises CodeCompileError."""
+    if not code or not code.strip():
+        raise CodeCompileError([{"line": None, "message": "Agent code is empty"}])
+    try:
+        tree = ast.parse(code, filename="<agent>")
+    except SyntaxError as e:
+        raise CodeCompileError([{"line": e.lineno, "message": f"syntax error: {e.msg}"}])
+    names, errors = find_inject_sites(tree)
+    errors += _check_mappings(names, tree, agent_mapping or {}, args_mapping or {})
+    if errors:
+        raise CodeCompileError(errors)
+    return tree, names
+
+
+class AgentCompiler:
+    """Compiles agent code once per content hash and keeps the results in a bounded LRU."""
+
+    def __init__(self, cache_size: int = 512):
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, CompiledAgent] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, code: str, agent_mapping: dict, args_mapping: dict, port: int | None,
+                agent_name: str, agent_id: str, filename: str = "<agent>") -> CompiledAgent:
+        key = compile_key(code, agent_mapping, args_mapping, port, agent_name, agent_id)
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+                return compiled
+
+        tree, names = parse_agent_code(code, agent_mapping, args_mapping)
+        prelude = ast.Module(body=generate_prelude(names, agent_mapping, args_mapping, port, agent_name, agent_id),
+                             type_ignores=[])
+        prelude_source = ast.unparse(ast.fix_missing_locations(prelude)) + "\n\n"
+        # Re-parse only the (small) prelude to get line numbers that match the emitted text;
+        # the user's tree is reused and shifted below it, so the source keeps its comments.
+        prelude_tree = ast.parse(prelude_source)
+        ast.increment_lineno(tree, prelude_source.count("\n"))
+        module = ast.Module(body=prelude_tree.body + tree.body, type_ignores=[])
+        source = prelude_source + code
+        code_object = compile(module, filename, "exec")
+
+        compiled = CompiledAgent(key=key, source=source, code=code_object, injected=tuple(names))
+        self._put(key, compiled)
+        return compiled
+
+    def compile_plain(self, code: str, filename: str = "<agent>") -> CompiledAgent:
+        """Compiles agent code as-is (no prelude), as run by local start_agent."""
+        key = hashlib.sha256(f"plain:{filename}:{code}".encode()).hexdigest()
+        with self._lock:
+            compiled = self._cache.get(key)
+            if compiled is not None:
+                self._cache.move_to_end(key)
+                return compiled
+        try:
+            code_object = compile(code, filename, "exec")
+        except SyntaxError as e:
+            raise CodeCompileError([{"line": e.lineno, "message": f"syntax error: {e.msg}"}])
+        compiled = CompiledAgent(key=key, source=code, code=code_object, injected=())
+        self._put(key, compiled)
+        return compiled
+
+    def _put(self, key: str, compiled: CompiledAgent):
+        with self._lock:
+            self._cache[key] = compiled
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"cached": len(self._cache), "cache_size": self.cache_size}
+
+
+compiler = AgentCompiler()
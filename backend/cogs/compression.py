@@ -0,0 +1,118 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this go out as they are; compressing them costs more than it saves
+MINIMUM_SIZE = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+# Already compressed or meant to be read incrementally
+SKIPPED_TYPES = ("image/", "video/", "audio/", "application/zip", "application/gzip", "application/x-ndjson",
+                 "text/event-stream")
+
+
+def choose_encoding(accept_encoding: str | None) -> str | None:
+    """Picks br (when the brotli package is installed) or gzip from an Accept-Encoding header."""
+    if not accept_encoding:
+        return None
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def merge_vary(tokens: list, name: bytes) -> bytes:
+    """One Vary value listing `tokens` plus `name`, unless it is already there (or "*")."""
+    if not any(token.lower() in (name.lower(), b"*") for token in tokens):
+        tokens = [*tokens, name]
+    return b", ".join(tokens)
+
+
+class CompressionMiddleware:
+    """
+    Compresses complete response bodies of at least `minimum_size` bytes
+    with brotli or gzip, per the request's Accept-Encoding. Streaming
+    responses (NDJSON bulk results, logs) and responses that already carry
+    a Content-Encoding pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                response_headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                passthrough = (
+                    b"content-encoding" in response_headers
+                    or message["status"] in (204, 304)
+                    or content_type.startswith(SKIPPED_TYPES)
+                )
+                if passthrough:
+                    await send(start)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streamed or small: send as is
+                passthrough = True
+                await send(start)
+                return await send(message)
+            compressed = compress(body, encoding)
+            response_headers = []
+            # Keep what inner middleware varies on (CORS adds Origin) and add Accept-Encoding
+            vary = []
+            for k, v in start.get("headers", []):
+                if k.lower() == b"vary":
+                    vary += [token.strip() for token in v.split(b",") if token.strip()]
+                    continue
+                if k.lower() == b"content-length":
+                    continue
+                if k.lower() == b"etag" and not v.startswith(b"W/"):
+                    # The encoded bytes differ from what a strong ETag names; keep it valid for revalidation
+                    v = b"W/" + v
+                response_headers.append((k, v))
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", merge_vary(vary, b"Accept-Encoding")),
+            ]
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, wrapped_send)
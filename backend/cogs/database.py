@@ -1,13 +1,40 @@
 import sqlite3
 import os
 import time
+import zlib
 
-DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../_data"))
+from .metrics import instrument_methods
+
+# AGENT_DATA_DIR points a server (and the agents it spawns) at a separate data directory, e.g. for benchmarks
+DATA_DIR = os.path.abspath(os.environ.get("AGENT_DATA_DIR") or os.path.join(os.path.dirname(__file__), "../../_data"))
 os.makedirs(DATA_DIR, exist_ok=True)
 DB_PATH = os.path.join(DATA_DIR, "agents.db")
 
 PUB_SUB_DB_PATH = os.path.join(DATA_DIR, "pubsub.db")
+# OHLCV data is split over this many files (pubsub.db, pubsub-1.db, ...) so producers
+# on different shards do not queue on one SQLite write lock. Set it before data is written:
+# with a different count, existing agents' rows stay in the shard they hashed to before.
+PUB_SUB_SHARDS = int(os.environ.get("PUB_SUB_SHARDS", "1"))
+
+# Columns added after the original schema; created on startup if missing
+AGENT_EXTRA_COLUMNS = {
+    "restart_policy": "TEXT DEFAULT 'never'",
+    "max_restarts": "INTEGER DEFAULT 5",
+    # Per-agent resource limits (see cogs/resources.py)
+    "mem_limit_mb": "INTEGER",
+    "cpu_limit_s": "INTEGER",
+    "nice": "INTEGER",
+    "cpu_affinity": "TEXT",
+    # "process" (one interpreter per agent) or "shared" (packed into host processes)
+    "hosting": "TEXT DEFAULT 'process'",
+    # What to do when a producer this agent consumes from is stopped: "ignore" or "stop"
+    "on_producer_stop": "TEXT DEFAULT 'ignore'",
+    # Sum and count of individual ratings; reputation is their average unless set directly
+    "rating_total": "REAL DEFAULT 0",
+    "rating_count": "INTEGER DEFAULT 0",
+}
 
+@instrument_methods("agents")
 class AgentDatabase:
     def __init__(self, db_path=DB_PATH):
         self.db_path = db_path
@@ -40,6 +67,75 @@ class AgentDatabase:
                 )
                 """
             )
+            existing = {row[1] for row in c.execute("PRAGMA table_info(agents)")}
+            for column, ddl in AGENT_EXTRA_COLUMNS.items():
+                if column not in existing:
+                    c.execute(f"ALTER TABLE agents ADD COLUMN {column} {ddl}")
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS agent_ports (
+                    host TEXT NOT NULL,
+                    port INTEGER NOT NULL,
+                    agent_id TEXT NOT NULL,
+                    allocated_at REAL NOT NULL,
+                    PRIMARY KEY (host, port)
+                )
+                """
+            )
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS port_reservations (
+                    host TEXT NOT NULL,
+                    start_port INTEGER NOT NULL,
+                    end_port INTEGER NOT NULL,
+                    reason TEXT
+                )
+                """
+            )
+            # Runtime state shared between API workers/nodes (see cogs/shared_state.py)
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS agent_runtime (
+                    agent_id TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    pid INTEGER,
+                    port INTEGER,
+                    heartbeat REAL NOT NULL,
+                    lease_expires REAL NOT NULL
+                )
+                """
+            )
+            # On-chain RatingSubmitted totals per item (see cogs/rating_indexer.py); item ids are uint256 as text
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chain_ratings (
+                    item_id TEXT PRIMARY KEY,
+                    agent_id TEXT,
+                    total INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    last_block INTEGER NOT NULL
+                )
+                """
+            )
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS indexer_checkpoints (
+                    name TEXT PRIMARY KEY,
+                    block INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS api_workers (
+                    owner TEXT PRIMARY KEY,
+                    endpoint TEXT,
+                    heartbeat REAL NOT NULL
+                )
+                """
+            )
             conn.commit()
 
     def add_agent(self, 
@@ -62,21 +158,30 @@ class AgentDatabase:
                   summary: str = None, 
                   description: str = None,
                   type: str = None,
-                  function_agent_mapping: str = None):
+                  function_agent_mapping: str = None,
+                  **extra):
+        # extra may hold any of AGENT_EXTRA_COLUMNS (restart policy, limits, ...)
+        unknown = set(extra) - set(AGENT_EXTRA_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown agent columns: {', '.join(sorted(unknown))}")
+        extra_columns = [k for k, v in extra.items() if v is not None]
+        columns = [
+            "agent_id", "code", "agentverse_id",
+            "risk", "assetClass", "time", "currentStateOfMarket", "interest", "perf", "isNew", "reputation",
+            "name", "creator", "title", "summary", "description", "type", "function_agent_mapping",
+        ] + extra_columns
+        values = [agent_id, code, agentverse_id,
+                  risk, assetClass, time, currentStateOfMarket, interest, perf, isNew, reputation,
+                  name, creator, title, summary, description, type, function_agent_mapping,
+                  ] + [extra[k] for k in extra_columns]
         with sqlite3.connect(self.db_path) as conn:
             c = conn.cursor()
             c.execute(
-                """
-                INSERT INTO agents (
-                    agent_id, code, agentverse_id, 
-                    risk, assetClass, time, currentStateOfMarket, interest, perf, isNew, reputation,
-                    name, creator, title, summary, description, type, function_agent_mapping
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                f"""
+                INSERT INTO agents ({', '.join(columns)})
+                VALUES ({', '.join('?' for _ in columns)})
                 """,
-                (agent_id, code, agentverse_id, 
-                 risk, assetClass, time, currentStateOfMarket, interest, perf, isNew, reputation,
-                 name, creator, title, summary, description, type, function_agent_mapping),
+                values,
             )
             conn.commit()
 
@@ -152,19 +257,290 @@ class AgentDatabase:
             col_names = [desc[0] for desc in c.description]
             return [dict(zip(col_names, row)) for row in rows]
 
+    def list_agent_mappings(self) -> dict:
+        """Returns {agent_id: function_agent_mapping} for every agent (mapping may be None)."""
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute("SELECT agent_id, function_agent_mapping FROM agents")
+            return dict(c.fetchall())
+
     def update_reputation(self, agent_id: str, reputation: int):
         with sqlite3.connect(self.db_path) as conn:
             c = conn.cursor()
             c.execute("UPDATE agents SET reputation = ? WHERE agent_id = ?", (reputation, agent_id))
             conn.commit()
 
+    def apply_reputation_updates(self, updates: list) -> dict:
+        """
+        Applies buffered reputation changes in one transaction.
+
+        Args:
+            updates: (agent_id, reputation or None, rating_sum, rating_count) tuples; with reputation
+                None the new reputation is the average over stored plus added ratings
+
+        Returns:
+            {agent_id: {"reputation", "rating_total", "rating_count"}} for agents that still exist
+        """
+        written = {}
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            for agent_id, reputation, total, count in updates:
+                c.execute(
+                    """
+                    UPDATE agents SET
+                        rating_total = COALESCE(rating_total, 0) + ?,
+                        rating_count = COALESCE(rating_count, 0) + ?,
+                        reputation = COALESCE(?, CASE WHEN ? > 0
+                            THEN (COALESCE(rating_total, 0) + ?) / (COALESCE(rating_count, 0) + ?)
+                            ELSE reputation END)
+                    WHERE agent_id = ?
+                    RETURNING reputation, rating_total, rating_count
+                    """,
+                    (total, count, reputation, count, total, count, agent_id),
+                )
+                row = c.fetchone()
+                if row:
+                    written[agent_id] = {"reputation": row[0], "rating_total": row[1], "rating_count": row[2]}
+            conn.commit()
+        return written
+
+    def get_checkpoint(self, name: str) -> int | None:
+        """Returns the last block an indexer committed, or None if it never ran."""
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute("SELECT block FROM indexer_checkpoints WHERE name = ?", (name,))
+            row = c.fetchone()
+            return row[0] if row else None
+
+    def apply_rating_batch(self, name: str, from_block: int, to_block: int, deltas: dict, item_agents: dict) -> dict | None:
+        """
+        Adds one block range of ratings to chain_ratings and moves the
+        checkpoint in a single transaction, so a range is never counted twice.
+        agents.reputation is left to the caller's ReputationBuffer.
+
+        Args:
+            deltas: {item_id: (rating_sum, rating_count)} for the range
+            item_agents: {item_id: agent_id} for items that belong to an agent
+
+        Returns:
+            {agent_id: (rating_sum, rating_count)} added in this range per agent,
+            or None if the checkpoint was already past from_block (another worker indexed it)
+        """
+        updated = {}
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("SELECT block FROM indexer_checkpoints WHERE name = ?", (name,))
+            row = c.fetchone()
+            if row and row[0] >= from_block:
+                conn.rollback()
+                return None
+            for item_id, (total, count) in deltas.items():
+                c.execute(
+                    """
+                    INSERT INTO chain_ratings (item_id, agent_id, total, count, last_block) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (item_id) DO UPDATE SET
+                        agent_id = COALESCE(excluded.agent_id, agent_id),
+                        total = total + excluded.total,
+                        count = count + excluded.count,
+                        last_block = excluded.last_block
+                    RETURNING agent_id
+                    """,
+                    (item_id, item_agents.get(item_id), total, count, to_block),
+                )
+                agent_id = c.fetchone()[0]
+                if agent_id:
+                    agent_total, agent_count = updated.get(agent_id, (0, 0))
+                    updated[agent_id] = (agent_total + total, agent_count + count)
+            c.execute(
+                "INSERT OR REPLACE INTO indexer_checkpoints (name, block, updated_at) VALUES (?, ?, ?)",
+                (name, to_block, time.time()),
+            )
+            conn.commit()
+        return updated
+
+    def get_chain_ratings(self, agent_ids: list = None) -> dict:
+        """Returns {agent_id: {"item_id", "total", "count", "average", "last_block"}}."""
+        query = "SELECT agent_id, item_id, total, count, last_block FROM chain_ratings WHERE agent_id IS NOT NULL"
+        params = []
+        if agent_ids is not None:
+            agent_ids = list(agent_ids)
+            query += f" AND agent_id IN ({', '.join('?' * len(agent_ids))})"
+            params = agent_ids
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute(query, params)
+            return {
+                agent_id: {
+                    "item_id": item_id, "total": total, "count": count,
+                    "average": total / count if count else 0.0, "last_block": last_block,
+                }
+                for agent_id, item_id, total, count, last_block in c.fetchall()
+            }
+
+    def list_port_allocations(self, host: str) -> dict:
+        """Returns {port: agent_id} for every port allocated on a host."""
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute("SELECT port, agent_id FROM agent_ports WHERE host = ?", (host,))
+            return dict(c.fetchall())
+
+    def add_port_allocation(self, host: str, port: int, agent_id: str) -> bool:
+        """Claims a port; False if another worker on the same host already holds it."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(
+                    "INSERT INTO agent_ports (host, port, agent_id, allocated_at) VALUES (?, ?, ?, ?)",
+                    (host, port, agent_id, time.time()),
+                )
+                conn.commit()
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def delete_port_allocation(self, host: str, port: int, agent_id: str):
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM agent_ports WHERE host = ? AND port = ? AND agent_id = ?", (host, port, agent_id))
+            conn.commit()
+
+    def delete_stale_port_allocations(self, host: str) -> int:
+        """Drops a host's port rows whose agent no worker holds a live lease on (left by a crashed run)."""
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute(
+                """
+                DELETE FROM agent_ports
+                WHERE host = ? AND agent_id NOT IN (SELECT agent_id FROM agent_runtime WHERE lease_expires >= ?)
+                """,
+                (host, time.time()),
+            )
+            conn.commit()
+            return c.rowcount
+
+    def list_port_reservations(self, host: str) -> list:
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute("SELECT start_port, end_port, reason FROM port_reservations WHERE host = ?", (host,))
+            return [{"start": start, "end": end, "reason": reason} for start, end, reason in c.fetchall()]
+
+    def acquire_agent_lease(self, agent_id: str, owner: str, ttl: float) -> bool:
+        """Takes ownership of an agent if it is unowned, already ours, or its lease expired."""
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute(
+                """
+                INSERT INTO agent_runtime (agent_id, owner, status, heartbeat, lease_expires)
+                VALUES (?, ?, 'starting', ?, ?)
+                ON CONFLICT(agent_id) DO UPDATE SET
+                    owner = excluded.owner,
+                    heartbeat = excluded.heartbeat,
+                    lease_expires = excluded.lease_expires
+                WHERE agent_runtime.owner = excluded.owner OR agent_runtime.lease_expires < ?
+                """,
+                (agent_id, owner, now, now + ttl, now),
+            )
+            conn.commit()
+            return c.rowcount == 1
+
+    def update_agent_runtime(self, agent_id: str, owner: str, **fields):
+        if not fields:
+            return
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            assignments = ", ".join(f"{k} = ?" for k in fields)
+            c.execute(
+                f"UPDATE agent_runtime SET {assignments} WHERE agent_id = ? AND owner = ?",
+                [*fields.values(), agent_id, owner],
+            )
+            conn.commit()
+
+    def release_agent_lease(self, agent_id: str, owner: str):
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute("DELETE FROM agent_runtime WHERE agent_id = ? AND owner = ?", (agent_id, owner))
+            conn.commit()
+
+    def renew_agent_leases(self, owner: str, ttl: float, endpoint: str = None):
+        """Extends every lease held by owner and records the worker's heartbeat in one transaction."""
+        now = time.time()
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute(
+                "UPDATE agent_runtime SET heartbeat = ?, lease_expires = ? WHERE owner = ?",
+                (now, now + ttl, owner),
+            )
+            c.execute(
+                "INSERT OR REPLACE INTO api_workers (owner, endpoint, heartbeat) VALUES (?, ?, ?)",
+                (owner, endpoint, now),
+            )
+            conn.commit()
+
+    def get_agent_runtime(self, agent_id: str):
+        """Returns the shared runtime row joined with its owner's endpoint, or None."""
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute(
+                """
+                SELECT r.*, w.endpoint FROM agent_runtime r
+                LEFT JOIN api_workers w ON w.owner = r.owner
+                WHERE r.agent_id = ?
+                """,
+                (agent_id,),
+            )
+            row = c.fetchone()
+            if row:
+                columns = [desc[0] for desc in c.description]
+                return dict(zip(columns, row))
+            return None
+
+    def add_port_reservation(self, host: str, start_port: int, end_port: int, reason: str = None):
+        with sqlite3.connect(self.db_path) as conn:
+            c = conn.cursor()
+            c.execute(
+                "INSERT INTO port_reservations (host, start_port, end_port, reason) VALUES (?, ?, ?, ?)",
+                (host, start_port, end_port, reason),
+            )
+            conn.commit()
+
+def shard_index(agent_id: str, shards: int) -> int:
+    """Stable across processes (unlike hash()), so producers and readers pick the same file."""
+    return zlib.crc32(agent_id.encode()) % shards if shards > 1 else 0
+
+
+@instrument_methods("pubsub")
 class PubSubDatabase:
-    def __init__(self, db_path=PUB_SUB_DB_PATH):
+    """
+    OHLCV rows and lineage histograms, sharded by agent_id (lineage by
+    producer_id) over `shards` files. Per-agent reads and writes go to one
+    shard; queries not scoped to one agent fan out over all of them.
+    """
+
+    def __init__(self, db_path=PUB_SUB_DB_PATH, shards: int = PUB_SUB_SHARDS):
+        # Shard 0 is db_path itself, so an unsharded setup keeps reading its existing file
         self.db_path = db_path
+        root, ext = os.path.splitext(db_path)
+        self.shard_paths = [db_path] + [f"{root}-{i}{ext}" for i in range(1, max(1, shards))]
         self._init_db()
 
+    def _path(self, agent_id: str) -> str:
+        return self.shard_paths[shard_index(agent_id, len(self.shard_paths))]
+
     def _init_db(self):
+        for path in self.shard_paths:
+            self._init_shard(path)
         with sqlite3.connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS pubsub_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO pubsub_meta (key, value) VALUES ('shards', ?)", (str(len(self.shard_paths)),))
+            shards = int(conn.execute("SELECT value FROM pubsub_meta WHERE key = 'shards'").fetchone()[0])
+            conn.commit()
+        if shards != len(self.shard_paths):
+            print(f"Warning: {self.db_path} was created with {shards} shard(s) but PUB_SUB_SHARDS is "
+                  f"{len(self.shard_paths)}; agents may not find their existing OHLCV rows")
+
+    def _init_shard(self, path: str):
+        with sqlite3.connect(path) as conn:
             c = conn.cursor()
             c.execute(
                 """
@@ -181,6 +557,25 @@ class PubSubDatabase:
                 )
                 """
             )
+            # Wall clock nanoseconds at publish, for staleness tracing (see cogs/lineage.py)
+            existing = {row[1] for row in c.execute("PRAGMA table_info(ohlcv_data)")}
+            if "produced_ns" not in existing:
+                c.execute("ALTER TABLE ohlcv_data ADD COLUMN produced_ns INTEGER")
+            # Histogram buckets per (consumer, producer, metric); consumer is '' for producer-only metrics
+            c.execute(
+                """
+                CREATE TABLE IF NOT EXISTS lineage_metrics (
+                    consumer_id TEXT NOT NULL,
+                    producer_id TEXT NOT NULL,
+                    metric TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    total REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (consumer_id, producer_id, metric, bucket)
+                )
+                """
+            )
             conn.commit()
 
     def insert_row(self, 
@@ -191,7 +586,8 @@ class PubSubDatabase:
                    close_price: float,
                    volume: float,
                    arguments: str,
-                   timestamp: str = None):
+                   timestamp: str = None,
+                   produced_ns: int = None):
         """
         Insert a new OHLCV data row for a specific agent.
         
@@ -203,23 +599,49 @@ class PubSubDatabase:
             close_price: Closing price
             volume: Trading volume
             timestamp: Optional timestamp (defaults to current time)
+            produced_ns: Optional publish time in nanoseconds (defaults to current time)
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with sqlite3.connect(self._path(agent_id)) as conn:
             c = conn.cursor()
+            if produced_ns is None:
+                produced_ns = time.time_ns()
             if timestamp is None:
-                timestamp = time.time()
+                timestamp = produced_ns / 1e9
 
             c.execute(
                 """
                 INSERT INTO ohlcv_data (
-                    agent_id, open_price, high_price, low_price, close_price, volume, timestamp, arguments
+                    agent_id, open_price, high_price, low_price, close_price, volume, timestamp, arguments, produced_ns
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """,
-                (agent_id, open_price, high_price, low_price, close_price, volume, timestamp, arguments)
+                (agent_id, open_price, high_price, low_price, close_price, volume, timestamp, arguments, produced_ns)
             )
             conn.commit()
 
+    def insert_rows(self, rows: list):
+        """
+        Insert many OHLCV rows in one transaction.
+
+        Args:
+            rows: (agent_id, open, high, low, close, volume, timestamp, arguments[, produced_ns]) tuples
+        """
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(self._path(row[0]), []).append(row if len(row) == 9 else (*row, None))
+        for path, shard_rows in by_shard.items():
+            with sqlite3.connect(path) as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO ohlcv_data (
+                        agent_id, open_price, high_price, low_price, close_price, volume, timestamp, arguments, produced_ns
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    shard_rows,
+                )
+                conn.commit()
+
     def get_latest_row(self, agent_id: str, arguments = None):
         """
         Get the latest OHLCV data row for a specific agent.
@@ -230,11 +652,13 @@ class PubSubDatabase:
         Returns:
             Dictionary containing the latest OHLCV data or None if no data exists
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with sqlite3.connect(self._path(agent_id)) as conn:
             c = conn.cursor()
             where_clause = "WHERE agent_id = ? "
+            params = [agent_id]
             if arguments is not None:
                 where_clause += "AND arguments = ?"
+                params.append(str(arguments))
             c.execute(
                 f"""
                 SELECT * FROM ohlcv_data 
@@ -242,7 +666,7 @@ class PubSubDatabase:
                 ORDER BY timestamp DESC 
                 LIMIT 1
                 """,
-                (agent_id, arguments)
+                params
             )
             row = c.fetchone()
             if row:
@@ -261,7 +685,7 @@ class PubSubDatabase:
         Returns:
             List of dictionaries containing OHLCV data
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with sqlite3.connect(self._path(agent_id)) as conn:
             c = conn.cursor()
             if limit:
                 c.execute(
@@ -286,6 +710,132 @@ class PubSubDatabase:
             col_names = [desc[0] for desc in c.description]
             return [dict(zip(col_names, row)) for row in rows]
 
+    def get_bars_after(self, agent_id: str, arguments=None, after_id: int = 0, limit: int = 1024):
+        """
+        Get OHLCV rows with id greater than `after_id`, oldest first.
+
+        With after_id=0 the most recent `limit` rows are returned, for warm-up.
+
+        Returns:
+            List of (id, open, high, low, close, volume, timestamp) tuples
+        """
+        where_clause = "WHERE agent_id = ? AND id > ? "
+        params = [agent_id, after_id]
+        if arguments is not None:
+            where_clause += "AND arguments = ? "
+            params.append(str(arguments))
+        order = "DESC" if after_id == 0 else "ASC"
+        with sqlite3.connect(self._path(agent_id)) as conn:
+            c = conn.cursor()
+            c.execute(
+                f"""
+                SELECT id, open_price, high_price, low_price, close_price, volume, timestamp
+                FROM ohlcv_data
+                {where_clause}
+                ORDER BY id {order}
+                LIMIT ?
+                """,
+                [*params, limit]
+            )
+            rows = c.fetchall()
+            return rows[::-1] if after_id == 0 else rows
+
+    def get_history(self, agent_id: str, arguments=None, start: float = None, end: float = None, limit: int = None):
+        """
+        Get an agent's OHLCV history in publish order, for backtests.
+
+        Returns:
+            List of (open, high, low, close, volume, timestamp) tuples
+        """
+        where_clause = "WHERE agent_id = ? "
+        params = [agent_id]
+        if arguments is not None:
+            where_clause += "AND arguments = ? "
+            params.append(str(arguments))
+        if start is not None:
+            where_clause += "AND timestamp >= ? "
+            params.append(start)
+        if end is not None:
+            where_clause += "AND timestamp < ? "
+            params.append(end)
+        with sqlite3.connect(self._path(agent_id)) as conn:
+            c = conn.cursor()
+            c.execute(
+                f"""
+                SELECT open_price, high_price, low_price, close_price, volume, timestamp
+                FROM (
+                    SELECT * FROM ohlcv_data {where_clause}
+                    ORDER BY id DESC {"LIMIT ?" if limit else ""}
+                )
+                ORDER BY id ASC
+                """,
+                [*params, limit] if limit else params
+            )
+            return c.fetchall()
+
+    def add_lineage_counts(self, rows: list):
+        """
+        Adds histogram counts in one transaction.
+
+        Args:
+            rows: (consumer_id, producer_id, metric, bucket, count, total) tuples
+        """
+        now = time.time()
+        by_shard = {}
+        for row in rows:
+            by_shard.setdefault(self._path(row[1]), []).append((*row, now))
+        for path, shard_rows in by_shard.items():
+            with sqlite3.connect(path) as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO lineage_metrics (consumer_id, producer_id, metric, bucket, count, total, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (consumer_id, producer_id, metric, bucket) DO UPDATE SET
+                        count = count + excluded.count,
+                        total = total + excluded.total,
+                        updated_at = excluded.updated_at
+                    """,
+                    shard_rows,
+                )
+                conn.commit()
+
+    def get_lineage_counts(self, agent_ids: list):
+        """
+        Get the histogram rows of every edge touching one of `agent_ids`.
+
+        Returns:
+            List of (consumer_id, producer_id, metric, bucket, count, total, updated_at) tuples
+        """
+        agent_ids = list(agent_ids)
+        marks = ", ".join("?" * len(agent_ids))
+        # Edges live with their producer, and a consumer's producers can be on any shard
+        rows = []
+        for path in self.shard_paths:
+            with sqlite3.connect(path) as conn:
+                c = conn.cursor()
+                c.execute(
+                    f"""
+                    SELECT consumer_id, producer_id, metric, bucket, count, total, updated_at
+                    FROM lineage_metrics
+                    WHERE consumer_id IN ({marks}) OR producer_id IN ({marks})
+                    """,
+                    agent_ids + agent_ids
+                )
+                rows.extend(c.fetchall())
+        return sorted(rows, key=lambda row: row[:4])
+
+    def inserted_row_count(self) -> int:
+        """
+        Total OHLCV rows ever inserted, read from the AUTOINCREMENT sequence
+        so it keeps growing across deletes (a counter for insert rate).
+        """
+        total = 0
+        for path in self.shard_paths:
+            with sqlite3.connect(path) as conn:
+                row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'ohlcv_data'").fetchone()
+                total += row[0] if row else 0
+        return total
+
     def delete_agent_data(self, agent_id: str):
         """
         Delete all OHLCV data for a specific agent.
@@ -293,7 +843,10 @@ class PubSubDatabase:
         Args:
             agent_id: The agent identifier
         """
-        with sqlite3.connect(self.db_path) as conn:
-            c = conn.cursor()
-            c.execute("DELETE FROM ohlcv_data WHERE agent_id = ?", (agent_id,))
+        with sqlite3.connect(self._path(agent_id)) as conn:
+            conn.execute("DELETE FROM ohlcv_data WHERE agent_id = ?", (agent_id,))
             conn.commit()
+        for path in self.shard_paths:
+            with sqlite3.connect(path) as conn:
+                conn.execute("DELETE FROM lineage_metrics WHERE consumer_id = ? OR producer_id = ?", (agent_id, agent_id))
+                conn.commit()
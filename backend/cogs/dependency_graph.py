@@ -0,0 +1,125 @@
+from collections import defaultdict
+
+from .code_compiler import load_mappings
+
+# What happens to a consumer when one of its producers is stopped
+STOP_POLICIES = ("ignore", "stop")
+
+
+class DependencyCycleError(ValueError):
+    """Raised when function_agent_mapping edges would form a producer/consumer cycle."""
+
+    def __init__(self, cycle: list):
+        self.cycle = cycle
+        super().__init__("Dependency cycle: " + " -> ".join(cycle))
+
+
+def mapping_producers(raw) -> set:
+    """Producer agent ids referenced by a stored function_agent_mapping."""
+    agent_mapping, _ = load_mappings(raw)
+    return {producer for producer in agent_mapping.values() if producer}
+
+
+class DependencyGraph:
+    """
+    Producer -> consumer DAG built from every agent's function_agent_mapping.
+
+    Edges to agents that do not exist are kept out of the graph (their
+    injected functions simply return None), so they never block scheduling.
+    """
+
+    def __init__(self, mappings: dict):
+        # mappings: {consumer_id: raw function_agent_mapping}
+        self.nodes = set(mappings)
+        self.producers: dict[str, set] = defaultdict(set)
+        self.consumers: dict[str, set] = defaultdict(set)
+        for consumer, raw in mappings.items():
+            try:
+                producers = mapping_producers(raw)
+            except ValueError:
+                continue
+            for producer in producers & self.nodes:
+                self.producers[consumer].add(producer)
+                self.consumers[producer].add(consumer)
+
+    def upstream(self, agent_ids) -> set:
+        """agent_ids plus every agent they (transitively) consume from."""
+        return self._closure(agent_ids, self.producers)
+
+    def downstream(self, agent_ids) -> set:
+        """agent_ids plus every agent that (transitively) consumes from them."""
+        return self._closure(agent_ids, self.consumers)
+
+    @staticmethod
+    def _closure(agent_ids, edges: dict) -> set:
+        seen = set(agent_ids)
+        stack = list(seen)
+        while stack:
+            for neighbour in edges.get(stack.pop(), ()):
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    stack.append(neighbour)
+        return seen
+
+    def find_cycle(self, agent_ids=None) -> list | None:
+        """Returns one cycle as [a, b, ..., a] or None, searching from agent_ids (default: all nodes)."""
+        state = {}
+        for root in sorted(agent_ids if agent_ids is not None else self.nodes):
+            if root in state:
+                continue
+            path = []
+            stack = [(root, iter(sorted(self.consumers.get(root, ()))))]
+            state[root] = "open"
+            path.append(root)
+            while stack:
+                node, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    path.pop()
+                    state[node] = "done"
+                elif state.get(child) == "open":
+                    return path[path.index(child):] + [child]
+                elif child not in state:
+                    state[child] = "open"
+                    path.append(child)
+                    stack.append((child, iter(sorted(self.consumers.get(child, ())))))
+        return None
+
+    def levels(self, agent_ids) -> list[list]:
+        """
+        Topological levels of the subgraph induced by agent_ids: every agent
+        comes after all of its producers in the set. Raises DependencyCycleError.
+        """
+        subset = set(agent_ids)
+        indegree = {node: len(self.producers.get(node, set()) & subset) for node in subset}
+        level = sorted(node for node, degree in indegree.items() if degree == 0)
+        levels = []
+        while level:
+            levels.append(level)
+            following = []
+            for node in level:
+                for consumer in self.consumers.get(node, ()):
+                    if consumer in indegree:
+                        indegree[consumer] -= 1
+                        if indegree[consumer] == 0:
+                            following.append(consumer)
+            level = sorted(following)
+        if sum(len(level) for level in levels) != len(subset):
+            raise DependencyCycleError(self.find_cycle(subset) or sorted(subset))
+        return levels
+
+    def to_dict(self) -> dict:
+        edges = [
+            {"producer": producer, "consumer": consumer}
+            for producer, consumers in sorted(self.consumers.items())
+            for consumer in sorted(consumers)
+        ]
+        connected = {e["producer"] for e in edges} | {e["consumer"] for e in edges}
+        cycle = self.find_cycle(connected)
+        return {
+            "nodes": sorted(connected),
+            "edges": edges,
+            "cycle": cycle,
+            "levels": None if cycle else self.levels(connected),
+        }
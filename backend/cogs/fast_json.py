@@ -0,0 +1,59 @@
+import json
+import math
+
+from fastapi.responses import JSONResponse
+
+# orjson serializes in native code; without it the stdlib encoder produces the same JSON
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def _default(value):
+    # Same fallbacks jsonable_encoder would apply to the values our handlers return
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode(errors="replace")
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def _finite(value):
+    # NaN and +/-Infinity are not JSON; orjson writes them as null
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: _finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_finite(v) for v in value]
+    return value
+
+
+def dumps(content) -> bytes:
+    """Compact UTF-8 JSON bytes, matching what JSONResponse would send."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    try:
+        return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode()
+    except ValueError:
+        # Only payloads holding a non-finite float pay for the second pass
+        return json.dumps(_finite(content), default=lambda v: _finite(_default(v)), ensure_ascii=False,
+                          separators=(",", ":"), allow_nan=False).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response serialized with `dumps`. Returned directly from a handler
+    it also skips FastAPI's jsonable_encoder pass over the content, which
+    walks every value in Python before json.dumps walks them again.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
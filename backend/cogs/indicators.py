@@ -0,0 +1,274 @@
+from collections import deque
+
+import numpy as np
+
+# Incremental indicators: each update() takes one bar and costs O(1) (amortized for
+# Stochastic). The batch functions below compute the same series over whole arrays
+# and are used for warm-up, backtests and to check the incremental versions.
+
+
+class EMA:
+    """Exponential moving average seeded with the simple average of the first `period` values."""
+
+    def __init__(self, period: int = 20):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.value = None
+        self._seed_sum = 0.0
+        self._seen = 0
+
+    def update(self, x: float):
+        if self.value is None:
+            self._seed_sum += x
+            self._seen += 1
+            if self._seen == self.period:
+                self.value = self._seed_sum / self.period
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class RSI:
+    """Wilder's relative strength index."""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.value = None
+        self._prev = None
+        self._gain = 0.0
+        self._loss = 0.0
+        self._seen = 0
+
+    def update(self, close: float):
+        if self._prev is None:
+            self._prev = close
+            return None
+        change = close - self._prev
+        self._prev = close
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self._seen < self.period:
+            self._gain += gain
+            self._loss += loss
+            self._seen += 1
+            if self._seen < self.period:
+                return None
+            self._gain /= self.period
+            self._loss /= self.period
+        else:
+            self._gain = (self._gain * (self.period - 1) + gain) / self.period
+            self._loss = (self._loss * (self.period - 1) + loss) / self.period
+        self.value = 100.0 if self._loss == 0 else 100.0 - 100.0 / (1.0 + self._gain / self._loss)
+        return self.value
+
+
+class MACD:
+    """MACD line, signal line and histogram."""
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self._fast = EMA(fast)
+        self._slow = EMA(slow)
+        self._signal = EMA(signal)
+        self.value = None
+
+    def update(self, close: float):
+        fast = self._fast.update(close)
+        slow = self._slow.update(close)
+        if fast is None or slow is None:
+            return None
+        line = fast - slow
+        signal = self._signal.update(line)
+        self.value = {"macd": line, "signal": signal, "histogram": None if signal is None else line - signal}
+        return self.value
+
+
+class VWAP:
+    """Volume weighted average price of the typical price, cumulative or over the last `window` bars."""
+
+    def __init__(self, window: int = None):
+        self.window = window
+        self.value = None
+        self._pv = 0.0
+        self._volume = 0.0
+        self._bars = deque()
+
+    def update(self, high: float, low: float, close: float, volume: float):
+        pv = (high + low + close) / 3.0 * volume
+        self._pv += pv
+        self._volume += volume
+        if self.window:
+            self._bars.append((pv, volume))
+            if len(self._bars) > self.window:
+                old_pv, old_volume = self._bars.popleft()
+                self._pv -= old_pv
+                self._volume -= old_volume
+        self.value = self._pv / self._volume if self._volume else None
+        return self.value
+
+
+class Stochastic:
+    """Stochastic oscillator %K over `k` bars and %D as the `d`-bar average of %K."""
+
+    def __init__(self, k: int = 14, d: int = 3):
+        self.k = k
+        self.d = d
+        self.value = None
+        self._index = 0
+        # Monotonic deques of (index, value) give the rolling high/low in amortized O(1)
+        self._highs = deque()
+        self._lows = deque()
+        self._ks = deque()
+        self._k_sum = 0.0
+
+    def update(self, high: float, low: float, close: float):
+        i = self._index
+        self._index += 1
+        while self._highs and self._highs[-1][1] <= high:
+            self._highs.pop()
+        self._highs.append((i, high))
+        while self._lows and self._lows[-1][1] >= low:
+            self._lows.pop()
+        self._lows.append((i, low))
+        if self._highs[0][0] <= i - self.k:
+            self._highs.popleft()
+        if self._lows[0][0] <= i - self.k:
+            self._lows.popleft()
+        if self._index < self.k:
+            return None
+
+        highest, lowest = self._highs[0][1], self._lows[0][1]
+        k = 50.0 if highest == lowest else 100.0 * (close - lowest) / (highest - lowest)
+        self._ks.append(k)
+        self._k_sum += k
+        if len(self._ks) > self.d:
+            self._k_sum -= self._ks.popleft()
+        d = self._k_sum / self.d if len(self._ks) == self.d else None
+        self.value = {"k": k, "d": d}
+        return self.value
+
+
+# Indicators every producer stream gets; keys are what IndicatorEngine.latest returns
+DEFAULT_INDICATORS = {
+    "ema_20": lambda: EMA(20),
+    "rsi_14": lambda: RSI(14),
+    "macd": lambda: MACD(12, 26, 9),
+    "vwap": lambda: VWAP(),
+    "stochastic": lambda: Stochastic(14, 3),
+}
+
+
+def update_indicator(indicator, bar) -> object:
+    """Feeds one bar (open, high, low, close, volume) to any indicator above."""
+    _, high, low, close, volume = bar
+    if isinstance(indicator, VWAP):
+        return indicator.update(high, low, close, volume)
+    if isinstance(indicator, Stochastic):
+        return indicator.update(high, low, close)
+    return indicator.update(close)
+
+
+def ema(values: np.ndarray, period: int) -> np.ndarray:
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(values), np.nan)
+    if len(values) < period:
+        return out
+    alpha = 2.0 / (period + 1)
+    value = values[:period].mean()
+    out[period - 1] = value
+    for i in range(period, len(values)):
+        value += alpha * (values[i] - value)
+        out[i] = value
+    return out
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    close = np.asarray(close, dtype=float)
+    out = np.full(len(close), np.nan)
+    if len(close) <= period:
+        return out
+    change = np.diff(close)
+    gains, losses = np.clip(change, 0, None), np.clip(-change, 0, None)
+    gain, loss = gains[:period].mean(), losses[:period].mean()
+    for i in range(period, len(close)):
+        if i > period:
+            gain = (gain * (period - 1) + gains[i - 1]) / period
+            loss = (loss * (period - 1) + losses[i - 1]) / period
+        out[i] = 100.0 if loss == 0 else 100.0 - 100.0 / (1.0 + gain / loss)
+    return out
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> tuple:
+    line = ema(close, fast) - ema(close, slow)
+    valid = ~np.isnan(line)
+    signal_line = np.full(len(line), np.nan)
+    signal_line[valid] = ema(line[valid], signal)
+    return line, signal_line, line - signal_line
+
+
+def vwap(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray, window: int = None) -> np.ndarray:
+    pv = (np.asarray(high) + np.asarray(low) + np.asarray(close)) / 3.0 * np.asarray(volume)
+    cum_pv, cum_volume = np.cumsum(pv), np.cumsum(volume, dtype=float)
+    if window:
+        cum_pv[window:] = cum_pv[window:] - cum_pv[:-window]
+        cum_volume[window:] = cum_volume[window:] - cum_volume[:-window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(cum_volume > 0, cum_pv / cum_volume, np.nan)
+
+
+def stochastic(high: np.ndarray, low: np.ndarray, close: np.ndarray, k: int = 14, d: int = 3) -> tuple:
+    high, low, close = (np.asarray(a, dtype=float) for a in (high, low, close))
+    percent_k = np.full(len(close), np.nan)
+    percent_d = np.full(len(close), np.nan)
+    if len(close) < k:
+        return percent_k, percent_d
+    highest = np.lib.stride_tricks.sliding_window_view(high, k).max(axis=1)
+    lowest = np.lib.stride_tricks.sliding_window_view(low, k).min(axis=1)
+    span = highest - lowest
+    with np.errstate(invalid="ignore", divide="ignore"):
+        percent_k[k - 1:] = np.where(span == 0, 50.0, 100.0 * (close[k - 1:] - lowest) / span)
+    if len(close) >= k + d - 1:
+        percent_d[k + d - 2:] = np.lib.stride_tricks.sliding_window_view(percent_k[k - 1:], d).mean(axis=1)
+    return percent_k, percent_d
+
+
+class _StreamState:
+    __slots__ = ("source", "last_id", "indicators")
+
+    def __init__(self, source: str, factories: dict):
+        self.source = source
+        self.last_id = 0
+        self.indicators = {name: factory() for name, factory in factories.items()}
+
+
+class IndicatorEngine:
+    """
+    Keeps incremental indicator state per (producer agent, arguments) stream.
+
+    Each call to `latest` only feeds the bars published since the previous
+    call, so the cost per tick does not depend on the history length.
+    """
+
+    def __init__(self, bars, factories: dict = None):
+        self.bars = bars
+        self.factories = factories or DEFAULT_INDICATORS
+        self._states: dict[tuple, _StreamState] = {}
+
+    def latest(self, agent_id: str, arguments=None) -> dict:
+        key = (agent_id, None if arguments is None else str(arguments))
+        state = self._states.get(key)
+        last_id, known_source = (state.last_id, state.source) if state else (0, None)
+        source, new_bars, reset = self.bars.bars_since(agent_id, arguments, last_id, known_source)
+        if state is None or reset:
+            # First call, the producer moved between the ring and SQLite, or bars were lost: re-warm
+            state = self._states[key] = _StreamState(source, self.factories)
+        for bar_id, *bar in new_bars:
+            for indicator in state.indicators.values():
+                update_indicator(indicator, bar)
+            state.last_id = bar_id
+        return {name: indicator.value for name, indicator in state.indicators.items()}
+
+    def reset(self, agent_id: str = None):
+        if agent_id is None:
+            self._states.clear()
+        else:
+            for key in [k for k in self._states if k[0] == agent_id]:
+                del self._states[key]
@@ -0,0 +1,142 @@
+import atexit
+import bisect
+import threading
+import time
+
+# Histogram upper bounds in seconds (1 us .. 1000 s, 1-2.5-5 per decade); one overflow bucket past the end
+BUCKET_BOUNDS = tuple(m * 10.0 ** e for e in range(-6, 3) for m in (1, 2.5, 5)) + (1000.0,)
+FLUSH_INTERVAL_S = 5.0
+
+
+class LineageRecorder:
+    """
+    Per-process staleness and latency histograms for injected reads.
+
+    Recording is a bisect and two additions on a dict in the calling
+    thread; a daemon thread adds the counts to PubSubDatabase every
+    FLUSH_INTERVAL_S, so agents never wait on SQLite to record.
+
+    Metrics, per (consumer, producer) edge:
+      staleness      read time - the bar's produce time
+      read_latency   duration of the read itself (ring or SQLite fallback)
+      read_interval  time between two reads of the same producer
+    and per producer (consumer ''):
+      persist_lag    produce time -> committed to SQLite by the bar persister
+    """
+
+    clock = staticmethod(time.time_ns)
+
+    def __init__(self, pubsub, consumer_id: str, flush_interval: float = FLUSH_INTERVAL_S):
+        self.pubsub = pubsub
+        self.consumer_id = consumer_id
+        self.flush_interval = flush_interval
+        # (consumer, producer, metric) -> [[count, total] per bucket]
+        self._counts: dict[tuple, list] = {}
+        self._last_read: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record_read(self, producer_id: str, row, started_ns: int):
+        """Called by an injected function after reading `row` (None if nothing was there)."""
+        now = time.time_ns()
+        consumer_id = self.consumer_id
+        previous = self._last_read.get(producer_id)
+        self._last_read[producer_id] = now
+        produced_ns = row.get("produced_ns") if row else None
+        with self._lock:
+            self._add((consumer_id, producer_id, "read_latency"), (now - started_ns) / 1e9)
+            if previous is not None:
+                self._add((consumer_id, producer_id, "read_interval"), (now - previous) / 1e9)
+            if produced_ns:
+                self._add((consumer_id, producer_id, "staleness"), max(0, now - produced_ns) / 1e9)
+        if self._thread is None:
+            self._start()
+
+    def observe(self, consumer_id: str, producer_id: str, metric: str, seconds: float):
+        with self._lock:
+            self._add((consumer_id, producer_id, metric), seconds)
+        if self._thread is None:
+            self._start()
+
+    def _add(self, key: tuple, seconds: float):
+        buckets = self._counts.get(key)
+        if buckets is None:
+            buckets = self._counts[key] = [[0, 0.0] for _ in range(len(BUCKET_BOUNDS) + 1)]
+        cell = buckets[bisect.bisect_left(BUCKET_BOUNDS, seconds)]
+        cell[0] += 1
+        cell[1] += seconds
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._flush_loop, name="lineage-flush", daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        rows = [
+            (*key, bucket, count, total)
+            for key, buckets in counts.items()
+            for bucket, (count, total) in enumerate(buckets)
+            if count
+        ]
+        if not rows:
+            return
+        try:
+            self.pubsub.add_lineage_counts(rows)
+        except Exception as e:
+            print(f"Writing lineage metrics failed: {e}")
+
+
+def _quantile(buckets: list, total: int, q: float) -> float:
+    """Upper bound of the bucket holding the q-quantile (the overflow bucket reports the last bound)."""
+    target = q * total
+    seen = 0
+    for bucket, count in enumerate(buckets):
+        seen += count
+        if count and seen >= target:
+            return BUCKET_BOUNDS[min(bucket, len(BUCKET_BOUNDS) - 1)]
+    return BUCKET_BOUNDS[-1]
+
+
+def summarize(rows: list) -> dict:
+    """
+    Folds get_lineage_counts rows into
+    {(consumer, producer): {metric: {count, mean_s, p50_s, p90_s, p99_s, buckets, updated_at}}}.
+    """
+    histograms = {}
+    for consumer_id, producer_id, metric, bucket, count, total, updated_at in rows:
+        entry = histograms.setdefault((consumer_id, producer_id), {}).setdefault(
+            metric, {"counts": [0] * (len(BUCKET_BOUNDS) + 1), "sum": 0.0, "updated_at": 0.0},
+        )
+        entry["counts"][bucket] += count
+        entry["sum"] += total
+        entry["updated_at"] = max(entry["updated_at"], updated_at)
+    summary = {}
+    for edge, metrics in histograms.items():
+        summary[edge] = {}
+        for metric, entry in metrics.items():
+            counts = entry["counts"]
+            count = sum(counts)
+            summary[edge][metric] = {
+                "count": count,
+                "mean_s": entry["sum"] / count,
+                "p50_s": _quantile(counts, count, 0.5),
+                "p90_s": _quantile(counts, count, 0.9),
+                "p99_s": _quantile(counts, count, 0.99),
+                # Cumulative, Prometheus style: le is the bucket's upper bound ("+Inf" for overflow)
+                "buckets": [
+                    {"le": BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else "+Inf", "count": sum(counts[:i + 1])}
+                    for i, c in enumerate(counts) if c
+                ],
+                "updated_at": entry["updated_at"],
+            }
+    return summary
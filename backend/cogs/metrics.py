@@ -0,0 +1,265 @@
+import bisect
+import functools
+import threading
+import time
+
+# Seconds; wide enough for sub-millisecond SQLite reads and multi-second spawns
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        # += on an attribute is not atomic, but a lost increment under contention is acceptable for metrics
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+    _new_child = staticmethod(_CounterChild)
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, seconds: float):
+        self.labels().observe(seconds)
+
+    def time(self):
+        return self.labels().time()
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            counts = list(child.counts)
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {child.sum!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class GaugeFunc(_Metric):
+    """Gauge (or counter) read at scrape time: collect() returns {label values tuple: value}."""
+
+    def __init__(self, name: str, help: str, labelnames: tuple, collect, kind: str = "gauge"):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        try:
+            values = self.collect()
+        except Exception as e:
+            return self.header() + [f"# collect failed: {_escape(e)}"]
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values.items()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # Re-registering a name (module reload, second StrategyManager) replaces the collector
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ("method", "route", "status"),
+))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "db_query_duration_seconds", "Time spent in each AgentDatabase/PubSubDatabase method", ("db", "method"),
+))
+RECOMMEND_PHASE_SECONDS = REGISTRY.register(Histogram(
+    "recommend_phase_duration_seconds", "recommend() time per phase", ("phase",),
+))
+AGENT_SPAWN_SECONDS = REGISTRY.register(Histogram(
+    "agent_spawn_duration_seconds", "Time from a start/deploy call until the agent process exists", ("mode",),
+))
+SPAWN_QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "agent_spawn_queue_wait_seconds", "Time start/deploy requests waited for admission", (),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+))
+
+
+def instrument_methods(db_label: str):
+    """Class decorator: times every public method into db_query_duration_seconds{db, method}."""
+
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or not callable(method):
+                continue
+            child = DB_QUERY_SECONDS.labels(db_label, name)
+
+            def wrap(method, child):
+                @functools.wraps(method)
+                def timed(*args, **kwargs):
+                    started = time.perf_counter()
+                    try:
+                        return method(*args, **kwargs)
+                    finally:
+                        child.observe(time.perf_counter() - started)
+                return timed
+
+            setattr(cls, name, wrap(method, child))
+        return cls
+
+    return decorate
+
+
+class PhaseTimer:
+    """Records the time between successive mark() calls as phases of one histogram."""
+
+    __slots__ = ("histogram", "last")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.last = time.perf_counter()
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.histogram.labels(phase).observe(now - self.last)
+        self.last = now
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template (not the raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def wrapped_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route_template(scope), status).observe(
+                time.perf_counter() - started
+            )
+
+
+def route_template(scope) -> str:
+    """
+    /agents/{agent_id}/start for /agents/3f2c.../start, so one series per
+    route rather than per URL. Rebuilt from path_params because routes of an
+    included router do not carry the router prefix in their own path.
+    """
+    if scope.get("route") is None:
+        return "unmatched"
+    params = {str(value): name for name, value in scope.get("path_params", {}).items()}
+    if not params:
+        return scope["path"]
+    return "/".join("{" + params[part] + "}" if part in params else part for part in scope["path"].split("/"))
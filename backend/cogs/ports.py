@@ -0,0 +1,124 @@
+import os
+import socket
+import threading
+from collections import deque
+
+DEFAULT_PORT_RANGE = os.environ.get("AGENT_PORT_RANGE", "23000-30000")
+
+
+def parse_port_ranges(spec: str) -> list[tuple[int, int]]:
+    """Parses "23000-23999,24500" into inclusive (start, end) ranges."""
+    ranges = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            ranges.append((int(start), int(end)))
+        else:
+            ranges.append((int(part), int(part)))
+    return ranges
+
+
+def is_bindable(port: int, host: str = "0.0.0.0") -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            s.bind((host, port))
+        except OSError:
+            return False
+    return True
+
+
+class PortAllocator:
+    """
+    Hands out agent ports from a free list persisted in the agents database.
+
+    Allocations are keyed by host so several machines can share one database.
+    A port popped from the free list is only handed out if it can actually be
+    bound and its (host, port) row can be inserted; ports held by something
+    outside the registry, or claimed by another worker on the same host, go to
+    the back of the list and are retried later. Rows whose agent has no live
+    lease are reclaimed at startup and whenever the free list runs dry.
+    """
+
+    def __init__(self, db, host: str = None, port_range: str = DEFAULT_PORT_RANGE):
+        self.db = db
+        self.host = host or socket.gethostname()
+        self.ranges = parse_port_ranges(port_range)
+        self._lock = threading.Lock()
+        self._reclaim()
+
+    def _reclaim(self):
+        stale = self.db.delete_stale_port_allocations(self.host)
+        if stale:
+            print(f"Reclaimed {stale} stale agent port allocation(s) on {self.host}")
+        self._by_port: dict[int, str] = self.db.list_port_allocations(self.host)
+        self._by_agent: dict[str, int] = {agent_id: port for port, agent_id in self._by_port.items()}
+        self._rebuild_free_list()
+
+    def _reserved(self) -> set[int]:
+        reserved = set()
+        for r in self.db.list_port_reservations(self.host):
+            reserved.update(range(r["start"], r["end"] + 1))
+        return reserved
+
+    def _rebuild_free_list(self):
+        reserved = self._reserved()
+        self._free = deque(
+            port
+            for start, end in self.ranges
+            for port in range(start, end + 1)
+            if port not in self._by_port and port not in reserved
+        )
+        self._reserved_ports = reserved
+
+    def allocate(self, agent_id: str) -> int:
+        with self._lock:
+            port = self._by_agent.get(agent_id)
+            if port is not None:
+                return port
+            for attempt in range(2):
+                # Each port is tried at most once per pass; busy or taken ones rotate to the back
+                for _ in range(len(self._free)):
+                    port = self._free.popleft()
+                    # The DB insert is the claim: it fails if another worker got the port first
+                    if is_bindable(port) and self.db.add_port_allocation(self.host, port, agent_id):
+                        self._by_port[port] = agent_id
+                        self._by_agent[agent_id] = port
+                        return port
+                    self._free.append(port)
+                if attempt == 0:
+                    self._reclaim()
+            raise RuntimeError(f"No free agent ports left on {self.host}")
+
+    def release(self, agent_id: str) -> int | None:
+        with self._lock:
+            port = self._by_agent.pop(agent_id, None)
+            if port is None:
+                return None
+            del self._by_port[port]
+            self.db.delete_port_allocation(self.host, port, agent_id)
+            if port not in self._reserved_ports and any(start <= port <= end for start, end in self.ranges):
+                self._free.append(port)
+            return port
+
+    def port_of(self, agent_id: str) -> int | None:
+        return self._by_agent.get(agent_id)
+
+    def reserve(self, start: int, end: int, reason: str = None):
+        """Keeps a range out of the free list on this host (already allocated ports stay allocated)."""
+        with self._lock:
+            self.db.add_port_reservation(self.host, start, end, reason)
+            self._rebuild_free_list()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "host": self.host,
+                "ranges": [{"start": start, "end": end} for start, end in self.ranges],
+                "reservations": self.db.list_port_reservations(self.host),
+                "allocated": len(self._by_port),
+                "free": len(self._free),
+            }
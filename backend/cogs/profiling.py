@@ -0,0 +1,226 @@
+import hmac
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+from .database import DATA_DIR
+from .metrics import route_template
+
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+# Requests carrying "X-Profile: <PROFILE_TOKEN>" are always profiled; without a token only sampling applies
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_PATHS = tuple(p for p in os.environ.get("PROFILE_PATHS", "/recommend/recommend,/agents/search").split(",") if p)
+# Sampled (not header-triggered) profiles are kept only for requests at least this slow
+PROFILE_MIN_MS = float(os.environ.get("PROFILE_MIN_MS", "0"))
+PROFILE_INTERVAL_S = float(os.environ.get("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "200"))
+
+# Leaf frames of threads that are parked rather than working
+_IDLE_LEAVES = {
+    ("threading.py", "wait"), ("selectors.py", "select"), ("queue.py", "get"), ("thread.py", "_worker"),
+}
+_PROFILE_ID = re.compile(r"^\d+-[0-9a-f]{6}$")
+_FILE_NAME = re.compile(r"^(?P<id>\d+-[0-9a-f]{6})-(?P<method>[A-Z]+)-(?P<route>.*)-(?P<ms>\d+)ms\.folded$")
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of every busy thread at a fixed interval and
+    counts them in collapsed form ("thread;module:function;... count"), the
+    input flamegraph.pl and speedscope read. Sync handlers run on a
+    threadpool worker, where neither cProfile nor the event loop can see
+    them, so all threads are sampled; concurrent requests show up under
+    their own thread names.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_S):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if any(code.co_filename.endswith(f) and code.co_name == n for f, n in _IDLE_LEAVES):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """Collapsed-stack files under PROFILE_DIR, oldest removed beyond max_files."""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+
+    def save(self, profile_id: str, method: str, route: str, duration_ms: float, collapsed: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+        name = f"{profile_id}-{method}-{slug}-{duration_ms:.0f}ms.folded"
+        with open(os.path.join(self.directory, name), "w") as f:
+            f.write(collapsed)
+        self.prune()
+        return name
+
+    def prune(self):
+        names = sorted(self._names())
+        for name in names[:max(0, len(names) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _names(self) -> list[str]:
+        try:
+            return [name for name in os.listdir(self.directory) if _FILE_NAME.match(name)]
+        except FileNotFoundError:
+            return []
+
+    def list(self) -> list[dict]:
+        profiles = []
+        for name in sorted(self._names(), reverse=True):
+            match = _FILE_NAME.match(name)
+            profiles.append({
+                "id": match["id"],
+                "method": match["method"],
+                "route": match["route"],
+                "duration_ms": int(match["ms"]),
+                "created_at": int(match["id"].split("-")[0]) / 1000,
+                "bytes": os.path.getsize(os.path.join(self.directory, name)),
+            })
+        return profiles
+
+    def read(self, profile_id: str) -> str | None:
+        for name in self._names():
+            if name.startswith(profile_id + "-"):
+                with open(os.path.join(self.directory, name)) as f:
+                    return f.read()
+        return None
+
+
+store = ProfileStore()
+
+
+def token_matches(value: str | None) -> bool:
+    return bool(PROFILE_TOKEN and value and hmac.compare_digest(value.encode(), PROFILE_TOKEN.encode()))
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests that carry an authorized X-Profile header, plus a
+    PROFILE_SAMPLE_RATE fraction of requests to PROFILE_PATHS. The profile
+    id goes back in an X-Profile-Id header; the stacks are written once the
+    response has been sent.
+    """
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE, paths: tuple = PROFILE_PATHS,
+                 min_ms: float = PROFILE_MIN_MS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.paths = paths
+        self.min_ms = min_ms
+
+    def _wanted(self, scope) -> tuple[bool, bool]:
+        """(profile this request, requested explicitly)"""
+        for key, value in scope.get("headers") or []:
+            if key == b"x-profile":
+                if token_matches(value.decode("latin-1")):
+                    return True, True
+                break
+        sampled = (
+            self.sample_rate > 0
+            and scope["path"].startswith(self.paths)
+            and random.random() < self.sample_rate
+        )
+        return sampled, False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        wanted, explicit = self._wanted(scope)
+        if not wanted:
+            return await self.app(scope, receive, send)
+
+        profile_id = f"{int(time.time() * 1000)}-{secrets.token_hex(3)}"
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        sampler = StackSampler().start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            # Joining the sampler and writing the file both block; keep them off the event loop
+            await run_in_threadpool(sampler.stop)
+            if explicit or duration_ms >= self.min_ms:
+                try:
+                    await run_in_threadpool(
+                        store.save, profile_id, scope["method"], route_template(scope), duration_ms, sampler.collapsed()
+                    )
+                except OSError as e:
+                    print(f"Could not store profile {profile_id}: {e}")
+
+
+admin_router = APIRouter()
+
+
+# Authenticated with X-Profile-Token, not X-Profile, so reading profiles does not create new ones
+def _require_token(token: str | None):
+    if not token_matches(token):
+        # Same answer whether profiling is disabled or the token is wrong
+        raise HTTPException(status_code=404, detail="Not found")
+
+
+@admin_router.get("/")
+def list_profiles(x_profile_token: str | None = Header(default=None)):
+    _require_token(x_profile_token)
+    return {"profiles": store.list(), "max_files": store.max_files, "sample_rate": PROFILE_SAMPLE_RATE}
+
+
+@admin_router.get("/{profile_id}", response_class=PlainTextResponse)
+def get_profile(profile_id: str, x_profile_token: str | None = Header(default=None)):
+    """Collapsed stacks; feed to flamegraph.pl or drop into speedscope.app."""
+    _require_token(x_profile_token)
+    collapsed = store.read(profile_id) if _PROFILE_ID.match(profile_id) else None
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(collapsed)
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+import uuid
+
+# keccak256("RatingSubmitted(uint256,uint8,address)"), topic0 of RatingSystem.sol's event
+RATING_SUBMITTED_TOPIC = "0xeac902bdb0d3f4c7fe0f633169748d4791d90e369f5dfe7fd54362dc87b9ef89"
+# Deployment used by the marketplace frontend (contracts/ignition/deployments/chain-296)
+DEFAULT_CONTRACT = "0xb565D50e7742039f3FD65229394d29fF28DBc5d7"
+CHECKPOINT_NAME = "rating_submitted"
+BATCH_BLOCKS = 2000
+MIN_BATCH_BLOCKS = 16
+
+
+class RpcError(Exception):
+    pass
+
+
+class RpcResponseError(RpcError):
+    """The node answered with a JSON-RPC error (e.g. a log range with too many results)."""
+
+
+def item_id_for(agent_id: str) -> str | None:
+    """
+    uint256 item id the frontend rates an agent under: numeric agent ids are
+    used as-is (Number(agent_id) in StrategyModal), UUIDs as their 128-bit integer.
+    """
+    if agent_id.isdigit():
+        return str(int(agent_id))
+    try:
+        return str(uuid.UUID(agent_id).int)
+    except ValueError:
+        return None
+
+
+def decode_rating_log(log: dict) -> tuple[str, int, str, int]:
+    """Returns (item_id, rating, rater, block_number) from a RatingSubmitted log."""
+    data = log["data"][2:]
+    return (
+        str(int(log["topics"][1], 16)),
+        int(data[0:64], 16),
+        "0x" + data[64 + 24:128],
+        int(log["blockNumber"], 16),
+    )
+
+
+class JsonRpcClient:
+    def __init__(self, url: str, timeout: float = 30.0):
+        self.url = url
+        self.timeout = timeout
+        self._id = 0
+
+    def call(self, method: str, params: list):
+        self._id += 1
+        body = json.dumps({"jsonrpc": "2.0", "id": self._id, "method": method, "params": params}).encode()
+        request = urllib.request.Request(self.url, data=body, method="POST")
+        request.add_header("Content-Type", "application/json")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                payload = json.loads(response.read())
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise RpcError(f"{method} failed: {e}")
+        if payload.get("error"):
+            raise RpcResponseError(f"{method} failed: {payload['error'].get('message', payload['error'])}")
+        return payload["result"]
+
+
+class RatingIndexer:
+    """
+    Follows RatingSubmitted logs and turns them into agent reputation.
+
+    Logs are pulled with eth_getLogs over block ranges of up to
+    `batch_blocks`; each range is summed per item in memory and committed
+    together with the checkpoint in one SQLite transaction, so a restart
+    resumes after the last committed range. Ranges the node refuses (too
+    many results) are halved and retried. `confirmations` keeps the indexer
+    that many blocks behind the head to stay clear of reorgs. Per-agent sums
+    go to `on_update`, which feeds them to the ReputationBuffer like any
+    other rating.
+    """
+
+    def __init__(self, db, rpc_url: str, contract: str = DEFAULT_CONTRACT, start_block: int = 0,
+                 batch_blocks: int = BATCH_BLOCKS, confirmations: int = 0, poll_interval: float = 5.0,
+                 on_update=None):
+        self.db = db
+        self.rpc = JsonRpcClient(rpc_url)
+        self.contract = contract
+        self.start_block = start_block
+        self.batch_blocks = batch_blocks
+        self.confirmations = confirmations
+        self.poll_interval = poll_interval
+        # Called with {agent_id: (rating_sum, rating_count)} after every committed batch
+        self.on_update = on_update
+        self.stats = {"batches": 0, "logs": 0, "last_block": None, "last_error": None}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get_logs(self, from_block: int, to_block: int) -> list:
+        return self.rpc.call("eth_getLogs", [{
+            "address": self.contract,
+            "topics": [RATING_SUBMITTED_TOPIC],
+            "fromBlock": hex(from_block),
+            "toBlock": hex(to_block),
+        }])
+
+    def run_once(self) -> int:
+        """Indexes every confirmed block after the checkpoint. Returns the number of logs applied."""
+        head = int(self.rpc.call("eth_blockNumber", []), 16) - self.confirmations
+        checkpoint = self.db.get_checkpoint(CHECKPOINT_NAME)
+        from_block = self.start_block if checkpoint is None else checkpoint + 1
+        applied = 0
+        size = self.batch_blocks
+        while from_block <= head and not self._stop.is_set():
+            to_block = min(from_block + size - 1, head)
+            try:
+                logs = self.get_logs(from_block, to_block)
+            except RpcResponseError:
+                if size <= MIN_BATCH_BLOCKS:
+                    raise
+                size = max(MIN_BATCH_BLOCKS, size // 2)
+                continue
+            self._apply(logs, from_block, to_block)
+            applied += len(logs)
+            # A reduced range size is kept for the rest of this pass; the next poll starts full size again
+            from_block = to_block + 1
+        return applied
+
+    def _apply(self, logs: list, from_block: int, to_block: int):
+        deltas = {}
+        for log in logs:
+            if log.get("removed"):
+                continue
+            item_id, rating, _, _ = decode_rating_log(log)
+            total, count = deltas.get(item_id, (0, 0))
+            deltas[item_id] = (total + rating, count + 1)
+        item_agents = {}
+        if deltas:
+            for agent_id in self.db.list_agent_mappings():
+                item_id = item_id_for(agent_id)
+                if item_id in deltas:
+                    item_agents[item_id] = agent_id
+        updated = self.db.apply_rating_batch(CHECKPOINT_NAME, from_block, to_block, deltas, item_agents)
+        if updated is None:
+            # Another API worker committed this range first
+            return
+        self.stats["batches"] += 1
+        self.stats["logs"] += len(logs)
+        self.stats["last_block"] = to_block
+        if updated and self.on_update:
+            self.on_update(updated)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="rating-indexer", daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.stats["last_error"] = None
+            except Exception as e:
+                self.stats["last_error"] = str(e)
+                print(f"Rating indexer: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def indexer_from_env(db, on_update=None) -> RatingIndexer | None:
+    """Builds the indexer when RATING_RPC_URL is set (e.g. http://127.0.0.1:8545 for a hardhat node)."""
+    rpc_url = os.environ.get("RATING_RPC_URL")
+    if not rpc_url:
+        return None
+    return RatingIndexer(
+        db, rpc_url,
+        contract=os.environ.get("RATING_CONTRACT_ADDRESS", DEFAULT_CONTRACT),
+        start_block=int(os.environ.get("RATING_START_BLOCK", "0")),
+        batch_blocks=int(os.environ.get("RATING_BATCH_BLOCKS", str(BATCH_BLOCKS))),
+        confirmations=int(os.environ.get("RATING_CONFIRMATIONS", "0")),
+        on_update=on_update,
+    )
@@ -0,0 +1,191 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+# Agent record columns that configure per-agent resource limits
+LIMIT_FIELDS = ("mem_limit_mb", "cpu_limit_s", "nice", "cpu_affinity")
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def parse_cpu_list(spec) -> set[int] | None:
+    """Parses a CPU list such as "0,2-3" into a set of CPU indices."""
+    if spec in (None, ""):
+        return None
+    if isinstance(spec, (list, tuple, set)):
+        return {int(cpu) for cpu in spec}
+    cpus = set()
+    for part in str(spec).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus or None
+
+
+def limits_from_record(record: dict) -> dict:
+    return {field: record.get(field) for field in LIMIT_FIELDS if record.get(field) not in (None, "")}
+
+
+def apply_limits(limits: dict | None):
+    """
+    Applies resource limits to the current process. Meant to run in the child:
+    the Process target, or the limited_command wrapper before it execs.
+    """
+    if not limits:
+        return
+    mem_limit_mb = limits.get("mem_limit_mb")
+    if mem_limit_mb:
+        limit = int(mem_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    cpu_limit_s = limits.get("cpu_limit_s")
+    if cpu_limit_s:
+        # SIGXCPU at the soft limit, SIGKILL shortly after if it is ignored
+        soft = int(cpu_limit_s)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, soft + 5))
+    nice = limits.get("nice")
+    if nice:
+        os.nice(int(nice))
+    cpus = parse_cpu_list(limits.get("cpu_affinity"))
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+
+def limited_command(command: list, limits: dict | None) -> list:
+    """
+    Wraps a command so its child applies `limits` to itself and then execs it
+    (same pid). Used instead of Popen's preexec_fn, which can deadlock when
+    the parent, like the API process, runs several threads.
+    """
+    if not limits:
+        return command
+    return [sys.executable, "-m", "cogs.resources", json.dumps(limits), *command]
+
+
+def read_proc_stats(pid: int) -> dict | None:
+    """Reads RSS, CPU time and context switches for a pid from /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+        with open(f"/proc/{pid}/status") as f:
+            status = f.read()
+        # In the same try: the agent may exit between any two of these reads
+        nice = os.getpriority(os.PRIO_PROCESS, pid)
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+
+    # The command name may contain spaces, so split after its closing paren
+    fields = stat[stat.rfind(")") + 2:].split()
+    utime, stime = int(fields[11]), int(fields[12])
+    num_threads = int(fields[17])
+    rss_pages = int(fields[21])
+
+    switches = {}
+    for line in status.splitlines():
+        if line.startswith(("voluntary_ctxt_switches", "nonvoluntary_ctxt_switches")):
+            key, value = line.split(":", 1)
+            switches[key] = int(value)
+
+    return {
+        "pid": pid,
+        "rss_bytes": rss_pages * _PAGE_SIZE,
+        "cpu_user_s": utime / _CLK_TCK,
+        "cpu_system_s": stime / _CLK_TCK,
+        "threads": num_threads,
+        "voluntary_ctxt_switches": switches.get("voluntary_ctxt_switches", 0),
+        "nonvoluntary_ctxt_switches": switches.get("nonvoluntary_ctxt_switches", 0),
+        "nice": nice,
+    }
+
+
+class ResourceMonitor:
+    """Periodically samples /proc for every running agent process."""
+
+    def __init__(self, get_pids, interval: float = 5.0):
+        # get_pids returns {agent_id: pid} for the processes to sample
+        self.get_pids = get_pids
+        self.interval = interval
+        self._samples: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="agent-resource-monitor", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Resource monitor error: {e}")
+
+    def sample(self):
+        now = time.monotonic()
+        pids = self.get_pids()
+        samples = {}
+        for agent_id, pid in pids.items():
+            stats = read_proc_stats(pid)
+            if stats is None:
+                continue
+            stats["sampled_at"] = time.time()
+            cpu_total = stats["cpu_user_s"] + stats["cpu_system_s"]
+            previous = self._samples.get(agent_id)
+            if previous and previous["pid"] == pid and now > previous["_monotonic"]:
+                previous_total = previous["cpu_user_s"] + previous["cpu_system_s"]
+                stats["cpu_percent"] = round(100.0 * (cpu_total - previous_total) / (now - previous["_monotonic"]), 2)
+            else:
+                stats["cpu_percent"] = None
+            stats["_monotonic"] = now
+            samples[agent_id] = stats
+        with self._lock:
+            self._samples = samples
+
+    def get(self, agent_id: str) -> dict | None:
+        with self._lock:
+            stats = self._samples.get(agent_id)
+        if stats is None:
+            return None
+        return {k: v for k, v in stats.items() if not k.startswith("_")}
+
+    def aggregate(self, top: int = 10) -> dict:
+        with self._lock:
+            samples = list(self._samples.items())
+        by_cpu = sorted(samples, key=lambda item: item[1]["cpu_percent"] or 0.0, reverse=True)
+        by_rss = sorted(samples, key=lambda item: item[1]["rss_bytes"], reverse=True)
+        return {
+            "agents": len(samples),
+            "total_rss_bytes": sum(s["rss_bytes"] for _, s in samples),
+            "total_cpu_percent": round(sum(s["cpu_percent"] or 0.0 for _, s in samples), 2),
+            "total_cpu_s": round(sum(s["cpu_user_s"] + s["cpu_system_s"] for _, s in samples), 2),
+            "top_cpu": [
+                {"agent_id": agent_id, "pid": s["pid"], "cpu_percent": s["cpu_percent"]} for agent_id, s in by_cpu[:top]
+            ],
+            "top_rss": [
+                {"agent_id": agent_id, "pid": s["pid"], "rss_bytes": s["rss_bytes"]} for agent_id, s in by_rss[:top]
+            ],
+        }
+
+    @staticmethod
+    def renice(pid: int, nice: int):
+        """Lowers the priority of a running agent without restarting it."""
+        os.setpriority(os.PRIO_PROCESS, pid, int(nice))
+
+
+if __name__ == "__main__":
+    # python -m cogs.resources '<limits json>' <command...>  (see limited_command)
+    apply_limits(json.loads(sys.argv[1]))
+    os.execv(sys.argv[2], sys.argv[2:])
@@ -0,0 +1,81 @@
+import json
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Forwarded requests carry this header so they are never forwarded a second time
+FORWARDED_HEADER = "x-agent-forwarded-by"
+
+
+class SharedRuntimeState:
+    """
+    Lease-based ownership of running agents, shared by every API worker and
+    node through the agents database.
+
+    A worker must hold an agent's lease before it spawns the agent, and keeps
+    renewing all of its leases from a heartbeat thread. If a worker dies its
+    leases expire after `lease_ttl` seconds and another worker may take over.
+    """
+
+    def __init__(self, db, owner: str = None, endpoint: str = None, lease_ttl: float = 15.0):
+        self.db = db
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+        # URL other workers can reach this one on (e.g. http://10.0.0.5:8001); None if not addressable
+        self.endpoint = endpoint if endpoint is not None else os.environ.get("AGENT_WORKER_ENDPOINT")
+        self.lease_ttl = lease_ttl
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self.db.renew_agent_leases(self.owner, self.lease_ttl, self.endpoint)
+            self._thread = threading.Thread(target=self._run, name="agent-lease-heartbeat", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.lease_ttl / 3):
+            try:
+                self.db.renew_agent_leases(self.owner, self.lease_ttl, self.endpoint)
+            except Exception as e:
+                print(f"Lease heartbeat failed: {e}")
+
+    def acquire(self, agent_id: str) -> bool:
+        return self.db.acquire_agent_lease(agent_id, self.owner, self.lease_ttl)
+
+    def update(self, agent_id: str, **fields):
+        self.db.update_agent_runtime(agent_id, self.owner, **fields)
+
+    def release(self, agent_id: str):
+        self.db.release_agent_lease(agent_id, self.owner)
+
+    def get(self, agent_id: str) -> dict | None:
+        return self.db.get_agent_runtime(agent_id)
+
+    def foreign_owner(self, agent_id: str) -> dict | None:
+        """Returns the runtime row if another worker holds a live lease on the agent."""
+        row = self.get(agent_id)
+        if row and row["owner"] != self.owner and row["lease_expires"] >= time.time():
+            return row
+        return None
+
+
+def forward_request(endpoint: str, method: str, path: str, query: str, body: bytes, owner: str, timeout: float = 30.0):
+    """Replays a request against the worker that owns the agent. Returns (status, headers, body)."""
+    url = endpoint.rstrip("/") + path + (f"?{query}" if query else "")
+    request = urllib.request.Request(url, data=body or None, method=method)
+    request.add_header("Content-Type", "application/json")
+    request.add_header(FORWARDED_HEADER, owner)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+    except (urllib.error.URLError, OSError) as e:
+        detail = json.dumps({"detail": f"Owning worker unreachable: {e}"}).encode()
+        return 502, {"Content-Type": "application/json"}, detail
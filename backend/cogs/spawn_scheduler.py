@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+from .metrics import SPAWN_QUEUE_WAIT_SECONDS
+
+# Agents running at once (local processes, deployed processes and hosted agents)
+SPAWN_MAX_RUNNING = int(os.environ.get("SPAWN_MAX_RUNNING", "200"))
+# Per creator; agents without a creator are only held to the global limit
+SPAWN_MAX_PER_CREATOR = int(os.environ.get("SPAWN_MAX_PER_CREATOR", "50"))
+# Spawns (compile + fork/exec) in progress at once
+SPAWN_MAX_INFLIGHT = int(os.environ.get("SPAWN_MAX_INFLIGHT", "4"))
+# Requests waiting beyond this are turned away with 429
+SPAWN_QUEUE_SIZE = int(os.environ.get("SPAWN_QUEUE_SIZE", "256"))
+SPAWN_QUEUE_TIMEOUT_S = float(os.environ.get("SPAWN_QUEUE_TIMEOUT_S", "60"))
+
+# Re-check interval while requests are queued, for expiry and slots freed without a notify()
+_POLL_S = 0.25
+
+
+class AdmissionRejected(Exception):
+    """The spawn queue is full, or a request waited longer than SPAWN_QUEUE_TIMEOUT_S."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass(order=True)
+class SpawnRequest:
+    sort_key: tuple
+    agent_id: str = field(compare=False)
+    creator: str | None = field(compare=False)
+    spawn: Callable = field(compare=False)
+    future: Future = field(compare=False)
+    queued_at: float = field(compare=False)
+
+
+class SpawnScheduler:
+    """
+    Admission control in front of agent spawns. Requests queue by priority
+    (higher first, FIFO within a priority) and are dispatched while fewer
+    than max_running agents are up, the creator is under max_per_creator and
+    fewer than max_inflight spawns are in progress. `running` returns
+    {agent_id: creator} for everything currently up.
+    """
+
+    def __init__(self, running: Callable[[], dict], max_running: int = SPAWN_MAX_RUNNING,
+                 max_per_creator: int = SPAWN_MAX_PER_CREATOR, max_inflight: int = SPAWN_MAX_INFLIGHT,
+                 queue_size: int = SPAWN_QUEUE_SIZE, queue_timeout: float = SPAWN_QUEUE_TIMEOUT_S):
+        self.running = running
+        self.max_running = max_running
+        self.max_per_creator = max_per_creator
+        self.max_inflight = max(1, max_inflight)
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.counters = Counter()
+        self.wait_ewma = 0.0
+        self.spawn_ewma = 0.0
+        self._queue: list[SpawnRequest] = []
+        self._queued: dict[str, SpawnRequest] = {}
+        self._inflight: dict[str, str | None] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="spawn")
+        self._thread = None
+
+    def submit(self, agent_id: str, creator: str | None, priority: float, spawn: Callable) -> Future:
+        """
+        Queues spawn() and returns a future for its result. The future fails
+        with AdmissionRejected if the queue is full or the wait times out; a
+        second request for an agent already queued gets the same future.
+        """
+        with self._cond:
+            existing = self._queued.get(agent_id)
+            if existing:
+                return existing.future
+            if len(self._queue) >= self.queue_size:
+                self.counters["rejected"] += 1
+                rejected = Future()
+                rejected.set_exception(AdmissionRejected("Spawn queue is full", self.retry_after()))
+                return rejected
+            request = SpawnRequest((-priority, next(self._seq)), agent_id, creator, spawn, Future(), time.monotonic())
+            heapq.heappush(self._queue, request)
+            self._queued[agent_id] = request
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="spawn-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return request.future
+
+    def notify(self):
+        """Wakes the dispatcher early, e.g. after an agent stopped."""
+        with self._cond:
+            self._cond.notify()
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait: the recent queue wait, or the time to drain the queue."""
+        drain = self.spawn_ewma * (len(self._queue) + 1) / self.max_inflight
+        return max(1, math.ceil(max(self.wait_ewma, drain)))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Idle until submit() queues something; nothing to admit means nothing to poll
+                while not self._queue:
+                    self._cond.wait()
+            # Read outside the lock: it takes the supervisor's lock
+            try:
+                running = self.running()
+            except Exception as e:
+                print(f"Spawn scheduler could not read running agents: {e}")
+                time.sleep(_POLL_S)
+                continue
+            with self._cond:
+                self._expire()
+                request = self._pick(running)
+                if request is None:
+                    self._cond.wait(_POLL_S)
+                    continue
+                self._inflight[request.agent_id] = request.creator
+                waited = time.monotonic() - request.queued_at
+                self.wait_ewma = waited if not self.counters["admitted"] else 0.8 * self.wait_ewma + 0.2 * waited
+                self.counters["admitted"] += 1
+            SPAWN_QUEUE_WAIT_SECONDS.labels().observe(waited)
+            self._pool.submit(self._spawn, request)
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [r for r in self._queue if now - r.queued_at > self.queue_timeout]
+        if not expired:
+            return
+        self._queue = [r for r in self._queue if now - r.queued_at <= self.queue_timeout]
+        heapq.heapify(self._queue)
+        for request in expired:
+            del self._queued[request.agent_id]
+            self.counters["timed_out"] += 1
+            request.future.set_exception(AdmissionRejected("Timed out waiting for a spawn slot", self.retry_after()))
+
+    def _pick(self, running: dict) -> SpawnRequest | None:
+        """Highest-priority request whose creator has room, or None if nothing can go now."""
+        if not self._queue or len(self._inflight) >= self.max_inflight:
+            return None
+        occupied = {**running, **self._inflight}
+        if len(occupied) >= self.max_running:
+            return None
+        per_creator = Counter(creator for creator in occupied.values() if creator)
+        for request in sorted(self._queue):
+            if request.creator and per_creator[request.creator] >= self.max_per_creator:
+                continue
+            self._queue.remove(request)
+            heapq.heapify(self._queue)
+            del self._queued[request.agent_id]
+            return request
+        return None
+
+    def _spawn(self, request: SpawnRequest):
+        started = time.perf_counter()
+        try:
+            request.future.set_result(request.spawn())
+        except Exception as e:
+            request.future.set_exception(e)
+        finally:
+            seconds = time.perf_counter() - started
+            with self._cond:
+                self.spawn_ewma = 0.8 * self.spawn_ewma + 0.2 * seconds if self.spawn_ewma else seconds
+                del self._inflight[request.agent_id]
+                self._cond.notify()
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            queued = sorted(self._queue)
+            return {
+                "queue_depth": len(queued),
+                "inflight": len(self._inflight),
+                "oldest_wait_s": max((now - r.queued_at for r in queued), default=0.0),
+                "avg_wait_s": self.wait_ewma,
+                "avg_spawn_s": self.spawn_ewma,
+                "retry_after_s": self.retry_after(),
+                "queued_by_creator": dict(Counter(r.creator or "" for r in queued)),
+                "counters": {key: self.counters[key] for key in ("admitted", "rejected", "timed_out")},
+                "limits": {
+                    "max_running": self.max_running,
+                    "max_per_creator": self.max_per_creator,
+                    "max_inflight": self.max_inflight,
+                    "queue_size": self.queue_size,
+                    "queue_timeout_s": self.queue_timeout,
+                },
+            }
@@ -7,17 +7,39 @@ from multiprocessing.queues import Queue as QueueType
 import logging
 import subprocess
 import os
-import random
+import json
+import marshal
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
 import re
 from .database import PubSubDatabase
-
-pubsub_db = PubSubDatabase()
-
 from .database import AgentDatabase  # <-- Add this import
-
-def agent_runner(code: str, queue: QueueType):
-    """Runs agent code and redirects stdout/stderr + logging output into a queue."""
+from .supervisor import AgentSupervisor
+from .resources import LIMIT_FIELDS, ResourceMonitor, apply_limits, limited_command, limits_from_record
+from .agent_host import AgentHostPool, is_host_compatible
+from .artifacts import ArtifactStore
+from .bar_channel import unlink_segments
+from .code_compiler import CodeCompileError, CompiledAgent, compile_key, compiler, load_mappings, parse_agent_code
+from .backtest import data_source, load_history
+from .backtest_scheduler import BacktestScheduler
+from .dependency_graph import STOP_POLICIES, DependencyCycleError, DependencyGraph
+from .lineage import summarize as summarize_lineage
+from .rating_indexer import indexer_from_env
+from .write_behind import ReputationBuffer
+from .catalog_cache import CatalogCache
+from .metrics import AGENT_SPAWN_SECONDS, REGISTRY, GaugeFunc
+from .spawn_scheduler import SpawnScheduler
+from .agent_registry import AgentRegistry
+from .shared_state import SharedRuntimeState
+from .ports import PortAllocator
+
+def agent_runner(code: str | bytes, queue: QueueType, limits: dict = None):
+    """
+    Runs agent code and redirects stdout/stderr + logging output into a queue.
+
+    `code` is either source text or a marshalled code object from the compiler cache.
+    """
 
     class QueueWriter:
         def __init__(self, q: QueueType):
@@ -41,7 +63,10 @@ def agent_runner(code: str, queue: QueueType):
     logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 
     try:
-        if not code.strip():
+        apply_limits(limits)
+        if isinstance(code, bytes):
+            code = marshal.loads(code)
+        elif not code.strip():
             raise ValueError("Agent code is empty")
         exec(code, {"__name__": "__main__"})
     except Exception as e:
@@ -53,38 +78,112 @@ def agent_runner(code: str, queue: QueueType):
 class StrategyManager:
     """Manages lifecycle of agents."""
 
-    def __init__(self):
-        self.agents = {}
-        self.db = AgentDatabase()
-        # Load agents from DB at startup
-        for row in self.db.list_agents():
-            agent_id = row["agent_id"]
-            self.agents[agent_id] = {
-                "code": row["code"],
-                "process": None,
-                "queue": None,
-                "status": "stopped",
-                "agentverse_id": row.get("agentverse_id"),
-                # New strategy parameters
-                "risk": row.get("risk"),
-                "assetClass": row.get("assetClass"),
-                "time": row.get("time"),
-                "currentStateOfMarket": row.get("currentStateOfMarket"),
-                "interest": row.get("interest"),
-                "perf": row.get("perf", 0),
-                "isNew": row.get("isNew", False),
-                "reputation": row.get("reputation", 0),
-                # Old parameters (kept as requested)
-                "name": row.get("name"),
-                "creator": row.get("creator"),
-                "title": row.get("title"),
-                "summary": row.get("summary"),
-                "description": row.get("description"),
-                "type": row.get("type"),
-                "function_agent_mapping": row.get("function_agent_mapping"),
-            }
-        
+    def __init__(self, db: AgentDatabase = None, cache_size: int = 1024):
+        self.db = db or AgentDatabase()
+        self.pubsub = PubSubDatabase()
+        # Agents are loaded from the DB on demand; only runtime state stays resident
+        self.registry = AgentRegistry(self.db, cache_size=cache_size)
+        # Leases in the DB decide which API worker/node may run each agent
+        self.shared = SharedRuntimeState(self.db)
+        self.shared.start()
         self.running_agents = {}
+        self.supervisor = AgentSupervisor(on_exit=self._on_agent_exit, on_restart=self._restart_agent)
+        self.supervisor.start()
+        self.monitor = ResourceMonitor(self.supervisor.running_pids)
+        self.monitor.start()
+        self.artifacts = ArtifactStore()
+        self.ports = PortAllocator(self.db)
+        self.hosts = AgentHostPool()
+        self.hosts.on_host_started = lambda host: self.supervisor.watch(f"host:{host.host_id}", "host", host.process, "always")
+        self.hosts.on_host_stopped = lambda host: self.supervisor.unwatch(f"host:{host.host_id}", forget=True)
+        # Start/deploy requests wait here for a slot under the running and in-flight limits
+        self.spawns = SpawnScheduler(self._running_creators)
+        # Parameter sweeps run on their own process pool, created on the first submit
+        self.backtests = BacktestScheduler(self.registry.record, self.pubsub, on_best=self._store_perf)
+        # Serialized GET /agents responses, invalidated by every catalog write below
+        self.catalog = CatalogCache()
+        # Reputation writes are coalesced per agent and flushed in batches
+        self.reputations = ReputationBuffer(self.db, on_flush=self._apply_flushed_reputations)
+        # On-chain RatingSubmitted logs -> reputation, when RATING_RPC_URL is configured
+        self.ratings = indexer_from_env(self.db, on_update=self._apply_chain_reputations)
+        if self.ratings:
+            self.ratings.start()
+        self._register_metrics()
+
+    def shutdown(self):
+        """
+        Stops the background threads and child process pools on API shutdown.
+        The supervisor goes first so retired hosts are not restarted; local and
+        deployed agents keep running and their leases lapse after lease_ttl.
+        """
+        self.supervisor.shutdown()
+        if self.ratings:
+            self.ratings.stop()
+        self.monitor.shutdown()
+        self.backtests.shutdown()
+        hosted = list(self.hosts.placement)
+        self.hosts.shutdown()
+        for agent_id in hosted:
+            self.shared.release(agent_id)
+        self.shared.shutdown()
+        # Reputation updates are written behind; make sure the last batch lands
+        self.reputations.flush()
+
+    def _register_metrics(self):
+        """Gauges read at scrape time, so the hot paths they describe pay nothing."""
+        REGISTRY.register(GaugeFunc(
+            "agents_by_status", "Supervised agents by status (running, crashed, backoff, ...)", ("status",),
+            lambda: {(status,): count for status, count in self._agent_status_counts().items()},
+        ))
+        REGISTRY.register(GaugeFunc(
+            "agent_supervisor_events_total", "Supervisor starts, exits, restarts and crashloops", ("event",),
+            lambda: {(event,): count for event, count in self.supervisor.stats()["counters"].items()}, kind="counter",
+        ))
+        REGISTRY.register(GaugeFunc(
+            "agent_log_queue_depth", "Log lines waiting in each local agent's queue", ("agent_id",),
+            lambda: {
+                (agent_id,): runtime.queue.qsize()
+                for agent_id, runtime in list(self.registry.runtime.items()) if runtime.queue
+            },
+        ))
+        REGISTRY.register(GaugeFunc(
+            "ohlcv_rows_inserted_total", "OHLCV rows inserted by all producers (rate() gives insert rate)", (),
+            lambda: {(): self.pubsub.inserted_row_count()}, kind="counter",
+        ))
+        REGISTRY.register(GaugeFunc(
+            "reputation_writes_pending", "Reputation updates buffered but not yet written", (),
+            lambda: {(): self.reputations.pending()},
+        ))
+        REGISTRY.register(GaugeFunc(
+            "agent_spawn_queue_depth", "Start/deploy requests waiting for admission", (),
+            lambda: {(): self.spawns.queue_depth()},
+        ))
+        REGISTRY.register(GaugeFunc(
+            "agent_spawns_inflight", "Agent spawns in progress", (),
+            lambda: {(): self.spawns.inflight()},
+        ))
+        REGISTRY.register(GaugeFunc(
+            "agent_spawn_admission_total", "Spawn requests admitted, rejected (queue full) or timed out", ("outcome",),
+            lambda: {(outcome,): count for outcome, count in self.spawns.counters.items()}, kind="counter",
+        ))
+
+    def _agent_status_counts(self) -> dict:
+        counts = {}
+        for agent_id, history in self.supervisor.stats()["agents"].items():
+            if not agent_id.startswith("host:"):
+                counts[history["status"]] = counts.get(history["status"], 0) + 1
+        return counts
+
+    def _running_creators(self) -> dict:
+        """{agent_id: creator} for every agent process or hosted agent that is up."""
+        ids = [agent_id for agent_id in self.supervisor.running_pids() if not agent_id.startswith("host:")]
+        ids.extend(self.hosts.placement)
+        return {agent_id: (self.registry.record(agent_id) or {}).get("creator") for agent_id in ids}
+
+    def _admit(self, agent_id: str, record: dict, spawn) -> Future:
+        """Queues spawn() behind the admission limits, higher-reputation agents first."""
+        priority = self.reputations.overlay(record).get("reputation") or 0
+        return self.spawns.submit(agent_id, record.get("creator"), priority, spawn)
 
     def create_agent(
         self,
@@ -106,137 +205,303 @@ class StrategyManager:
         summary: str = None,
         description: str = None,
         type: str = None,
-        function_agent_mapping: str = None,
+        function_agent_mapping: str | dict = None,
+        restart_policy: str = "never",
+        max_restarts: int = 5,
+        # Resource limits applied to the agent process (see cogs/resources.py)
+        mem_limit_mb: int = None,
+        cpu_limit_s: int = None,
+        nice: int = None,
+        cpu_affinity: str = None,
+        hosting: str = "process",
+        # "ignore" or "stop": whether stopping one of this agent's producers also stops it
+        on_producer_stop: str = "ignore",
     ) -> str:
+        if on_producer_stop not in STOP_POLICIES:
+            raise ValueError(f"on_producer_stop must be one of {', '.join(STOP_POLICIES)}")
+        if function_agent_mapping is not None and not isinstance(function_agent_mapping, str):
+            function_agent_mapping = json.dumps(function_agent_mapping)
+        # Syntax and mapping errors are reported now instead of when the agent starts
+        parse_agent_code(code, *load_mappings(function_agent_mapping))
+        if hosting == "shared":
+            compatible, reason = is_host_compatible(code)
+            if not compatible:
+                raise ValueError(f"Agent code cannot run in a shared host: {reason}")
         agent_id = str(uuid.uuid4())
-        self.agents[agent_id] = {
-            "code": code,
-            "process": None,
-            "queue": None,
-            "status": "stopped",
-            "agentverse_id": agentverse_id,
-            # New strategy parameters
-            "risk": risk,
-            "assetClass": assetClass,
-            "time": time,
-            "currentStateOfMarket": currentStateOfMarket,
-            "interest": interest,
-            "perf": perf,
-            "isNew": isNew,
-            "reputation": reputation,
-            # Old parameters (kept as requested)
-            "name": name,
-            "creator": creator,
-            "title": title,
-            "summary": summary,
-            "description": description,
-            "type": type,
-            "function_agent_mapping": function_agent_mapping,
-        }
         self.db.add_agent(
             agent_id, code, agentverse_id, risk, assetClass, time, currentStateOfMarket, interest, perf, isNew, reputation,
-            name, creator, title, summary, description, type, function_agent_mapping
+            name, creator, title, summary, description, type, function_agent_mapping,
+            restart_policy=restart_policy, max_restarts=max_restarts,
+            mem_limit_mb=mem_limit_mb, cpu_limit_s=cpu_limit_s, nice=nice, cpu_affinity=cpu_affinity,
+            hosting=hosting, on_producer_stop=on_producer_stop,
         )
+        self.catalog.invalidate()
         return agent_id
 
+    def request_start(self, agent_id: str) -> Future:
+        """
+        Queues a start; the future resolves to start_agent's result once it
+        has run, or raises AdmissionRejected.
+        """
+        record = self.registry.record(agent_id)
+        if not record or self.registry.status(agent_id) == "running":
+            return _resolved(False)
+        return self._admit(agent_id, record, partial(self._start_agent, agent_id))
+
     def start_agent(self, agent_id: str) -> bool:
-        agent = self.agents.get(agent_id)
-        if not agent or agent["status"] == "running":
+        return self.request_start(agent_id).result()
+
+    def _start_agent(self, agent_id: str) -> bool:
+        record = self.registry.record(agent_id)
+        if not record or self.registry.status(agent_id) == "running":
+            return False
+        if not self.shared.acquire(agent_id):
             return False
 
+        spawn_started = time.perf_counter()
+        try:
+            code = marshal.dumps(compiler.compile_plain(record["code"], f"<agent {agent_id}>").code)
+        except CodeCompileError:
+            # Let the child report the error through the agent's logs, as before
+            code = record["code"]
         queue = Queue()
-        process = Process(target=agent_runner, args=(agent["code"], queue))
-        process.start()
-
-        agent["process"] = process
-        agent["queue"] = queue
-        agent["status"] = "running"
+        process = Process(target=agent_runner, args=(code, queue, limits_from_record(record)))
+        try:
+            process.start()
+        except Exception:
+            self.shared.release(agent_id)
+            raise
+        AGENT_SPAWN_SECONDS.labels("process").observe(time.perf_counter() - spawn_started)
+
+        runtime = self.registry.runtime_of(agent_id, create=True)
+        runtime.process = process
+        runtime.queue = queue
+        runtime.status = "running"
+        self.shared.update(agent_id, status="running", pid=process.pid)
+        self.supervisor.watch(agent_id, "local", process, record.get("restart_policy"), record.get("max_restarts"))
         return True
 
     def stop_agent(self, agent_id: str) -> bool:
-        agent = self.agents.get(agent_id)
-        if not agent or agent["status"] == "stopped":
+        """Stops every running instance of an agent: local, deployed or hosted."""
+        pending = self._begin_stop(agent_id)
+        if pending is None:
             return False
+        self._finish_stop(pending)
+        return True
 
-        if agent["process"] and agent["process"].is_alive():
-            agent["process"].terminate()
-            agent["process"].join()
+    def _begin_stop(self, agent_id: str):
+        """
+        Detaches the agent from the supervisor and sends SIGTERM without waiting.
+        Returns the handles _finish_stop has to wait for, or None if nothing was running.
+        """
+        stopped = False
+        handles = []
+        if self.hosts.remove(agent_id):
+            stopped = True
+        process = self.running_agents.pop(agent_id, None)
+        if process:
+            self.supervisor.unwatch(agent_id)
+            process.terminate()
+            handles.append(process)
+        runtime = self.registry.runtime_of(agent_id)
+        if runtime and runtime.status != "stopped":
+            self.supervisor.unwatch(agent_id)
+            if runtime.process and runtime.process.is_alive():
+                runtime.process.terminate()
+                handles.append(runtime.process)
+            stopped = True
+        if not stopped and not handles:
+            return None
+        return agent_id, handles
 
-        agent["process"] = None
-        if agent["queue"]:
-            agent["queue"].close()
-            agent["queue"] = None
-        agent["status"] = "stopped"
-        return True
+    def _finish_stop(self, pending, timeout: float = None):
+        agent_id, handles = pending
+        for handle in handles:
+            if hasattr(handle, "join"):
+                handle.join(timeout)
+            else:
+                handle.wait(timeout)
+        runtime = self.registry.runtime_of(agent_id)
+        if runtime:
+            runtime.process = None
+            if runtime.queue:
+                runtime.queue.close()
+                runtime.queue = None
+            runtime.status = "stopped"
+        self.ports.release(agent_id)
+        self.shared.release(agent_id)
+        self.spawns.notify()
 
     def delete_agent(self, agent_id: str) -> bool:
-        if agent_id not in self.agents:
+        if not self.registry.exists(agent_id):
             return False
-        if self.agents[agent_id]["status"] == "running":
-            self.stop_agent(agent_id)
-        del self.agents[agent_id]
+        self.stop_agent(agent_id)
+        self.registry.remove(agent_id)
+        self.shared.release(agent_id)
+        self.supervisor.unwatch(agent_id, forget=True)
+        self.ports.release(agent_id)
+        unlink_segments(agent_id)
         self.db.delete_agent(agent_id)  # <-- Remove from DB
+        self.catalog.invalidate()
         return True
 
-    def update_agent_code(self, agent_id: str, code: str) -> bool:
-        agent = self.agents.get(agent_id)
-        if not agent:
+    def update_agent_code(self, agent_id: str, code: str, function_agent_mapping=None) -> bool:
+        record = self.registry.record(agent_id)
+        if not record:
             return False
-        if agent["status"] == "running":
+        fields = {"code": code}
+        if function_agent_mapping is not None:
+            if not isinstance(function_agent_mapping, str):
+                function_agent_mapping = json.dumps(function_agent_mapping)
+            fields["function_agent_mapping"] = function_agent_mapping
+        parse_agent_code(code, *load_mappings(fields.get("function_agent_mapping", record.get("function_agent_mapping"))))
+        if "function_agent_mapping" in fields:
+            cycle = self.dependency_graph({agent_id: fields["function_agent_mapping"]}).find_cycle([agent_id])
+            if cycle:
+                raise DependencyCycleError(cycle)
+        if self.registry.status(agent_id) == "running":
             self.stop_agent(agent_id)
-        agent["code"] = code
-        self.db.update_agent(agent_id, code=code)  # <-- Update in DB
+        self.db.update_agent(agent_id, **fields)  # <-- Update in DB
+        self.registry.update(agent_id, **fields)
+        self.catalog.invalidate()
         return True
 
     def get_agent(self, agent_id: str) -> dict | None:
-        agent = self.agents.get(agent_id)
-        if not agent:
+        record = self.registry.record(agent_id)
+        if not record:
             return None
-        if agent["status"] == "running" and (
-            not agent["process"] or not agent["process"].is_alive()
-        ):
-            agent["status"] = "stopped"
+        record = self.reputations.overlay(record)
+        # Status is kept up to date by the supervisor as soon as a child exits;
+        # agents running on another worker report that worker's view instead
+        shared = self.shared.get(agent_id)
+        foreign = shared if shared and shared["owner"] != self.shared.owner else None
         return {
-            "agent_id": agent_id,
-            "status": agent["status"],
-            "code": agent["code"],
-            "agentverse_id": agent.get("agentverse_id"),
-            "risk": agent.get("risk"),
-            "assetClass": agent.get("assetClass"),
-            "time": agent.get("time"),
-            "currentStateOfMarket": agent.get("currentStateOfMarket"),
-            "interest": agent.get("interest"),
-            "perf": agent.get("perf"),
-            "isNew": agent.get("isNew"),
-            "reputation": agent.get("reputation"),
-            "name": agent.get("name"),
-            "creator": agent.get("creator"),
-            "title": agent.get("title"),
-            "summary": agent.get("summary"),
-            "description": agent.get("description"),
-            "type": agent.get("type"),
-            "function_agent_mapping": agent.get("function_agent_mapping"),
+            **record,
+            "status": foreign["status"] if foreign else self.registry.status(agent_id),
+            "owner": shared["owner"] if shared else None,
+            "restart_policy": record.get("restart_policy") or "never",
+            "hosting": record.get("hosting") or "process",
+            "on_producer_stop": record.get("on_producer_stop") or "ignore",
+            "limits": limits_from_record(record),
+            "host_id": self.hosts.host_of(agent_id),
+            "port": foreign["port"] if foreign else self.ports.port_of(agent_id),
+            "supervisor": self.supervisor.status(agent_id),
         }
 
     def list_agents(self, search: str = None, type: str = None) -> list:
         # Use DB for search and listing with type filter
         agents = self.db.list_agents(search=search, type=type)
-        return agents
-    def update_reputation(self, agent_id: str, reputation: int) -> bool:
-        agent = self.agents.get(agent_id)
-        if not agent:
+        return self.reputations.overlay_many(agents)
+
+    def catalog_listing(self, search: str = None, type: str = None):
+        """Serialized {"agents": [...]} for GET /agents, reused until the catalog changes."""
+        return self.catalog.get(("agents", search, type), lambda: {"agents": self.list_agents(search=search, type=type)})
+
+    def update_reputation(self, agent_id: str, reputation: float) -> bool:
+        # Buffered; readers see the new value at once, SQLite gets it on the next flush
+        if not self.registry.exists(agent_id):
+            return False
+        self.reputations.set(agent_id, reputation)
+        self.catalog.invalidate()
+        return True
+
+    def rate_agent(self, agent_id: str, rating: float) -> dict | None:
+        """Adds one rating; reputation becomes the average of all ratings."""
+        if not self.registry.exists(agent_id):
+            return None
+        self.reputations.add_rating(agent_id, rating)
+        self.catalog.invalidate()
+        agent = self.reputations.overlay(self.registry.record(agent_id))
+        return {key: agent.get(key) for key in ("reputation", "rating_total", "rating_count")}
+
+    def _apply_flushed_reputations(self, written: dict):
+        for agent_id, fields in written.items():
+            self.registry.update(agent_id, **fields)
+        self.catalog.invalidate()
+
+    def _apply_chain_reputations(self, deltas: dict):
+        # Same write path as API ratings; the flush updates the registry and catalog
+        for agent_id, (total, count) in deltas.items():
+            self.reputations.add_rating(agent_id, total, count)
+
+    def get_ratings(self, agent_ids: list = None) -> dict:
+        return {
+            "indexer": self.ratings.stats if self.ratings else None,
+            "ratings": self.db.get_chain_ratings(agent_ids),
+        }
+
+    def update_limits(self, agent_id: str, **limits) -> bool:
+        """Stores new resource limits; they apply the next time the agent is spawned."""
+        if not self.registry.exists(agent_id):
             return False
-        agent["reputation"] = reputation
-        self.db.update_reputation(agent_id, reputation)
+        limits = {k: v for k, v in limits.items() if k in LIMIT_FIELDS}
+        self.db.update_agent(agent_id, **limits)
+        self.registry.update(agent_id, **limits)
+        self.catalog.invalidate()
+        return True
+
+    def backtest_agent(self, agent_id: str, data_agent_id: str = None, arguments: str = None, params: dict = None,
+                       fee_bps: float = 10.0, start: float = None, end: float = None,
+                       write_perf: bool = True) -> dict | None:
+        """Replays stored OHLCV history through the agent's strategy; stores the Sharpe ratio as perf."""
+        record = self.registry.record(agent_id)
+        if not record:
+            return None
+        data_agent_id = data_agent_id or data_source(record)
+        bars = load_history(self.pubsub, data_agent_id, arguments, start, end)
+        # User strategy code runs in a limited child process, never in the API process
+        result = self.backtests.run_one(record, bars, params, fee_bps)
+        result.update(agent_id=agent_id, data_agent_id=data_agent_id, arguments=arguments)
+        if write_perf:
+            self._store_perf(agent_id, result)
+        return result
+
+    def _store_perf(self, agent_id: str, result: dict):
+        perf = round(result["sharpe"], 4)
+        self.db.update_agent(agent_id, perf=perf)
+        self.registry.update(agent_id, perf=perf)
+        self.catalog.invalidate()
+
+    def lineage_metrics(self, agent_id: str) -> dict | None:
+        """
+        Staleness/latency histograms for every mapping edge upstream and
+        downstream of the agent, plus each producer's publish -> SQLite lag.
+        """
+        if not self.registry.exists(agent_id):
+            return None
+        graph = self.dependency_graph()
+        ids = graph.upstream([agent_id]) | graph.downstream([agent_id])
+        summary = summarize_lineage(self.pubsub.get_lineage_counts(ids))
+        edges = [
+            {"producer": producer, "consumer": consumer, "metrics": summary.get((consumer, producer), {})}
+            for producer in sorted(ids)
+            for consumer in sorted(graph.consumers.get(producer, ()))
+            if consumer in ids
+        ]
+        return {
+            "agent_id": agent_id,
+            "agents": sorted(ids),
+            "edges": edges,
+            "producers": {producer: summary[("", producer)] for producer in sorted(ids) if ("", producer) in summary},
+        }
+
+    def get_stats(self, agent_id: str) -> dict | None:
+        return self.monitor.get(agent_id)
+
+    def throttle_agent(self, agent_id: str, nice: int) -> bool:
+        pid = self.supervisor.running_pids().get(agent_id)
+        if not pid:
+            return False
+        self.monitor.renice(pid, nice)
         return True
 
     def get_logs(self, agent_id: str) -> str | None:
-        agent = self.agents.get(agent_id)
-        if not agent or agent["status"] != "running" or not agent["queue"]:
+        runtime = self.registry.runtime_of(agent_id)
+        if not runtime or runtime.status != "running" or not runtime.queue:
             return None
 
         logs = []
-        q = agent["queue"]
+        q = runtime.queue
         while not q.empty():
             chunk = q.get()
             if chunk == "__END__":
@@ -252,12 +517,11 @@ class StrategyManager:
         The agent must print its address (agent1q...) to stdout on startup.
         If no address is found, returns the logs instead.
         """
-        agent = self.agents.get(agent_id)
-        if not agent:
+        if not self.registry.exists(agent_id):
             return None
 
         # Start agent if not running
-        if agent["status"] != "running":
+        if self.registry.status(agent_id) != "running":
             self.start_agent(agent_id)
             started_here = True
         else:
@@ -286,168 +550,268 @@ class StrategyManager:
         else:
             return logs  # Return logs if no address found
 
-    def deploy_agent(self, agent_id: str):
-        agent = self.get_agent(agent_id)
-        python_code = agent['code']
-
-        agent_name = agent.get('name', agent_id)
-        port = random.randint(23000, 30000)
-        python_code = process_code(python_code, agent.get('function_agent_mapping', {}), port, agent_name, agent_id)
+    def request_deploy(self, agent_id: str) -> Future:
+        """Queues a deploy, like request_start."""
+        record = self.registry.record(agent_id)
+        if not record:
+            return _resolved(False)
+        return self._admit(agent_id, record, partial(self._deploy_agent, agent_id))
 
-        script_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts", "run_python.sh")
+    def deploy_agent(self, agent_id: str):
+        return self.request_deploy(agent_id).result()
 
-        subprocess.run([script_path, f"{agent_id}.py", python_code], cwd=os.path.dirname(os.path.dirname(__file__)))
+    def _deploy_agent(self, agent_id: str):
+        agent = self.get_agent(agent_id)
+        if not agent:
+            return False
+        if not self.shared.acquire(agent_id):
+            return False
 
-        process = subprocess.Popen(
-            [sys.executable, f"{agent_id}.py"],
-            cwd=os.path.dirname(os.path.dirname(__file__)),
-            start_new_session=True       
-        )
+        spawn_started = time.perf_counter()
+        try:
+            port = self.ports.allocate(agent_id)
+            artifact = build_agent_artifact(self.artifacts, agent)
+
+            if agent.get("hosting") == "shared":
+                self.hosts.place(agent_id, artifact=artifact, port=port)
+                self.shared.update(agent_id, status="hosted", port=port, pid=None)
+                return True
+
+            backend_dir = os.path.dirname(os.path.dirname(__file__))
+            env = dict(os.environ, AGENT_PORT=str(port), PYTHONPATH=backend_dir)
+            limits = agent["limits"]
+            process = subprocess.Popen(
+                limited_command([sys.executable, artifact], limits),
+                cwd=backend_dir,
+                env=env,
+                start_new_session=True,
+            )
+        except Exception:
+            # Nothing is running: free the port and the lease, or other workers forward to a dead owner
+            self.ports.release(agent_id)
+            self.shared.release(agent_id)
+            raise
+        AGENT_SPAWN_SECONDS.labels("deployed").observe(time.perf_counter() - spawn_started)
 
         self.running_agents[agent_id] = process
+        self.shared.update(agent_id, status="deployed", port=port, pid=process.pid)
+        self.supervisor.watch(agent_id, "deployed", process, agent.get("restart_policy"), agent.get("max_restarts"))
 
         return True
 
-    def stop_agent(self, agent_id: str):
-        process = self.running_agents.get(agent_id)
-        if process:
-            process.terminate()  
-            process.wait()      
-            del self.running_agents[agent_id]
-            return True
-        return False
-
     def is_running(self, agent_id: str):
         process = self.running_agents.get(agent_id)
         return process and process.poll() is None
 
-def process_code(code: str, function_agent_mapping: dict, function_args_mapping: dict, port: int, agent_name: str, agent_id: str):
-    inject_pattern = r'@inject_selected\(([^)]+)\)'
-    match = re.search(inject_pattern, code)
-
-    decorator_impl = f'''from functools import wraps
-from uagents import Agent, Context, Model
-from cogs.database import PubSubDatabase
-
-class Request(Model): 
-    message: str 
-
-agent = Agent( 
-    name="{agent_name}", 
-    port={port}, 
-    endpoint=["http://localhost:{port}/submit"] 
-)
-
-pubsub = PubSubDatabase()
-
-def inject_selected(*func_names):
-    def decorator(main_func):
-        # Create a new function that directly injects the dependencies
-        async def injected_func(ctx: Context):
-            # Create kwargs with injected functions
-            injected_kwargs = {{}}
-            for name in func_names:
-                if name in AVAILABLE_FUNCTIONS:
-                    injected_kwargs[name] = AVAILABLE_FUNCTIONS[name]
-            
-            # Call the original function with injected kwargs
-            return await main_func(ctx, **injected_kwargs)
-        
-        # Copy function metadata
-        injected_func.__name__ = main_func.__name__
-        injected_func.__doc__ = main_func.__doc__
-        return injected_func
-    return decorator
-
-def push(open, high, low, close, volume):
-    pubsub.insert_row("{agent_id}", open, high, low, close, volume, "", None)
-
-def swap(fromCrypto, toCrypto, wallet_address, ammount):
-    return "successfully bought"
-
-
-'''
-    
-    if not match:
-        injected_code = f'''from functools import wraps
-from uagents import Agent, Context, Model
-from cogs.database import PubSubDatabase
-
-class Request(Model): 
-    message: str 
-
-agent = Agent( 
-    name="{agent_name}", 
-    port={port}, 
-    endpoint=["http://localhost:{port}/submit"] 
-)
-
-pubsub = PubSubDatabase()
-
-def push(open, high, low, close, volume):
-    pubsub.insert_row("{agent_id}", open, high, low, close, volume, "", None)
-
-def swap(fromCrypto, toCrypto, wallet_address, ammount):
-    return "successfully bought"
-
-
-'''
-        injected_code += code
-        return injected_code
-    
-    function_names_str = match.group(1)
-    function_names = [name.strip().strip('"\'') for name in function_names_str.split(',')]
-    
-    function_implementations = []
-    
-    for func_name in function_names:
-        mapped_agent_id = function_agent_mapping.get(func_name)
-        args_name = function_args_mapping.get(func_name, None)
-        
-        if not mapped_agent_id:
-            if args_name:
-                function_impl = f'''def {func_name}({args_name}):
-    """Auto-generated function for {func_name}"""
-    print(f"Function {func_name} called with arguments {{ {args_name} }} - no agent mapping found")
-    return None'''
-            else:
-                function_impl = f'''def {func_name}():
-    """Auto-generated function for {func_name}"""
-    print(f"Function {func_name} called - no agent mapping found")
-    return None'''
+    def resolve_agent_ids(self, agent_ids: list = None, filters: dict = None) -> list:
+        """Turns an explicit id list and/or a filter (search, type, creator, status) into agent ids."""
+        filters = filters or {}
+        if agent_ids is not None:
+            ids = [agent_id for agent_id in agent_ids if self.registry.exists(agent_id)]
         else:
-            if args_name:
-                function_impl = f'''def {func_name}({args_name}):
-    """Auto-generated function for {func_name} - calls get_latest_row for agent {mapped_agent_id}"""
-    try:
-        result = pubsub.get_latest_row("{mapped_agent_id}", arguments={args_name})
-        print(f"Function {func_name} called with arguments {{ {args_name} }} - got data for agent {mapped_agent_id}: {{result}}")
-        return result
-    except Exception as e:
-        print(f"Error in {func_name}: {{e}}")
-        return None'''
+            rows = self.db.list_agents(search=filters.get("search"), type=filters.get("type"))
+            ids = [row["agent_id"] for row in rows]
+        if filters.get("creator"):
+            ids = [agent_id for agent_id in ids if self.registry.record(agent_id).get("creator") == filters["creator"]]
+        if filters.get("status"):
+            ids = [agent_id for agent_id in ids if self._runtime_status(agent_id) == filters["status"]]
+        return ids
+
+    def _runtime_status(self, agent_id: str) -> str:
+        if agent_id in self.running_agents or self.hosts.host_of(agent_id):
+            return "deployed"
+        return self.registry.status(agent_id)
+
+    def bulk_stop(self, agent_ids: list, timeout: float = 10.0):
+        """
+        Stops many agents at once: SIGTERM goes to all of them first, then they
+        are waited for together under one shared deadline. Yields per-agent results.
+        """
+        pending = []
+        for agent_id in agent_ids:
+            owner = self.shared.foreign_owner(agent_id)
+            if owner:
+                yield {"agent_id": agent_id, "ok": False, "error": f"running on worker {owner['owner']}"}
+                continue
+            try:
+                stop = self._begin_stop(agent_id)
+            except Exception as e:
+                yield {"agent_id": agent_id, "ok": False, "error": str(e)}
+                continue
+            if stop is None:
+                yield {"agent_id": agent_id, "ok": False, "error": "not running"}
             else:
-                function_impl = f'''def {func_name}():
-    """Auto-generated function for {func_name} - calls get_latest_row for agent {mapped_agent_id}"""
-    try:
-        result = pubsub.get_latest_row("{mapped_agent_id}")
-        print(f"Function {func_name} called - got data for agent {mapped_agent_id}: {{result}}")
-        return result
-    except Exception as e:
-        print(f"Error in {func_name}: {{e}}")
-        return None'''
-        
-        function_implementations.append(function_impl)
-    
-    available_functions_dict = "AVAILABLE_FUNCTIONS = {\n"
-    for func_name in function_names:
-        available_functions_dict += f'    "{func_name}": {func_name},\n'
-    available_functions_dict += "}\n"
-    
-    injected_code = decorator_impl
-    if len(function_implementations) > 0:
-        injected_code += "\n\n".join(function_implementations) + "\n\n"
-        injected_code += available_functions_dict + "\n"
-    injected_code += code
-    
-    return injected_code
+                pending.append(stop)
+
+        deadline = time.monotonic() + timeout
+        for stop in pending:
+            agent_id, handles = stop
+            self._finish_stop(stop, timeout=max(0.0, deadline - time.monotonic()))
+            killed = False
+            for handle in handles:
+                alive = handle.is_alive() if hasattr(handle, "is_alive") else handle.poll() is None
+                if alive:
+                    handle.kill()
+                    killed = True
+            yield {"agent_id": agent_id, "ok": True, "killed": killed}
+
+    def bulk_run(self, action: str, agent_ids: list, parallelism: int = 16):
+        """Runs start/deploy for many agents on a bounded thread pool, yielding results as they finish."""
+        operations = {"start": self.start_agent, "deploy": self.deploy_agent}
+        operation = operations[action]
+        with ThreadPoolExecutor(max_workers=max(1, parallelism)) as pool:
+            futures = {pool.submit(operation, agent_id): agent_id for agent_id in agent_ids}
+            for future in as_completed(futures):
+                agent_id = futures[future]
+                try:
+                    ok = bool(future.result())
+                    yield {"agent_id": agent_id, "ok": ok, **({} if ok else {"error": "not found, already running or owned by another worker"})}
+                except Exception as e:
+                    yield {"agent_id": agent_id, "ok": False, "error": str(e)}
+
+    def bulk_restart(self, agent_ids: list, parallelism: int = 16, timeout: float = 10.0):
+        """Stops the agents together, then brings each back the way it was running (start or deploy)."""
+        modes = {
+            agent_id: "deploy" if self._runtime_status(agent_id) == "deployed" else "start"
+            for agent_id in agent_ids
+        }
+        for result in self.bulk_stop(agent_ids, timeout=timeout):
+            if not result["ok"]:
+                yield {**result, "phase": "stop"}
+        for action in ("start", "deploy"):
+            ids = [agent_id for agent_id, mode in modes.items() if mode == action]
+            yield from self.bulk_run(action, ids, parallelism=parallelism)
+
+    def dependency_graph(self, overrides: dict = None) -> DependencyGraph:
+        """Producer -> consumer graph of the whole catalog; overrides replace stored mappings."""
+        mappings = self.db.list_agent_mappings()
+        mappings.update(overrides or {})
+        return DependencyGraph(mappings)
+
+    def run_graph(self, action: str, agent_ids: list, include_upstream: bool = True, parallelism: int = 16):
+        """
+        Starts or deploys agents level by level so producers are up before
+        their consumers; agents within a level run in parallel. With
+        include_upstream, every (transitive) producer of agent_ids is included.
+        Consumers of a producer that failed are skipped. Yields per-agent results.
+        """
+        graph = self.dependency_graph()
+        ids = graph.upstream(agent_ids) if include_upstream else set(agent_ids)
+        failed = set()
+        for depth, level in enumerate(graph.levels(ids)):
+            runnable = []
+            for agent_id in level:
+                blocked = sorted(graph.producers.get(agent_id, set()) & failed)
+                if blocked:
+                    failed.add(agent_id)
+                    yield {"agent_id": agent_id, "ok": False, "level": depth, "error": f"producer {blocked[0]} failed"}
+                elif self._runtime_status(agent_id) in ("running", "deployed"):
+                    yield {"agent_id": agent_id, "ok": True, "level": depth, "skipped": "already running"}
+                else:
+                    runnable.append(agent_id)
+            for result in self.bulk_run(action, runnable, parallelism=parallelism):
+                if not result["ok"]:
+                    failed.add(result["agent_id"])
+                yield {**result, "level": depth}
+
+    def stop_with_dependents(self, agent_id: str, propagate: str = "policy", timeout: float = 10.0) -> list:
+        """
+        Stops an agent and, depending on `propagate`, its consumers: "none",
+        "all" (every transitive consumer) or "policy" (consumers whose
+        on_producer_stop is "stop", recursively). Consumers stop first.
+        """
+        graph = self.dependency_graph()
+        selected = {agent_id}
+        if propagate != "none":
+            stack = [agent_id]
+            while stack:
+                for consumer in graph.consumers.get(stack.pop(), ()):
+                    if consumer in selected:
+                        continue
+                    record = self.registry.record(consumer) or {}
+                    if propagate == "all" or record.get("on_producer_stop") == "stop":
+                        selected.add(consumer)
+                        stack.append(consumer)
+        try:
+            order = [node for level in reversed(graph.levels(selected)) for node in level]
+        except DependencyCycleError:
+            order = sorted(selected - {agent_id}) + [agent_id]
+        return list(self.bulk_stop(order, timeout=timeout))
+
+    def migrate_agent(self, agent_id: str, host_id: str = None) -> str | None:
+        """Moves a shared-mode agent to another host process."""
+        if not self.hosts.host_of(agent_id):
+            return None
+        return self.hosts.migrate(agent_id, host_id)
+
+    def _on_agent_exit(self, agent_id: str, kind: str, status: str, exitcode: int | None):
+        """Called by the supervisor (from its own thread) once a child has been reaped."""
+        if kind == "host":
+            return
+        # Keep the lease while a restart is pending so no other worker grabs the agent
+        if status == "backoff":
+            self.shared.update(agent_id, status=status, pid=None)
+        else:
+            self.shared.release(agent_id)
+        if kind == "deployed":
+            self.running_agents.pop(agent_id, None)
+            # Keep the port while a restart is pending so the agent comes back on it
+            if status != "backoff":
+                self.ports.release(agent_id)
+            return
+        runtime = self.registry.runtime_of(agent_id)
+        if not runtime:
+            return
+        runtime.process = None
+        runtime.status = status
+        self.spawns.notify()
+
+    def _restart_agent(self, agent_id: str, kind: str):
+        """Called by the supervisor when an agent's restart backoff has elapsed."""
+        if kind == "host":
+            self.supervisor.unwatch(agent_id, forget=True)
+            self.hosts.respawn(agent_id.removeprefix("host:"))
+            return
+        # Restarts skip the admission queue: the agent already held its slot
+        if kind == "deployed":
+            self._deploy_agent(agent_id)
+            return
+        runtime = self.registry.runtime_of(agent_id)
+        if not runtime:
+            return
+        if runtime.queue:
+            runtime.queue.close()
+            runtime.queue = None
+        runtime.status = "stopped"
+        self._start_agent(agent_id)
+
+def _resolved(value) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+def compile_agent(agent: dict, port: int | None = None) -> CompiledAgent:
+    """Compiles an agent record (cached by content hash); raises CodeCompileError."""
+    agent_mapping, args_mapping = load_mappings(agent.get("function_agent_mapping"))
+    agent_name = agent.get("name") or agent["agent_id"]
+    return compiler.compile(
+        agent["code"], agent_mapping, args_mapping, port, agent_name, agent["agent_id"],
+        filename=f"<agent {agent['agent_id']}>",
+    )
+
+
+def build_agent_source(agent: dict, port: int | None = None) -> str:
+    return compile_agent(agent, port).source
+
+
+def build_agent_artifact(store: ArtifactStore, agent: dict) -> str:
+    """Returns the compiled artifact for an agent, generating it only if its inputs changed."""
+    agent_mapping, args_mapping = load_mappings(agent.get("function_agent_mapping"))
+    agent_name = agent.get("name") or agent["agent_id"]
+    key = compile_key(agent["code"], agent_mapping, args_mapping, None, agent_name, agent["agent_id"])
+    return store.get_or_build(key, lambda: compile_agent(agent))
+
+
+def process_code(code: str, function_agent_mapping: dict, function_args_mapping: dict, port: int | None, agent_name: str, agent_id: str):
+    """Returns the generated agent source; see cogs/code_compiler.py."""
+    return compiler.compile(code, function_agent_mapping or {}, function_args_mapping or {}, port, agent_name, agent_id).source
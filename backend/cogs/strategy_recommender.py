@@ -1,13 +1,18 @@
 # cogs/recommendation_router.py
-from fastapi import APIRouter
+import importlib
+
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict
-from hyperon import *
 
-from cogs.database import AgentDatabase
+from cogs.api_router import manager
+from cogs.fast_json import FastJSONResponse
+from cogs.metrics import RECOMMEND_PHASE_SECONDS, PhaseTimer
+from cogs.subsystems import register
 
 router = APIRouter()
-db = AgentDatabase()
+# hyperon takes a while to import; the app warms it in the background at startup
+hyperon = register("hyperon", lambda: importlib.import_module("hyperon"), required=False)
 
 
 class UserProfile(BaseModel):
@@ -23,6 +28,12 @@ class UserProfile(BaseModel):
 
 @router.post("/recommend", tags=["Recommendations"])
 def recommend(user: UserProfile) -> Dict:
+    try:
+        metta_lib = hyperon.get()
+    except ImportError as e:
+        raise HTTPException(status_code=503, detail=f"Recommendation engine unavailable: {e}")
+    MeTTa, E, S, V, ValueAtom = metta_lib.MeTTa, metta_lib.E, metta_lib.S, metta_lib.V, metta_lib.ValueAtom
+    phases = PhaseTimer(RECOMMEND_PHASE_SECONDS)
     metta = MeTTa()
 
     # Add user data to MeTTa
@@ -48,9 +59,10 @@ def recommend(user: UserProfile) -> Dict:
     # Exclusions
     for ex in user.excludes:
         metta.space().add_atom(E(S("EXCLUDES_STRATEGY"), S(user.user_id), S(ex)))
+    phases.mark("user_atoms")
 
     # Fetch real strategies from database instead of hardcoded data
-    real_agents = db.list_agents(type="strategy")
+    real_agents = manager.list_agents(type="strategy")
     strategies_data = []
     
     # Convert database agents to strategy format
@@ -131,6 +143,7 @@ def recommend(user: UserProfile) -> Dict:
         ]
     else:
         print(f"Found {len(strategies_data)} real agents in database for recommendations")
+    phases.mark("load_agents")
 
     for (
         s_id,
@@ -155,6 +168,7 @@ def recommend(user: UserProfile) -> Dict:
         metta.space().add_atom(E(S("HAS_REPUTATION"), S(s_id), ValueAtom(rep)))
 
     metta.space().add_atom(E(S("CurrentMarket"), ValueAtom("Bullish")))
+    phases.mark("strategy_atoms")
 
     def get_atom_value(atom):
         mt = atom.get_metatype()
@@ -289,10 +303,13 @@ def recommend(user: UserProfile) -> Dict:
         recommendations.append(recommendation)
 
     recommendations.sort(key=lambda x: x["score"], reverse=True)
-    
-    return {
+    phases.mark("score")
+
+    response = FastJSONResponse({
         "recommendations": recommendations,
         "total_strategies": len(strategies_data),
         "using_real_data": len(real_agents) > 0,
         "source": "database" if real_agents else "fallback_sample"
-    }
+    })
+    phases.mark("serialize")
+    return response
@@ -0,0 +1,92 @@
+import threading
+import time
+
+
+class Subsystem:
+    """
+    Something expensive to set up (the StrategyManager, the hyperon import)
+    built once, on first use or by a background warm-up, whichever comes
+    first. Callers that arrive while it is being built wait for it.
+    """
+
+    def __init__(self, name: str, factory, required: bool = True):
+        self.name = name
+        self.factory = factory
+        # Optional subsystems (hyperon for /recommend) are reported but do not hold back readiness
+        self.required = required
+        self.state = "cold"  # cold -> warming -> ready | failed (retried on the next get)
+        self.error = None
+        self.seconds = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.state == "ready":
+            return self._value
+        with self._lock:
+            if self.state != "ready":
+                self.state = "warming"
+                started = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self.state, self.error = "failed", f"{type(e).__name__}: {e}"
+                    raise
+                self.seconds = time.perf_counter() - started
+                self.state, self.error = "ready", None
+        return self._value
+
+    def warm_in_background(self) -> threading.Thread:
+        def warm():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"Warming {self.name} failed: {e}")
+
+        thread = threading.Thread(target=warm, name=f"warm-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> dict:
+        return {"state": self.state, "required": self.required, "seconds": self.seconds, "error": self.error}
+
+
+class LazyProxy:
+    """Module-level stand-in (e.g. api_router.manager) that builds its subsystem on first attribute access."""
+
+    __slots__ = ("_subsystem",)
+
+    def __init__(self, subsystem: Subsystem):
+        object.__setattr__(self, "_subsystem", subsystem)
+
+    def __getattr__(self, name):
+        return getattr(self._subsystem.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._subsystem.get(), name, value)
+
+
+SUBSYSTEMS: dict[str, Subsystem] = {}
+
+
+def register(name: str, factory, required: bool = True) -> Subsystem:
+    subsystem = SUBSYSTEMS.get(name)
+    if subsystem is None:
+        subsystem = SUBSYSTEMS[name] = Subsystem(name, factory, required)
+    return subsystem
+
+
+def lazy(name: str, factory) -> LazyProxy:
+    return LazyProxy(register(name, factory))
+
+
+def warm_all() -> list[threading.Thread]:
+    """Starts building every registered subsystem that is not ready yet, each on its own thread."""
+    return [s.warm_in_background() for s in list(SUBSYSTEMS.values()) if s.state in ("cold", "failed")]
+
+
+def readiness() -> dict:
+    return {
+        "ready": all(s.state == "ready" for s in SUBSYSTEMS.values() if s.required),
+        "subsystems": {name: s.status() for name, s in SUBSYSTEMS.items()},
+    }
@@ -0,0 +1,359 @@
+import logging
+import os
+import signal
+import threading
+import time
+import heapq
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
+
+RESTART_POLICIES = ("never", "on-failure", "always")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WatchedProcess:
+    agent_id: str
+    kind: str  # "local" (multiprocessing.Process) or "deployed" (subprocess.Popen)
+    handle: object
+    pid: int
+    policy: str
+    max_restarts: int
+    started_at: float
+
+
+@dataclass
+class AgentHistory:
+    status: str = "stopped"
+    kind: str | None = None
+    pid: int | None = None
+    exitcode: int | None = None
+    starts: int = 0
+    exits: int = 0
+    restarts: int = 0
+    consecutive_failures: int = 0
+    next_restart_at: float | None = None
+    recent_exits: deque = field(default_factory=lambda: deque(maxlen=32))
+
+
+# Supervisors the SIGCHLD handler wakes; it is installed once, from the main thread
+_supervisors: "weakref.WeakSet[AgentSupervisor]" = weakref.WeakSet()
+_sigchld_installed = False
+
+
+def install_sigchld_handler() -> bool:
+    """
+    Installs the SIGCHLD handler that wakes every AgentSupervisor, now and
+    built later. Signal handlers can only be installed from the main thread,
+    so the API lifespan calls this before the manager is built on a warm-up
+    thread. Returns False off the main thread; supervisors then fall back to
+    polling every `poll_interval` seconds.
+    """
+    global _sigchld_installed
+    if _sigchld_installed:
+        return True
+    if threading.current_thread() is not threading.main_thread():
+        return False
+    previous = signal.getsignal(signal.SIGCHLD)
+
+    def _handler(signum, frame):
+        for supervisor in list(_supervisors):
+            supervisor._wake.set()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGCHLD, _handler)
+    _sigchld_installed = True
+    return True
+
+
+def _collect_exitcode(handle) -> int | None:
+    """Reaps the child through its own handle so the handle stays consistent."""
+    if hasattr(handle, "exitcode"):  # multiprocessing.Process
+        handle.join(timeout=0)
+        return handle.exitcode
+    return handle.poll()  # subprocess.Popen
+
+
+class AgentSupervisor:
+    """
+    Tracks agent child processes, reaps them as soon as they exit and restarts
+    them according to their restart policy.
+
+    SIGCHLD wakes the loop as soon as a child exits; each wake-up asks
+    waitid(P_ALL, WNOWAIT) which children have exited and reaps only those.
+    waitid alone misses two cases: Process.start() reaps any already-finished
+    multiprocessing child before waitid sees it, and an unreaped foreign
+    child is returned first on every call. A sweep over every watched handle
+    every `poll_interval` seconds catches both.
+    """
+
+    def __init__(
+        self,
+        on_exit,
+        on_restart,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        crashloop_window: float = 60.0,
+        stable_after: float = 30.0,
+        poll_interval: float = 1.0,
+    ):
+        self.on_exit = on_exit
+        self.on_restart = on_restart
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.crashloop_window = crashloop_window
+        self.stable_after = stable_after
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._by_pid: dict[int, WatchedProcess] = {}
+        self._by_agent: dict[str, WatchedProcess] = {}
+        # Handles that were unwatched while still alive; reaped through the handle when they exit
+        self._detached: dict[int, object] = {}
+        # Foreign children already counted, so one zombie is not counted on every wake-up
+        self._foreign: set[int] = set()
+        self._history: dict[str, AgentHistory] = {}
+        self._restart_heap: list[tuple[float, int, str, str]] = []
+        self._restart_seq = 0
+        self._next_sweep = 0.0
+        self.counters = {"starts": 0, "exits": 0, "restarts": 0, "crashloops": 0, "foreign_children": 0}
+        self._thread = None
+        _supervisors.add(self)
+        install_sigchld_handler()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="agent-supervisor", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def watch(self, agent_id: str, kind: str, handle, policy: str = "never", max_restarts: int = 5):
+        """Starts supervising a freshly spawned agent process."""
+        if policy not in RESTART_POLICIES:
+            policy = "never"
+        entry = WatchedProcess(
+            agent_id=agent_id,
+            kind=kind,
+            handle=handle,
+            pid=handle.pid,
+            policy=policy,
+            max_restarts=max_restarts if max_restarts is not None else 5,
+            started_at=time.monotonic(),
+        )
+        with self._lock:
+            self._by_pid[entry.pid] = entry
+            self._by_agent[agent_id] = entry
+            history = self._history.setdefault(agent_id, AgentHistory())
+            history.status = "running"
+            history.kind = kind
+            history.pid = entry.pid
+            history.exitcode = None
+            history.next_restart_at = None
+            history.starts += 1
+            self.counters["starts"] += 1
+        # A child may have died before it was registered
+        self._wake.set()
+
+    def unwatch(self, agent_id: str, forget: bool = False):
+        """Stops supervising an agent, e.g. because it is being stopped on purpose."""
+        with self._lock:
+            entry = self._by_agent.pop(agent_id, None)
+            if entry:
+                self._by_pid.pop(entry.pid, None)
+                self._detached[entry.pid] = entry.handle
+            history = self._history.get(agent_id)
+            if forget:
+                self._history.pop(agent_id, None)
+            elif history:
+                history.status = "stopped"
+                history.pid = None
+                history.next_restart_at = None
+                history.consecutive_failures = 0
+        return entry.handle if entry else None
+
+    def running_pids(self) -> dict[str, int]:
+        with self._lock:
+            return {agent_id: entry.pid for agent_id, entry in self._by_agent.items()}
+
+    def status(self, agent_id: str) -> dict | None:
+        with self._lock:
+            history = self._history.get(agent_id)
+            if not history:
+                return None
+            return self._history_dict(history)
+
+    def stats(self) -> dict:
+        with self._lock:
+            by_status = {}
+            for history in self._history.values():
+                by_status[history.status] = by_status.get(history.status, 0) + 1
+            return {
+                "counters": dict(self.counters),
+                # False means exits are only noticed on the poll_interval poll
+                "sigchld": _sigchld_installed,
+                "supervised": len(self._by_pid),
+                "pending_restarts": sum(1 for h in self._history.values() if h.next_restart_at is not None),
+                "by_status": by_status,
+                "agents": {agent_id: self._history_dict(h) for agent_id, h in self._history.items()},
+            }
+
+    @staticmethod
+    def _history_dict(history: AgentHistory) -> dict:
+        return {
+            "status": history.status,
+            "kind": history.kind,
+            "pid": history.pid,
+            "exitcode": history.exitcode,
+            "starts": history.starts,
+            "exits": history.exits,
+            "restarts": history.restarts,
+            "consecutive_failures": history.consecutive_failures,
+            "next_restart_in": (
+                max(0.0, history.next_restart_at - time.monotonic()) if history.next_restart_at else None
+            ),
+        }
+
+    def _run(self):
+        while not self._stopped.is_set():
+            timeout = self.poll_interval
+            with self._lock:
+                if self._restart_heap:
+                    timeout = max(0.0, min(timeout, self._restart_heap[0][0] - time.monotonic()))
+            self._wake.wait(timeout)
+            self._wake.clear()
+            try:
+                sweep = time.monotonic() >= self._next_sweep
+                if sweep:
+                    self._next_sweep = time.monotonic() + self.poll_interval
+                self._reap(sweep=sweep)
+                if sweep:
+                    self._prune_detached()
+                self._run_due_restarts()
+            except Exception:
+                logger.exception("Agent supervisor error")
+
+    def _reap(self, sweep: bool = False):
+        """Reaps the children waitid reports as exited; with sweep, polls every watched handle as well."""
+        while True:
+            try:
+                info = os.waitid(os.P_ALL, 0, os.WEXITED | os.WNOHANG | os.WNOWAIT)
+            except ChildProcessError:
+                break
+            if info is None:
+                break
+            with self._lock:
+                entry = self._by_pid.get(info.si_pid)
+                handle = self._detached.get(info.si_pid)
+            if entry is not None:
+                if not self._collect(entry):
+                    break
+            elif handle is not None:
+                if _collect_exitcode(handle) is None:
+                    break
+                with self._lock:
+                    self._detached.pop(info.si_pid, None)
+            else:
+                # waitid returns this child first until its owner reaps it; the sweep covers the rest
+                self._count_foreign(info.si_pid)
+                break
+        if sweep:
+            with self._lock:
+                watched = list(self._by_pid.values())
+            for entry in watched:
+                self._collect(entry)
+
+    def _collect(self, entry: WatchedProcess) -> bool:
+        """Reaps one watched process if it has exited and reports the exit. Returns whether it had exited."""
+        exitcode = _collect_exitcode(entry.handle)
+        if exitcode is None:
+            return False
+        with self._lock:
+            # Unwatched (stopped on purpose) while we were polling
+            if self._by_pid.get(entry.pid) is not entry:
+                return True
+            del self._by_pid[entry.pid]
+            if self._by_agent.get(entry.agent_id) is entry:
+                del self._by_agent[entry.agent_id]
+        self._handle_exit(entry, exitcode)
+        return True
+
+    def _count_foreign(self, pid: int):
+        """Counts exited children nobody here owns (e.g. a subprocess.run elsewhere); their owner reaps them."""
+        with self._lock:
+            if pid in self._foreign:
+                return
+            if len(self._foreign) >= 1024:
+                self._foreign.clear()
+            self._foreign.add(pid)
+            self.counters["foreign_children"] += 1
+
+    def _prune_detached(self):
+        # Detached handles are usually reaped by whoever stopped them (join/wait)
+        with self._lock:
+            detached = list(self._detached.items())
+        for pid, handle in detached:
+            if _collect_exitcode(handle) is not None:
+                with self._lock:
+                    self._detached.pop(pid, None)
+
+    def _handle_exit(self, entry: WatchedProcess, exitcode: int | None):
+        now = time.monotonic()
+        failed = exitcode != 0
+        with self._lock:
+            history = self._history.setdefault(entry.agent_id, AgentHistory())
+            history.exits += 1
+            history.exitcode = exitcode
+            history.pid = None
+            history.recent_exits.append(now)
+            self.counters["exits"] += 1
+
+            if now - entry.started_at >= self.stable_after:
+                history.consecutive_failures = 0
+            if failed:
+                history.consecutive_failures += 1
+
+            should_restart = entry.policy == "always" or (entry.policy == "on-failure" and failed)
+            recent = sum(1 for t in history.recent_exits if now - t <= self.crashloop_window)
+            if should_restart and recent > entry.max_restarts:
+                history.status = "crashloop"
+                self.counters["crashloops"] += 1
+            elif should_restart:
+                delay = min(self.backoff_max, self.backoff_base * (2 ** max(0, history.consecutive_failures - 1)))
+                history.status = "backoff"
+                history.next_restart_at = now + delay
+                self._restart_seq += 1
+                heapq.heappush(self._restart_heap, (now + delay, self._restart_seq, entry.agent_id, entry.kind))
+            else:
+                history.status = "crashed" if failed else "exited"
+            status = history.status
+
+        logger.info("Agent %s (%s, pid %s) exited with %s: %s", entry.agent_id, entry.kind, entry.pid, exitcode, status)
+        self.on_exit(entry.agent_id, entry.kind, status, exitcode)
+
+    def _run_due_restarts(self):
+        due = []
+        now = time.monotonic()
+        with self._lock:
+            while self._restart_heap and self._restart_heap[0][0] <= now:
+                due_at, _, agent_id, kind = heapq.heappop(self._restart_heap)
+                history = self._history.get(agent_id)
+                # Skip entries cancelled by an explicit stop/start in the meantime
+                if not history or history.status != "backoff" or history.next_restart_at != due_at:
+                    continue
+                history.next_restart_at = None
+                history.restarts += 1
+                self.counters["restarts"] += 1
+                due.append((agent_id, kind))
+        for agent_id, kind in due:
+            try:
+                self.on_restart(agent_id, kind)
+            except Exception:
+                logger.exception("Failed to restart agent %s", agent_id)
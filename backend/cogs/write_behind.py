@@ -0,0 +1,157 @@
+import atexit
+import threading
+import time
+
+FLUSH_INTERVAL_S = 0.5
+MAX_PENDING = 256
+
+
+class PendingReputation:
+    """Buffered reputation changes for one agent since the last flush."""
+
+    __slots__ = ("value", "total", "count", "updated_at")
+
+    def __init__(self):
+        # Last absolute reputation set through the API (last value wins)
+        self.value = None
+        # Individual ratings submitted since the last flush (sum/count aggregation)
+        self.total = 0.0
+        self.count = 0
+        self.updated_at = time.time()
+
+
+class ReputationBuffer:
+    """
+    Write-behind buffer for reputation updates.
+
+    Updates for the same agent are merged in memory and written by a
+    background thread in one transaction every `interval` seconds, or as
+    soon as `max_pending` agents have pending changes. Reads go through
+    `overlay`, so callers see a buffered value immediately. flush() runs at
+    interpreter exit and from the API's shutdown hook.
+    """
+
+    def __init__(self, db, interval: float = FLUSH_INTERVAL_S, max_pending: int = MAX_PENDING, on_flush=None):
+        self.db = db
+        self.interval = interval
+        self.max_pending = max_pending
+        # Called with {agent_id: {"reputation", "rating_total", "rating_count"}} after each committed flush
+        self.on_flush = on_flush
+        self._pending: dict[str, PendingReputation] = {}
+        # The batch being committed; overlaid on reads until SQLite has it, then
+        # dropped at once so a record reloaded from the database is not counted twice
+        self._inflight: dict[str, PendingReputation] = {}
+        self._lock = threading.Lock()
+        # Serialises flushes so a row never sees an older batch committed after a newer one
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self.stats = {"updates": 0, "flushes": 0, "rows_written": 0}
+
+    def set(self, agent_id: str, reputation: float):
+        """Sets an absolute reputation; overrides ratings submitted before it (but not their totals)."""
+        with self._lock:
+            self._entry(agent_id).value = reputation
+        self._updated()
+
+    def add_rating(self, agent_id: str, rating: float, count: int = 1):
+        """
+        Adds `count` ratings summing to `rating`; reputation becomes the
+        average of all ratings stored and buffered.
+        """
+        with self._lock:
+            pending = self._entry(agent_id)
+            pending.value = None
+            pending.total += rating
+            pending.count += count
+        self._updated()
+
+    def _entry(self, agent_id: str) -> PendingReputation:
+        pending = self._pending.get(agent_id)
+        if pending is None:
+            pending = self._pending[agent_id] = PendingReputation()
+        pending.updated_at = time.time()
+        return pending
+
+    def _updated(self):
+        self.stats["updates"] += 1
+        if self._thread is None:
+            self._start()
+        if len(self._pending) >= self.max_pending:
+            self._wake.set()
+
+    def overlay(self, record: dict) -> dict:
+        """Returns the record with its buffered reputation applied (the same dict if nothing is pending)."""
+        agent_id = record.get("agent_id")
+        with self._lock:
+            entries = [
+                (e.value, e.total, e.count)
+                for e in (self._inflight.get(agent_id), self._pending.get(agent_id)) if e is not None
+            ]
+        if not entries:
+            return record
+        value = record.get("reputation")
+        total = record.get("rating_total") or 0.0
+        count = record.get("rating_count") or 0
+        for entry_value, entry_total, entry_count in entries:
+            total += entry_total
+            count += entry_count
+            value = entry_value if entry_value is not None else total / count
+        return {**record, "reputation": value, "rating_total": total, "rating_count": count}
+
+    def overlay_many(self, records: list) -> list:
+        if not self._pending and not self._inflight:
+            return records
+        return [self.overlay(record) for record in records]
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="reputation-flush", daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Flushing reputation updates failed: {e}")
+
+    def flush(self) -> int:
+        """Writes every pending update in one transaction. Returns the number of agents written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._inflight = pending
+            if not pending:
+                return 0
+            updates = [(agent_id, p.value, p.total, p.count) for agent_id, p in pending.items()]
+            try:
+                written = self.db.apply_reputation_updates(updates)
+            except Exception:
+                # Put the batch back under anything newer so nothing is lost
+                with self._lock:
+                    for agent_id, p in pending.items():
+                        newer = self._pending.get(agent_id)
+                        if newer is None:
+                            self._pending[agent_id] = p
+                        else:
+                            # newer.value (or its derived average) is the later write and stays
+                            newer.total += p.total
+                            newer.count += p.count
+                    self._inflight = {}
+                raise
+            with self._lock:
+                self._inflight = {}
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(written)
+            if self.on_flush and written:
+                self.on_flush(written)
+        return len(written)
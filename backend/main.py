@@ -1,12 +1,37 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from cogs.api_router import router as agent_router
 from cogs.strategy_recommender import router as recommend_router
+from cogs.backtest_router import router as backtest_router
+from cogs.compression import CompressionMiddleware
+from cogs.metrics import REGISTRY, MetricsMiddleware
+from cogs.profiling import ProfilingMiddleware, admin_router as profiles_router
+from cogs.subsystems import SUBSYSTEMS, readiness, warm_all
+from cogs.supervisor import install_sigchld_handler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Signal handlers can only be installed here, on the main thread; the supervisor
+    # built on the warm-up thread below is woken by it
+    install_sigchld_handler()
+    # The agent manager and hyperon are built on background threads so the server starts
+    # accepting requests at once; /ready reports when they are warm
+    warm_all()
+    yield
+    manager = SUBSYSTEMS["manager"]
+    if manager.state == "ready":
+        manager.get().shutdown()
+
 
 app = FastAPI(
     title="Fetch.ai Agent Runner API",
     description="Create, run, stop, and log Python agents",
     version="2.1.0",
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -18,8 +43,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip (or brotli, when installed) for large bodies; streamed NDJSON passes through
+app.add_middleware(CompressionMiddleware)
+# Stack samples for requests sent with X-Profile: $PROFILE_TOKEN, or PROFILE_SAMPLE_RATE of slow routes
+app.add_middleware(ProfilingMiddleware)
+# Outermost, so route latency includes compression and CORS
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(agent_router, prefix="/agents", tags=["Agents"])
 app.include_router(recommend_router, prefix="/recommend", tags=["Recommendations"])
+app.include_router(backtest_router, prefix="/backtests", tags=["Backtests"])
+app.include_router(profiles_router, prefix="/admin/profiles", tags=["Admin"])
+
+@app.get("/ready", tags=["Root"])
+def ready():
+    # 503 until every required subsystem is warm, so load balancers hold traffic back; requests still work before that
+    report = readiness()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/metrics", tags=["Root"])
+def metrics():
+    # Prometheus text exposition format
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.get("/", tags=["Root"])
 async def root():
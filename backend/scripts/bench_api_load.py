@@ -0,0 +1,396 @@
+"""
+HTTP load test and regression check for the agent API.
+
+Seeds a throwaway data directory (AGENT_DATA_DIR) with synthetic strategies,
+a few long-running agents for start/stop, and OHLCV history, starts the app
+(in this process through httpx's ASGI transport, or as a uvicorn server on
+localhost), then drives a weighted mix of operations at a fixed request
+rate. Requests are scheduled open loop: latency is measured from when a
+request was due, so a server that falls behind shows it in the tail.
+
+Results (throughput, error rate and p50/p95/p99 per operation) are written
+as JSON. Given --baseline, they are compared against an earlier result and
+the script exits with status 1 when any operation regressed by more than
+--tolerance.
+
+Operations: list, search, get, create, reputation, rating, recommend,
+backtest, start, stop.
+
+Usage (from backend/):
+    python scripts/bench_api_load.py --rps 100 --duration 20 --out load.json
+    python scripts/bench_api_load.py --target uvicorn --mix list=4,get=4,search=2,start=1,stop=1
+    python scripts/bench_api_load.py --baseline load.json --tolerance 0.25
+    python scripts/bench_api_load.py --target http://127.0.0.1:8000   # existing server, not seeded
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_MIX = "list=4,search=2,get=6,create=1,reputation=1,rating=1,recommend=1,backtest=1,start=1,stop=1"
+WORDS = ["momentum", "mean", "reversion", "breakout", "ema", "rsi", "macd", "vwap", "volume", "hedge"]
+RISKS = ["Conservative", "Moderate", "Aggressive", "High-Degenerate"]
+ASSETS = ["LargeCapCrypto", "MidCapCrypto", "Stablecoins", "DeFi", "NFTs"]
+STRATEGY = """
+from cogs.indicators import ema
+def signals(bars, fast={fast}, slow={slow}):
+    return np.where(ema(bars["close"], fast) > ema(bars["close"], slow), 1.0, 0.0)
+"""
+RUNNER = "import time\nwhile True:\n    time.sleep(1)\n"
+
+
+def seed(args, rng: random.Random) -> dict:
+    """Writes agents and history straight into the databases under AGENT_DATA_DIR."""
+    # Imported here so cogs.database picks up AGENT_DATA_DIR set by main()
+    from cogs.database import AgentDatabase, PubSubDatabase
+
+    db, pubsub = AgentDatabase(), PubSubDatabase()
+    producers = [f"producer-{i}" for i in range(args.producers)]
+    for producer in producers:
+        db.add_agent(producer, "print('feed')", name=producer, type="data")
+        price, rows = 100.0, []
+        for i in range(args.bars):
+            price *= 1 + rng.gauss(0, 0.01)
+            rows.append((producer, price, price * 1.002, price * 0.998, price, rng.uniform(1, 100), 60.0 * i, ""))
+        pubsub.insert_rows(rows)
+    strategies = []
+    for i in range(args.agents):
+        agent_id = f"strategy-{i}"
+        db.add_agent(
+            agent_id, STRATEGY.format(fast=rng.randint(2, 20), slow=rng.randint(30, 80)), None,
+            rng.choice(RISKS), rng.choice(ASSETS), rng.choice(["Short-term", "Medium-term", "Long-term"]),
+            rng.choice(["Bullish", "Bearish", "Sideways", "Volatile"]), rng.choice(["RSI", "MACD", "VWAP"]),
+            round(rng.uniform(-1, 3), 3), rng.random() < 0.2, round(rng.uniform(0, 5), 2),
+            f"{' '.join(rng.sample(WORDS, 2)).title()} {i}", f"0x{rng.getrandbits(160):040x}",
+            type="strategy",
+        )
+        strategies.append(agent_id)
+    runners = [f"runner-{i}" for i in range(args.runners)]
+    for runner in runners:
+        db.add_agent(runner, RUNNER, name=runner, type="worker")
+    return {"strategies": strategies, "producers": producers, "runners": runners}
+
+
+def discover(client_url: str) -> dict:
+    """For an existing server: use whatever agents it lists."""
+    agents = httpx.get(f"{client_url}/agents/", timeout=30).json()["agents"]
+    return {
+        "strategies": [a["agent_id"] for a in agents if a.get("type") == "strategy"],
+        "producers": [a["agent_id"] for a in agents if a.get("type") == "data"],
+        "runners": [],
+    }
+
+
+class Workload:
+    """Picks and issues operations; keeps the pools start/stop/create draw from."""
+
+    def __init__(self, pools: dict, rng: random.Random):
+        self.rng = rng
+        self.strategies = list(pools["strategies"])
+        self.producers = list(pools["producers"])
+        self.stopped = list(pools["runners"])
+        self.running = []
+        self.created = 0
+
+    def request(self, op: str):
+        """(method, path, json body) for one operation, or None when its pool is empty."""
+        rng = self.rng
+        if op == "list":
+            return "GET", "/agents/", None
+        if op == "search":
+            return "GET", f"/agents/search?q={rng.choice(WORDS).title()}", None
+        if op == "create":
+            self.created += 1
+            body = {"code": STRATEGY.format(fast=5, slow=40), "name": f"created {self.created}", "type": "strategy",
+                    "risk": rng.choice(RISKS), "assetClass": rng.choice(ASSETS)}
+            return "POST", "/agents/", body
+        if op == "recommend":
+            return "POST", "/recommend/recommend", {
+                "user_id": f"user-{rng.randint(1, 1000)}", "profile": rng.choice(RISKS), "asset_class": rng.choice(ASSETS),
+                "time_horizon": "Medium-term", "liquidity": "High", "experience": "Intermediate", "interest": "RSI",
+            }
+        if op == "start":
+            if not self.stopped:
+                return None
+            agent_id = self.stopped.pop(rng.randrange(len(self.stopped)))
+            self.running.append(agent_id)
+            return "POST", f"/agents/{agent_id}/start", None
+        if op == "stop":
+            if not self.running:
+                return None
+            agent_id = self.running.pop(rng.randrange(len(self.running)))
+            self.stopped.append(agent_id)
+            return "POST", f"/agents/{agent_id}/stop", None
+        if not self.strategies:
+            return None
+        agent_id = rng.choice(self.strategies)
+        if op == "get":
+            return "GET", f"/agents/{agent_id}", None
+        if op == "reputation":
+            return "POST", f"/agents/{agent_id}/reputation", {"reputation": rng.randint(0, 5)}
+        if op == "rating":
+            return "POST", f"/agents/{agent_id}/rating", {"rating": rng.randint(1, 5)}
+        if op == "backtest":
+            if not self.producers:
+                return None
+            return "POST", f"/agents/{agent_id}/backtest", {"data_agent_id": rng.choice(self.producers),
+                                                            "write_perf": False}
+        raise ValueError(f"Unknown operation {op}")
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest rank
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(samples: list, measured_s: float) -> dict:
+    """samples: (op, seconds, status or None on transport error)"""
+    def stats(rows):
+        latencies = sorted(seconds * 1000 for _, seconds, _ in rows)
+        errors = sum(1 for _, _, status in rows if status is None or status >= 400)
+        statuses = {}
+        for _, _, status in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        return {
+            "count": len(rows),
+            "errors": errors,
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "throughput_rps": len(rows) / measured_s,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "max_ms": latencies[-1] if latencies else 0.0,
+            "statuses": statuses,
+        }
+
+    by_op = {}
+    for sample in samples:
+        by_op.setdefault(sample[0], []).append(sample)
+    return {"overall": stats(samples), "ops": {op: stats(rows) for op, rows in sorted(by_op.items())}}
+
+
+async def drive(client: httpx.AsyncClient, workload: Workload, mix: dict, args) -> tuple[list, float, int]:
+    """Issues requests every 1/rps seconds for warmup + duration; returns (samples, measured seconds, skipped)."""
+    ops, weights = list(mix), list(mix.values())
+    samples, tasks = [], set()
+    skipped = 0
+    interval = 1 / args.rps
+    started = time.perf_counter()
+    measure_from = started + args.warmup
+    end = measure_from + args.duration
+    inflight = asyncio.Semaphore(args.max_inflight)
+
+    async def issue(op, method, path, body, due):
+        async with inflight:
+            try:
+                response = await client.request(method, path, json=body)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = None
+        if due >= measure_from:
+            samples.append((op, time.perf_counter() - due, status))
+
+    due = started
+    while due < end:
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        request = None
+        for _ in range(len(ops)):
+            op = workload.rng.choices(ops, weights)[0]
+            request = workload.request(op)
+            if request is not None:
+                break
+        if request is None:
+            skipped += 1
+        else:
+            task = asyncio.create_task(issue(op, *request, due))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        due += interval
+    await asyncio.gather(*tasks)
+    return samples, time.perf_counter() - measure_from, skipped
+
+
+async def stop_running(client: httpx.AsyncClient, workload: Workload):
+    for agent_id in workload.running:
+        try:
+            await client.post(f"/agents/{agent_id}/stop", params={"propagate": "none"})
+        except httpx.HTTPError:
+            pass
+
+
+async def run_inprocess(workload: Workload, mix: dict, args):
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            await wait_ready(client)
+            try:
+                return await drive(client, workload, mix, args)
+            finally:
+                await stop_running(client, workload)
+
+
+async def run_http(url: str, workload: Workload, mix: dict, args, server: subprocess.Popen = None):
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client, server)
+        try:
+            return await drive(client, workload, mix, args)
+        finally:
+            await stop_running(client, workload)
+
+
+async def wait_ready(client: httpx.AsyncClient, server: subprocess.Popen = None, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"server exited with status {server.returncode}")
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not become ready")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def compare(result: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list[str]:
+    """Regressions of result against baseline, as printable lines."""
+    regressions = []
+    for op, current in result["ops"].items():
+        before = baseline["ops"].get(op)
+        if not before or not before["count"]:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if current[key] > before[key] * (1 + tolerance) and current[key] - before[key] > min_delta_ms:
+                regressions.append(f"{op} {key}: {before[key]:.2f} -> {current[key]:.2f}")
+        if current["error_rate"] > before["error_rate"] + 0.01:
+            regressions.append(f"{op} error rate: {before['error_rate']:.1%} -> {current['error_rate']:.1%}")
+    before, current = baseline["overall"]["throughput_rps"], result["overall"]["throughput_rps"]
+    if current < before * (1 - tolerance):
+        regressions.append(f"throughput: {before:.1f} -> {current:.1f} req/s")
+    return regressions
+
+
+def print_table(result: dict, baseline: dict = None):
+    print(f"{'operation':<12} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+          + ("   p99 baseline" if baseline else ""))
+    rows = list(result["ops"].items()) + [("overall", result["overall"])]
+    for op, stats in rows:
+        line = (f"{op:<12} {stats['count']:>7} {stats['errors']:>7} "
+                f"{stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+        before = baseline and (baseline["overall"] if op == "overall" else baseline["ops"].get(op))
+        if before:
+            line += f"   {before['p99_ms']:>9.2f}"
+        print(line)
+    print(f"throughput {result['overall']['throughput_rps']:.1f} req/s (target {result['meta']['rps']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="inprocess", help="inprocess, uvicorn, or the URL of a running server")
+    parser.add_argument("--rps", type=float, default=50)
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds run before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="op=weight list")
+    parser.add_argument("--agents", type=int, default=500, help="strategies to seed")
+    parser.add_argument("--runners", type=int, default=8, help="long-running agents for start/stop")
+    parser.add_argument("--producers", type=int, default=3)
+    parser.add_argument("--bars", type=int, default=2000, help="OHLCV bars per producer")
+    parser.add_argument("--max-inflight", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write the result JSON here")
+    parser.add_argument("--baseline", help="result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="ignore latency changes smaller than this")
+    args = parser.parse_args()
+
+    mix = {}
+    for part in args.mix.split(","):
+        op, _, weight = part.partition("=")
+        mix[op.strip()] = float(weight or 1)
+    rng = random.Random(args.seed)
+
+    server = None
+    if args.target in ("inprocess", "uvicorn"):
+        data_dir = tempfile.mkdtemp(prefix="bench-api-")
+        os.environ["AGENT_DATA_DIR"] = data_dir
+        started = time.perf_counter()
+        pools = seed(args, rng)
+        print(f"seeded {args.agents} strategies, {args.runners} runners, {args.producers}x{args.bars} bars "
+              f"in {time.perf_counter() - started:.1f} s ({data_dir})")
+    else:
+        pools = discover(args.target)
+    workload = Workload(pools, rng)
+
+    try:
+        if args.target == "inprocess":
+            samples, measured, skipped = asyncio.run(run_inprocess(workload, mix, args))
+        else:
+            url = args.target
+            if args.target == "uvicorn":
+                port = free_port()
+                url = f"http://127.0.0.1:{port}"
+                server = subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                    cwd=BACKEND_DIR, env=dict(os.environ),
+                )
+            samples, measured, skipped = asyncio.run(run_http(url, workload, mix, args, server))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+
+    result = summarize(samples, measured)
+    result["meta"] = {
+        "target": args.target if args.target in ("inprocess", "uvicorn") else "url",
+        "rps": args.rps, "duration_s": args.duration, "mix": mix, "agents": args.agents,
+        "skipped": skipped, "python": platform.python_version(), "machine": platform.machine(),
+        "cpus": os.cpu_count(), "created_at": time.time(),
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_table(result, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"wrote {args.out}")
+    if baseline:
+        regressions = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Measures parameter-sweep throughput (backtest cells per second) of
+BacktestScheduler for increasing worker counts, on synthetic history.
+
+Usage (from backend/):
+    python scripts/bench_backtest_sweep.py --bars 200000 --cells 256
+
+Runs against a throwaway database in a temporary directory.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.backtest_scheduler import BacktestScheduler  # noqa: E402
+from cogs.database import PubSubDatabase  # noqa: E402
+
+STRATEGY = """
+from cogs.indicators import ema
+def signals(bars, fast=10, slow=50):
+    return np.where(ema(bars["close"], fast) > ema(bars["close"], slow), 1.0, 0.0)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=200_000)
+    parser.add_argument("--cells", type=int, default=256, help="parameter combinations per run")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-sweep-")
+    pubsub = PubSubDatabase(os.path.join(tmp, "pubsub.db"))
+    rng = np.random.default_rng(1)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, args.bars)))
+    pubsub.insert_rows([("producer", c, c, c, c, 1.0, 60.0 * i, "") for i, c in enumerate(close)])
+
+    record = {"agent_id": "strategy", "code": STRATEGY, "function_agent_mapping": None}
+    side = max(1, int(args.cells ** 0.5))
+    grid = {"fast": list(range(2, 2 + side)), "slow": list(range(30, 30 + side))}
+
+    workers = 1
+    baseline = None
+    while workers <= args.max_workers:
+        scheduler = BacktestScheduler(lambda _: record, pubsub, root=os.path.join(tmp, f"w{workers}"), workers=workers)
+        job = scheduler.submit(["strategy"], grid, data_agent_id="producer", fee_bps=0)
+        while (job := scheduler.get(job["job_id"]))["status"] == "running":
+            time.sleep(0.2)
+        scheduler.shutdown()
+        rate = job["cells_per_s"]
+        baseline = baseline or rate
+        print(f"workers {workers:3d}: {job['done']} cells in {job['elapsed_s']:6.2f} s, "
+              f"{rate:7.1f} cells/s ({rate / baseline:4.1f}x)")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compares consumer read latency of the latest producer bar through SQLite
+(PubSubDatabase.get_latest_row, the old injected-function path) and through
+the shared memory ring (BarChannels.read_latest), while a separate producer
+process keeps publishing. The last line adds the lineage recording an
+injected function does around each read (cogs/lineage.py).
+
+Usage (from backend/):
+    python scripts/bench_bar_channel.py --reads 20000 --rows 100000
+
+Runs against a throwaway database in a temporary directory.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from multiprocessing import Event, Process
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.bar_channel import BarChannels, unlink_segments  # noqa: E402
+from cogs.database import PubSubDatabase  # noqa: E402
+from cogs.lineage import LineageRecorder  # noqa: E402
+
+
+def producer(db_path: str, agent_id: str, ready, stop, interval: float):
+    bars = BarChannels(PubSubDatabase(db_path))
+    price = 100.0
+    while not stop.is_set():
+        price += 0.01
+        bars.publish(agent_id, price, price + 1, price - 1, price, 10.0, "BTC")
+        ready.set()
+        time.sleep(interval)
+    bars.close()
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e6  # noqa: E731
+    return f"p50 {pick(0.5):8.2f} us  p99 {pick(0.99):8.2f} us  max {samples[-1] * 1e6:9.2f} us"
+
+
+def measure(read, reads: int) -> list:
+    samples = []
+    for _ in range(reads):
+        started = time.perf_counter()
+        read()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=20_000)
+    parser.add_argument("--rows", type=int, default=100_000, help="history rows preloaded into SQLite")
+    parser.add_argument("--interval", type=float, default=0.001, help="producer publish interval in seconds")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench-bars-"), "pubsub.db")
+    pubsub = PubSubDatabase(db_path)
+    agent_id = str(uuid.uuid4())
+    now = time.time()
+    pubsub.insert_rows([(agent_id, 1.0, 1.0, 1.0, 1.0, 1.0, now - args.rows + i, "BTC") for i in range(args.rows)])
+
+    ready, stop = Event(), Event()
+    process = Process(target=producer, args=(db_path, agent_id, ready, stop, args.interval))
+    process.start()
+    ready.wait(10)
+
+    consumer = BarChannels(pubsub, persist=False)
+    sqlite_samples = measure(lambda: pubsub.get_latest_row(agent_id, arguments="BTC"), args.reads)
+    ring_samples = measure(lambda: consumer.read_latest(agent_id, arguments="BTC"), args.reads)
+    # Long flush interval: only the in-process recording cost is measured
+    lineage = LineageRecorder(pubsub, "consumer", flush_interval=3600)
+
+    def traced_read():
+        started = lineage.clock()
+        lineage.record_read(agent_id, consumer.read_latest(agent_id, arguments="BTC"), started)
+
+    traced_samples = measure(traced_read, args.reads)
+
+    stop.set()
+    process.join()
+    consumer.close()
+    unlink_segments(agent_id)
+
+    print(f"reads: {args.reads}, history rows: {args.rows}")
+    print(f"sqlite get_latest_row: {percentiles(sqlite_samples)}")
+    print(f"shared memory ring:    {percentiles(ring_samples)}")
+    print(f"ring + lineage:        {percentiles(traced_samples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measures wall-clock time to restart a fleet of local agents one by one
+(stop_agent + start_agent per agent, like N serial HTTP calls) versus
+StrategyManager.bulk_restart.
+
+Usage (from backend/):
+    python scripts/bench_bulk_restart.py --agents 200 --parallelism 32
+
+Runs against a throwaway database in a temporary directory.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.database import AgentDatabase  # noqa: E402
+from cogs.strategy_manager import StrategyManager  # noqa: E402
+
+# Installs a SIGTERM handler that takes a moment to exit, like an agent closing its connections
+AGENT_CODE = """
+import signal, sys, time
+def _graceful(signum, frame):
+    time.sleep(0.05)
+    sys.exit(0)
+signal.signal(signal.SIGTERM, _graceful)
+while True:
+    time.sleep(1)
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--parallelism", type=int, default=32)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-bulk-")
+    manager = StrategyManager(db=AgentDatabase(os.path.join(tmp, "agents.db")))
+    ids = [manager.create_agent(AGENT_CODE, name=f"bench-{i}") for i in range(args.agents)]
+    for agent_id in ids:
+        manager.start_agent(agent_id)
+    time.sleep(1.0)
+
+    started = time.perf_counter()
+    for agent_id in ids:
+        manager.stop_agent(agent_id)
+        manager.start_agent(agent_id)
+    serial = time.perf_counter() - started
+    time.sleep(1.0)
+
+    started = time.perf_counter()
+    results = list(manager.bulk_restart(ids, parallelism=args.parallelism))
+    bulk = time.perf_counter() - started
+    failures = [r for r in results if not r["ok"]]
+
+    list(manager.bulk_stop(ids))
+    print(f"agents: {args.agents}")
+    print(f"serial restart: {serial:7.2f} s")
+    print(f"bulk restart:   {bulk:7.2f} s (parallelism {args.parallelism}, {len(failures)} failures)")
+    print(f"speedup: {serial / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
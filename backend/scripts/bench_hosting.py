@@ -0,0 +1,87 @@
+"""
+Compares memory per strategy for one-process-per-agent deployment against
+shared host processes (cogs/agent_host.py).
+
+Usage (from backend/):
+    python scripts/bench_hosting.py --agents 50 --capacity 25 [--code-file agent.py]
+
+Memory is reported as PSS (proportional set size), which splits shared pages
+between the processes that map them, so forked hosts are not over-counted.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.agent_host import AgentHostPool  # noqa: E402
+
+DEFAULT_CODE = """
+import asyncio, json, sqlite3
+from cogs.database import PubSubDatabase
+pubsub = PubSubDatabase()
+state = {"bars": [0.0] * 256}
+"""
+
+
+def pss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def bench_processes(code: str, count: int) -> int:
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # Same shape as deploy_agent: a fresh interpreter per agent that stays alive
+    script = code + "\nimport time\nwhile True: time.sleep(1)\n"
+    procs = [
+        subprocess.Popen([sys.executable, "-c", script], cwd=backend_dir)
+        for _ in range(count)
+    ]
+    try:
+        time.sleep(2.0)
+        return sum(pss_bytes(p.pid) for p in procs)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+
+def bench_hosts(code: str, count: int, capacity: int) -> tuple[int, int]:
+    pool = AgentHostPool(capacity=capacity)
+    try:
+        for i in range(count):
+            pool.place(f"bench-{i}", code)
+        time.sleep(1.0)
+        return sum(pss_bytes(h.pid) for h in pool.hosts.values()), len(pool.hosts)
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--capacity", type=int, default=25)
+    parser.add_argument("--code-file", help="agent source to run (defaults to a small pubsub consumer)")
+    args = parser.parse_args()
+
+    code = open(args.code_file).read() if args.code_file else DEFAULT_CODE
+
+    process_total = bench_processes(code, args.agents)
+    host_total, hosts = bench_hosts(code, args.agents, args.capacity)
+
+    mb = 1024 * 1024
+    print(f"agents: {args.agents}")
+    print(f"process-per-agent: {process_total / mb:8.1f} MB total, {process_total / args.agents / mb:6.2f} MB/agent")
+    print(f"shared hosts ({hosts}): {host_total / mb:8.1f} MB total, {host_total / args.agents / mb:6.2f} MB/agent")
+    if host_total:
+        print(f"reduction: {process_total / host_total:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
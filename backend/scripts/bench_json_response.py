@@ -0,0 +1,134 @@
+"""
+Measures serialization time and bytes on the wire for a large agent list:
+FastAPI's default path (jsonable_encoder + json.dumps) against
+cogs/fast_json.dumps (orjson when installed), then gzip/brotli as applied by
+cogs/compression.py, and finally both response paths end to end through an
+ASGI app.
+
+Usage (from backend/):
+    python scripts/bench_json_response.py --agents 10000 --code-bytes 1500
+
+Install the optional extras (pip install ".[fast]") to include orjson and brotli.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from cogs import compression  # noqa: E402
+from cogs.compression import CompressionMiddleware, compress  # noqa: E402
+from cogs.fast_json import BACKEND, FastJSONResponse, dumps  # noqa: E402
+
+
+def fake_agents(count: int, code_bytes: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    words = ["momentum", "mean", "reversion", "btc", "eth", "breakout", "ema", "rsi", "volume", "hedge"]
+    agents = []
+    for i in range(count):
+        code = "\n".join(
+            f"def step_{j}(ctx):\n    return {rng.random():.6f} * {' + '.join(rng.sample(words, 3))}"
+            for j in range(code_bytes // 60 + 1)
+        )[:code_bytes]
+        agents.append({
+            "agent_id": f"{rng.getrandbits(128):032x}",
+            "code": code,
+            "agentverse_id": None,
+            "risk": rng.choice(["low", "medium", "high"]),
+            "assetClass": rng.choice(["crypto", "forex", "equities"]),
+            "time": rng.choice(["short", "medium", "long"]),
+            "currentStateOfMarket": rng.choice(["bull", "bear", "sideways"]),
+            "interest": " ".join(rng.sample(words, 2)),
+            "perf": round(rng.uniform(-1, 3), 4),
+            "isNew": rng.random() < 0.2,
+            "reputation": round(rng.uniform(0, 5), 2),
+            "name": f"Strategy {i}",
+            "creator": f"0x{rng.getrandbits(160):040x}",
+            "title": f"{rng.choice(words).title()} strategy {i}",
+            "summary": " ".join(rng.choices(words, k=12)),
+            "description": " ".join(rng.choices(words, k=60)),
+            "type": "strategy",
+            "function_agent_mapping": json.dumps({"feed": f"{rng.getrandbits(64):016x}"}),
+            "restart_policy": "never",
+            "max_restarts": 5,
+        })
+    return {"agents": agents}
+
+
+def timed(fn, repeat: int) -> tuple[float, object]:
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def default_render(content) -> bytes:
+    # What FastAPI does for a dict returned from a handler: encode, then JSONResponse.render
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def end_to_end(content: dict, repeat: int):
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/default")
+    def default_route():
+        return content
+
+    @app.get("/fast")
+    def fast_route():
+        return FastJSONResponse(content)
+
+    client = TestClient(app)
+    for path in ("/default", "/fast"):
+        for accept in ("identity", "gzip"):
+            seconds, response = timed(lambda: client.get(path, headers={"Accept-Encoding": accept}), repeat)
+            wire = response.headers.get("content-length")
+            print(f"  GET {path:<9} Accept-Encoding {accept:<9} {seconds * 1e3:8.1f} ms  {int(wire):>11,} bytes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=10_000)
+    parser.add_argument("--code-bytes", type=int, default=1500, help="size of each agent's code field")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    content = fake_agents(args.agents, args.code_bytes, args.seed)
+    print(f"{args.agents} agents, JSON backend: {BACKEND}, brotli: {'yes' if compression.brotli else 'no'}")
+
+    default_s, default_body = timed(lambda: default_render(content), args.repeat)
+    fast_s, fast_body = timed(lambda: dumps(content), args.repeat)
+    if json.loads(default_body) != json.loads(fast_body):
+        sys.exit("fast_json.dumps output differs from the default encoder")
+    print("serialization:")
+    print(f"  jsonable_encoder + json.dumps {default_s * 1e3:8.1f} ms  {len(default_body):>11,} bytes")
+    print(f"  fast_json.dumps ({BACKEND:<6})      {fast_s * 1e3:8.1f} ms  {len(fast_body):>11,} bytes"
+          f"  ({default_s / fast_s:.1f}x)")
+
+    print("compression:")
+    encodings = ["gzip"] + (["br"] if compression.brotli else [])
+    for encoding in encodings:
+        seconds, compressed = timed(lambda: compress(fast_body, encoding), args.repeat)
+        print(f"  {encoding:<4} {seconds * 1e3:8.1f} ms  {len(compressed):>11,} bytes"
+              f"  ({len(fast_body) / len(compressed):.1f}x smaller)")
+
+    print("end to end (TestClient, CompressionMiddleware):")
+    end_to_end(content, max(1, args.repeat // 2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Measures what the instrumentation in cogs/metrics.py costs on the paths it
+covers. A/B timing of whole requests is too noisy to resolve a 1% change,
+so the added cost is measured on no-op targets instead (the timing wrapper
+around an empty method, MetricsMiddleware around an empty ASGI app) and
+reported as a share of the real path it instruments:
+
+  - AgentDatabase.get_agent,
+  - GET /agents/ (cached catalog) and GET /agents/{id} on a StrategyManager,
+    through the ASGI app, driven directly (no HTTP client) so the cost is
+    compared against the smallest possible request time.
+
+Runs against a throwaway database. Each figure is the fastest of several
+rounds: interference from other threads only ever adds time.
+
+Usage (from backend/):
+    python scripts/bench_metrics_overhead.py --agents 200 --requests 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import APIRouter, FastAPI  # noqa: E402
+
+from cogs import metrics  # noqa: E402
+from cogs.database import AgentDatabase  # noqa: E402
+from cogs.metrics import MetricsMiddleware, instrument_methods  # noqa: E402
+from cogs.strategy_manager import StrategyManager  # noqa: E402
+
+
+def build_app(manager: StrategyManager) -> FastAPI:
+    router = APIRouter()
+
+    @router.get("/")
+    def list_agents():
+        return manager.catalog_listing()
+
+    @router.get("/{agent_id}")
+    def get_agent(agent_id: str):
+        return manager.get_agent(agent_id)
+
+    app = FastAPI()
+    app.include_router(router, prefix="/agents")
+    return app
+
+
+def fastest(fn, rounds: int) -> float:
+    return min(fn() for _ in range(rounds))
+
+
+def per_call_ns(fn, count: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter_ns() - started) / count
+
+
+async def drive(app, path: str, count: int) -> float:
+    """Average ns per request, calling the ASGI app directly."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 1), "server": ("testserver", 80), "path_params": {},
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter_ns()
+    for _ in range(count):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter_ns() - started) / count
+
+
+async def empty_app(scope, receive, send):
+    scope["route"] = empty_app
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def report(label: str, path_ns: float, added_ns: float):
+    print(f"  {label:<30} {path_ns / 1e3:9.1f} us  +{added_ns / 1e3:6.2f} us  ({added_ns / path_ns * 100:.2f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=500, help="requests per round")
+    parser.add_argument("--calls", type=int, default=50_000, help="calls per round on no-op targets")
+    parser.add_argument("--rounds", type=int, default=9)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-metrics-")
+    manager = StrategyManager(db=AgentDatabase(os.path.join(tmp, "agents.db")))
+    agent_ids = [manager.create_agent(f"print({i})", name=f"bench-{i}", type="strategy") for i in range(args.agents)]
+    agent_id = agent_ids[0]
+
+    # Added cost of each instrument, on targets that do nothing else
+    class Empty:
+        def query(self):
+            pass
+
+    raw = Empty()
+    timed = instrument_methods("bench")(type("Timed", (Empty,), {"query": Empty.query}))()
+    wrapper_ns = (fastest(lambda: per_call_ns(timed.query, args.calls), args.rounds)
+                  - fastest(lambda: per_call_ns(raw.query, args.calls), args.rounds))
+    loop = asyncio.new_event_loop()
+    middleware_ns = (
+        fastest(lambda: loop.run_until_complete(drive(MetricsMiddleware(empty_app), "/x", args.calls // 10)), args.rounds)
+        - fastest(lambda: loop.run_until_complete(drive(empty_app, "/x", args.calls // 10)), args.rounds)
+    )
+    print(f"added cost: db method wrapper {wrapper_ns:.0f} ns, MetricsMiddleware {middleware_ns:.0f} ns per request")
+
+    print("share of instrumented paths:")
+    get_agent_ns = fastest(lambda: per_call_ns(lambda: manager.db.get_agent(agent_id), args.calls // 50), args.rounds)
+    report("AgentDatabase.get_agent", get_agent_ns, wrapper_ns)
+    app = build_app(manager)
+    for path in ("/agents/", f"/agents/{agent_id}"):
+        request_ns = fastest(lambda: loop.run_until_complete(drive(app, path, args.requests)), args.rounds)
+        report(f"GET {path[:26]}", request_ns, middleware_ns)
+    loop.close()
+
+    series = sum(len(metric._children) for metric in metrics.REGISTRY.metrics.values())
+    started = time.perf_counter()
+    body = metrics.REGISTRY.render()
+    print(f"scrape: {series} series, {len(body):,} bytes rendered in {(time.perf_counter() - started) * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Measures aggregate OHLCV insert throughput with many producer processes
+writing through PubSubDatabase, for each shard count in --shards. Every
+producer commits one small transaction at a time, as BarChannels' persist
+thread does, so with one shard all of them queue on the same SQLite write
+lock. Producer agent ids are picked so each shard gets the same number of
+producers.
+
+Usage (from backend/):
+    python scripts/bench_pubsub_shards.py --producers 16 --shards 1,2,4,8 --seconds 5
+
+Runs against throwaway databases in a temporary directory.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from multiprocessing import Barrier, Process, Queue
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.database import PubSubDatabase, shard_index  # noqa: E402
+
+
+def producer(db_path: str, shards: int, agent_id: str, batch: int, seconds: float, start, results):
+    pubsub = PubSubDatabase(db_path, shards=shards)
+    start.wait()
+    rows = errors = 0
+    price = 100.0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        now = time.time()
+        bars = [(agent_id, price, price + 1, price - 1, price, 10.0, now, "BTC", time.time_ns()) for _ in range(batch)]
+        try:
+            pubsub.insert_rows(bars)
+            rows += batch
+        except sqlite3.OperationalError:
+            # "database is locked" once the default 5 s busy timeout runs out
+            errors += 1
+        price += 0.01
+    results.put((rows, errors))
+
+
+def balanced_ids(producers: int, shards: int) -> list[str]:
+    """`producers` agent ids, spread round-robin over the shards."""
+    ids, n = [], 0
+    while len(ids) < producers:
+        candidate = f"producer-{n}"
+        n += 1
+        if shard_index(candidate, shards) == len(ids) % shards:
+            ids.append(candidate)
+    return ids
+
+
+def run(shards: int, args) -> tuple[float, int]:
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench-shards-"), "pubsub.db")
+    PubSubDatabase(db_path, shards=shards)
+    start = Barrier(args.producers + 1)
+    results = Queue()
+    processes = [
+        Process(target=producer, args=(db_path, shards, agent_id, args.batch, args.seconds, start, results))
+        for agent_id in balanced_ids(args.producers, shards)
+    ]
+    for process in processes:
+        process.start()
+    start.wait()
+    started = time.perf_counter()
+    totals = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    rows = sum(r for r, _ in totals)
+    assert PubSubDatabase(db_path, shards=shards).inserted_row_count() == rows
+    return rows / elapsed, sum(e for _, e in totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--producers", type=int, default=16)
+    parser.add_argument("--shards", default="1,2,4,8", help="comma-separated shard counts to compare")
+    parser.add_argument("--batch", type=int, default=1, help="rows per transaction")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{args.producers} producers, {args.batch} row(s) per transaction, {args.seconds:.0f} s per run")
+    baseline = None
+    for shards in (int(s) for s in args.shards.split(",")):
+        rate, errors = run(shards, args)
+        baseline = baseline or rate
+        print(f"  {shards:>3} shard(s): {rate:10,.0f} rows/s  x{rate / baseline:5.2f}  locked errors {errors}")
+
+
+if __name__ == "__main__":
+    main()
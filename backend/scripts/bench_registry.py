@@ -0,0 +1,85 @@
+"""
+Reports StrategyManager startup time and RSS for a large catalog, compared
+with eagerly loading every agent row (code included) into dicts, which is
+what the manager used to do at startup.
+
+Usage (from backend/):
+    python scripts/bench_registry.py --agents 100000 --code-bytes 2000
+
+Each measurement runs in a fresh interpreter against a throwaway database.
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from cogs.database import AgentDatabase  # noqa: E402
+
+MEASURE = """
+import os, sys, time
+sys.path.insert(0, {backend!r})
+from cogs.resources import read_proc_stats
+from cogs.database import AgentDatabase
+from cogs.strategy_manager import StrategyManager
+db = AgentDatabase({db_path!r})
+before = read_proc_stats(os.getpid())["rss_bytes"]
+started = time.perf_counter()
+if {mode!r} == "eager":
+    agents = {{row["agent_id"]: dict(row, process=None, queue=None, status="stopped") for row in db.list_agents()}}
+else:
+    manager = StrategyManager(db=db)
+    for agent_id in {sample!r}:
+        manager.get_agent(agent_id)
+elapsed = time.perf_counter() - started
+after = read_proc_stats(os.getpid())["rss_bytes"]
+print(elapsed, after - before)
+"""
+
+
+def seed(db_path: str, count: int, code_bytes: int) -> list:
+    AgentDatabase(db_path)
+    code = "# strategy\n" + "x = 1\n" * (code_bytes // 6)
+    ids = [str(uuid.uuid4()) for _ in range(count)]
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO agents (agent_id, code, name, type, risk) VALUES (?, ?, ?, 'strategy', 'Moderate')",
+            ((agent_id, code, f"agent-{i}") for i, agent_id in enumerate(ids)),
+        )
+    return ids
+
+
+def measure(mode: str, db_path: str, sample: list) -> tuple[float, int]:
+    script = MEASURE.format(backend=BACKEND_DIR, db_path=db_path, mode=mode, sample=sample)
+    out = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=BACKEND_DIR)
+    elapsed, rss = out.stdout.strip().splitlines()[-1].split()
+    return float(elapsed), int(rss)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=100_000)
+    parser.add_argument("--code-bytes", type=int, default=2000)
+    parser.add_argument("--touch", type=int, default=100, help="agents fetched through get_agent after startup")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="bench-registry-"), "agents.db")
+    ids = seed(db_path, args.agents, args.code_bytes)
+
+    eager_time, eager_rss = measure("eager", db_path, [])
+    lazy_time, lazy_rss = measure("lazy", db_path, ids[: args.touch])
+
+    mb = 1024 * 1024
+    print(f"agents: {args.agents} ({args.code_bytes} bytes of code each)")
+    print(f"eager load:    {eager_time:7.3f} s, {eager_rss / mb:8.1f} MB RSS")
+    print(f"lazy registry: {lazy_time:7.3f} s, {lazy_rss / mb:8.1f} MB RSS (incl. manager init + {args.touch} get_agent calls)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Reports API cold start: the slowest imports from `python -X importtime -c
+"import main"`, then, in a fresh interpreter, how long importing main takes,
+how soon the first request is answered, and how long until /ready reports
+every required subsystem warm (see cogs/subsystems.py).
+
+Each measurement runs in its own interpreter against a throwaway
+AGENT_DATA_DIR, optionally seeded with agents.
+
+Usage (from backend/):
+    python scripts/bench_startup.py --top 15 --agents 2000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    client.get("/")
+    first_response = time.perf_counter()
+    while client.get("/ready").status_code != 200:
+        time.sleep(0.005)
+    ready = time.perf_counter()
+    report = client.get("/ready").json()
+print(json.dumps({
+    "import_s": imported - started,
+    "first_response_s": first_response - started,
+    "ready_s": ready - started,
+    "subsystems": report["subsystems"],
+}))
+"""
+
+
+def parse_importtime(stderr: str) -> list[tuple[int, int, int, str]]:
+    """(self_us, cumulative_us, depth, module) per 'import time:' line."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def seed(data_dir: str, agents: int):
+    env = dict(os.environ, AGENT_DATA_DIR=data_dir)
+    code = (
+        "from cogs.database import AgentDatabase\n"
+        "db = AgentDatabase()\n"
+        f"for i in range({agents}):\n"
+        "    db.add_agent(f'seed-{i}', 'print(1)\\n' * 50, name=f'seed {i}', type='strategy')\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    parser.add_argument("--agents", type=int, default=0, help="agents to seed before starting")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="bench-startup-")
+    if args.agents:
+        seed(data_dir, args.agents)
+    env = dict(os.environ, AGENT_DATA_DIR=data_dir)
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        sys.exit(result.stderr[-2000:])
+    rows = parse_importtime(result.stderr)
+    total = next(cumulative for _, cumulative, _, name in rows if name == "main")
+    print(f"import main: {total / 1e3:.1f} ms cumulative over {len(rows)} modules")
+    print("slowest top-level imports (cumulative):")
+    top_level = sorted((r for r in rows if r[2] <= 1 and r[3] != "main"), key=lambda r: -r[1])
+    for self_us, cumulative_us, _, name in top_level[:args.top]:
+        print(f"  {cumulative_us / 1e3:8.1f} ms  {name}")
+    print("slowest modules by own time:")
+    for self_us, _, _, name in sorted(rows, key=lambda r: -r[0])[:args.top]:
+        print(f"  {self_us / 1e3:8.1f} ms  {name}")
+
+    runs = []
+    for _ in range(args.repeat):
+        child = subprocess.run([sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        if child.returncode != 0:
+            sys.exit(child.stderr[-2000:])
+        runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run["ready_s"])
+    print(f"startup ({args.agents} agents, best of {args.repeat}):")
+    for key in ("import_s", "first_response_s", "ready_s"):
+        print(f"  {key.removesuffix('_s'):<15} {best[key] * 1e3:8.1f} ms")
+    for name, subsystem in best["subsystems"].items():
+        seconds = f"{subsystem['seconds'] * 1e3:.1f} ms" if subsystem["seconds"] is not None else subsystem["error"]
+        print(f"  {name:<15} {subsystem['state']:<8} {seconds}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Runs one catch-up pass of the RatingSubmitted indexer (cogs/rating_indexer.py)
+against a JSON-RPC node and prints what it applied.
+
+Usage (from backend/), against a local hardhat node:
+    cd ../contracts && npx hardhat node
+    npx hardhat ignition deploy ignition/modules/RatingSystem.ts --network localhost
+    python scripts/index_ratings.py --rpc-url http://127.0.0.1:8545 --contract <RatingSystem address>
+
+The checkpoint lives in the agents database, so running it again only
+indexes blocks mined since the previous run.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cogs.database import AgentDatabase  # noqa: E402
+from cogs.rating_indexer import BATCH_BLOCKS, DEFAULT_CONTRACT, RatingIndexer  # noqa: E402
+from cogs.write_behind import ReputationBuffer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rpc-url", default="http://127.0.0.1:8545")
+    parser.add_argument("--contract", default=DEFAULT_CONTRACT)
+    parser.add_argument("--start-block", type=int, default=0, help="first block when there is no checkpoint yet")
+    parser.add_argument("--batch-blocks", type=int, default=BATCH_BLOCKS)
+    parser.add_argument("--confirmations", type=int, default=0)
+    parser.add_argument("--db", default=None, help="agents database (default: _data/agents.db)")
+    args = parser.parse_args()
+
+    db = AgentDatabase(args.db) if args.db else AgentDatabase()
+    updated = {}
+    reputations = ReputationBuffer(db, on_flush=updated.update)
+
+    def add_ratings(deltas: dict):
+        for agent_id, (total, count) in deltas.items():
+            reputations.add_rating(agent_id, total, count)
+
+    indexer = RatingIndexer(
+        db, args.rpc_url, contract=args.contract, start_block=args.start_block,
+        batch_blocks=args.batch_blocks, confirmations=args.confirmations, on_update=add_ratings,
+    )
+    started = time.perf_counter()
+    applied = indexer.run_once()
+    reputations.flush()
+    elapsed = time.perf_counter() - started
+
+    print(f"logs: {applied} in {indexer.stats['batches']} batches, {elapsed:.2f}s, "
+          f"checkpoint at block {indexer.stats['last_block']}")
+    for agent_id, fields in sorted(updated.items()):
+        print(f"  {agent_id}: reputation {fields['reputation']:.3f} over {fields['rating_count']} ratings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Module-level paths in cogs.database read this at import time; keep tests off _data/
+os.environ.setdefault("AGENT_DATA_DIR", tempfile.mkdtemp(prefix="agent-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient for the API without its lifespan: the manager is built by the first request."""
+    import main
+    from cogs.subsystems import SUBSYSTEMS
+
+    yield TestClient(main.app)
+    if SUBSYSTEMS["manager"].state == "ready":
+        SUBSYSTEMS["manager"].get().shutdown()
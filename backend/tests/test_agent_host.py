@@ -0,0 +1,111 @@
+import pytest
+
+from cogs import agent_host
+from cogs.agent_host import AgentHostPool, is_host_compatible
+
+
+class FakeHost:
+    """In-process stand-in for AgentHost that fails loudly if one agent is hosted twice."""
+
+    live: dict = {}
+
+    def __init__(self, host_id: str, capacity: int):
+        self.host_id = host_id
+        self.capacity = capacity
+        self.agents = {}
+        self.stopped = False
+        self.fail_add = False
+        FakeHost.live[host_id] = self
+
+    @property
+    def free_slots(self) -> int:
+        return self.capacity - len(self.agents)
+
+    def add(self, agent_id: str, spec: dict):
+        if self.fail_add:
+            raise RuntimeError("add failed")
+        holders = [h.host_id for h in FakeHost.live.values() if agent_id in h.agents]
+        # Two copies would bind the same port and agent address
+        assert not holders, f"{agent_id} is still running on {holders}"
+        self.agents[agent_id] = spec
+
+    def remove(self, agent_id: str) -> bool:
+        return self.agents.pop(agent_id, None) is not None
+
+    def stop(self):
+        self.stopped = True
+        FakeHost.live.pop(self.host_id, None)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    FakeHost.live = {}
+    monkeypatch.setattr(agent_host, "AgentHost", FakeHost)
+    return AgentHostPool(capacity=2)
+
+
+def test_migrate_moves_agent_and_retires_empty_source(pool):
+    source_id = pool.place("a", code="pass", port=9001)
+    target_id = pool.migrate("a")
+    assert target_id != source_id
+    assert pool.host_of("a") == target_id
+    assert pool.hosts[target_id].agents["a"] == {"code": "pass", "artifact": None, "port": 9001}
+    assert source_id not in pool.hosts
+
+
+def test_migrate_to_a_named_host_keeps_a_busy_source(pool):
+    source_id = pool.place("a", code="pass")
+    pool.place("b", code="pass", host_id=source_id)
+    target_id = pool.place("c", code="pass")
+    assert pool.migrate("a", target_id) == target_id
+    assert sorted(pool.hosts[source_id].agents) == ["b"]
+    assert sorted(pool.hosts[target_id].agents) == ["a", "c"]
+
+
+def test_failed_migration_restores_the_agent_on_its_source(pool, monkeypatch):
+    source_id = pool.place("a", code="pass")
+    created = []
+    new_host = pool._new_host
+
+    def failing_host():
+        host = new_host()
+        host.fail_add = True
+        created.append(host)
+        return host
+
+    monkeypatch.setattr(pool, "_new_host", failing_host)
+    with pytest.raises(RuntimeError):
+        pool.migrate("a")
+    assert pool.host_of("a") == source_id
+    assert "a" in pool.hosts[source_id].agents
+    assert created[0].stopped and created[0].host_id not in pool.hosts
+
+
+def test_migrate_rejects_unknown_agent_and_target(pool):
+    source_id = pool.place("a", code="pass")
+    with pytest.raises(KeyError):
+        pool.migrate("missing")
+    with pytest.raises(KeyError):
+        pool.migrate("a", "no-such-host")
+    with pytest.raises(KeyError):
+        pool.migrate("a", source_id)
+
+
+def test_host_compatibility_rejects_run_at_import():
+    guarded = 'agent = make()\nif __name__ == "__main__":\n    agent.run()\n'
+    assert is_host_compatible(guarded) == (True, None)
+    ok, reason = is_host_compatible("agent = make()\nagent.run()\n")
+    assert not ok and "line 2" in reason
+
+
+def test_agents_fill_the_fullest_host_and_empty_hosts_retire(pool):
+    first = pool.place("a", code="pass")
+    assert pool.place("b", code="pass") == first
+    second = pool.place("c", code="pass")
+    assert second != first
+    pool.remove("c")
+    assert second not in pool.hosts and pool.host_of("c") is None
+    # A free slot on the remaining host is used before a new host is started
+    pool.remove("b")
+    assert pool.place("d", code="pass") == first
+    assert list(pool.hosts) == [first]
@@ -0,0 +1,41 @@
+import time
+
+from cogs.agent_registry import AgentRegistry
+from cogs.database import AgentDatabase
+
+
+def make_registry(tmp_path, max_age: float):
+    db = AgentDatabase(str(tmp_path / "agents.db"))
+    db.add_agent("a", "print('v1')", title="first")
+    return db, AgentRegistry(db, max_age=max_age)
+
+
+def test_records_are_served_from_cache(tmp_path):
+    db, registry = make_registry(tmp_path, max_age=60)
+    assert registry.record("a")["code"] == "print('v1')"
+    db.update_agent("a", code="print('v2')")
+    assert registry.record("a")["code"] == "print('v1')"
+    assert (registry.hits, registry.misses) == (1, 1)
+
+
+def test_other_workers_writes_show_up_after_max_age(tmp_path):
+    db, registry = make_registry(tmp_path, max_age=0.05)
+    registry.record("a")
+    # Written by another API worker sharing the database
+    db.update_agent("a", code="print('v2')", title="second")
+    time.sleep(0.1)
+    record = registry.record("a")
+    assert (record["code"], record["title"]) == ("print('v2')", "second")
+    db.delete_agent("a")
+    time.sleep(0.1)
+    assert registry.record("a") is None
+    assert not registry.exists("a")
+
+
+def test_local_update_keeps_the_cached_copy_current(tmp_path):
+    db, registry = make_registry(tmp_path, max_age=60)
+    registry.record("a")
+    db.update_agent("a", title="renamed")
+    registry.update("a", title="renamed")
+    assert registry.record("a")["title"] == "renamed"
+    assert registry.misses == 1
@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.mark.parametrize("route", ["/agents/bulk/start", "/agents/graph/start"])
+@pytest.mark.parametrize("parallelism", [0, -1, 100000])
+def test_parallelism_out_of_bounds_is_rejected(client, route, parallelism):
+    response = client.post(route, json={"agent_ids": [], "parallelism": parallelism})
+    assert response.status_code == 422
+
+
+def test_bulk_run_with_bounded_parallelism(client):
+    response = client.post("/agents/bulk/start", json={"agent_ids": ["missing"], "parallelism": 64})
+    assert response.status_code == 200
+    assert response.text == ""
+
+
+@pytest.mark.parametrize("route", ["/agents/catalog/stats", "/agents/supervisor", "/agents/hosts",
+                                   "/agents/spawns", "/agents/stats"])
+def test_stats_routes(client, route):
+    assert client.get(route).status_code == 200
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from cogs.artifacts import ArtifactStore, load_artifact
+from cogs.code_compiler import AgentCompiler
+
+
+def test_artifact_is_built_once_and_loads_without_the_source(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    compiled = AgentCompiler().compile_plain("RESULT = 6 * 7\n")
+    builds = []
+
+    def build():
+        builds.append(compiled.key)
+        return compiled
+
+    pyc_path = store.get_or_build(compiled.key, build)
+    assert store.get_or_build(compiled.key, build) == pyc_path
+    assert (len(builds), store.hits, store.misses) == (1, 1, 1)
+
+    source_path, _ = store.paths(compiled.key)
+    os.unlink(source_path)
+    namespace = {}
+    exec(load_artifact(pyc_path), namespace)
+    assert namespace["RESULT"] == 42
+
+
+def test_artifact_from_another_python_is_refused(tmp_path):
+    pyc_path = tmp_path / "stale.pyc"
+    pyc_path.write_bytes(b"\0" * 32)
+    with pytest.raises(ValueError, match="different Python version"):
+        load_artifact(str(pyc_path))
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from cogs.backtest import BacktestError, compute_metrics, load_strategy, run_backtest
+
+VECTORIZED = '''
+from uagents import Agent
+agent = Agent(name="x")
+THRESHOLD = 0
+
+def signals(bars, lookback=1):
+    change = np.diff(bars["close"], prepend=bars["close"][0])
+    return np.where(change > THRESHOLD, 1.0, 0.0)
+
+@agent.on_interval(period=1.0)
+async def tick(ctx):
+    agent.run()
+'''
+
+EVENT = '''
+previous = {}
+
+def on_bar(bar, lookback=1):
+    change = bar["close"] - previous.get("close", bar["close"])
+    previous["close"] = bar["close"]
+    return 1.0 if change > 0 else 0.0
+'''
+
+
+def make_bars(close) -> dict:
+    close = np.asarray(close, dtype=float)
+    return {
+        "open": close, "high": close, "low": close, "close": close, "volume": np.ones(len(close)),
+        "timestamp": np.arange(len(close), dtype=float) * 86400,
+    }
+
+
+def test_metrics_on_a_hand_checked_series():
+    close = np.array([100.0, 110.0, 99.0, 99.0])
+    metrics = compute_metrics(close, np.array([1.0, 1.0, 0.0, 0.0]), fee_bps=0.0)
+    assert metrics["total_return"] == pytest.approx(1.1 * 0.9 - 1.0)
+    assert metrics["max_drawdown"] == pytest.approx(-0.1)
+    assert (metrics["trades"], metrics["exposure"]) == (2, 0.5)
+
+
+def test_vectorized_and_event_strategies_agree():
+    bars = make_bars(100 + np.cumsum(np.random.default_rng(3).normal(0, 1, 200)))
+    vectorized = run_backtest(VECTORIZED, bars, fee_bps=5)
+    event = run_backtest(EVENT, bars, fee_bps=5)
+    assert (vectorized["mode"], event["mode"]) == ("vectorized", "event")
+    for key in ("total_return", "sharpe", "max_drawdown", "trades"):
+        assert vectorized[key] == pytest.approx(event[key])
+
+
+def test_agent_runtime_code_is_not_run():
+    strategy = load_strategy(VECTORIZED)
+    assert "tick" not in strategy and "agent" not in strategy
+    assert strategy["THRESHOLD"] == 0
+
+
+def test_code_without_a_signal_function_is_rejected():
+    with pytest.raises(BacktestError, match="neither signals"):
+        load_strategy("x = 1\n")
+    with pytest.raises(BacktestError, match="shape"):
+        run_backtest("def signals(bars):\n    return [1.0]\n", make_bars([1.0, 2.0, 3.0]))
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+import pytest
+
+from cogs.backtest_scheduler import BacktestScheduler
+from cogs.database import PubSubDatabase
+
+STRATEGY = """
+def signals(bars, fast=10, hang=False):
+    while hang:
+        pass
+    return np.where(bars["close"] > bars["close"].mean(), 1.0, 0.0)
+"""
+
+# Catches everything, including the worker's alarm, so only the scheduler's watchdog can stop it
+STUBBORN = """
+def signals(bars, fast=10):
+    while True:
+        try:
+            while True:
+                pass
+        except BaseException:
+            pass
+"""
+
+
+@pytest.fixture
+def pubsub(tmp_path):
+    pubsub = PubSubDatabase(str(tmp_path / "pubsub.db"))
+    close = 100 + np.cumsum(np.random.default_rng(1).normal(0, 1, 500))
+    pubsub.insert_rows([("producer", c, c, c, c, 1.0, 60.0 * i, "") for i, c in enumerate(close)])
+    return pubsub
+
+
+def run_sweep(tmp_path, pubsub, code: str, grid: dict, timeout: float) -> dict:
+    record = {"agent_id": "strategy", "code": code, "function_agent_mapping": None}
+    scheduler = BacktestScheduler(lambda _: record, pubsub, root=str(tmp_path / "jobs"), workers=1, timeout=timeout)
+    try:
+        job = scheduler.submit(["strategy"], grid, data_agent_id="producer", fee_bps=0)
+        deadline = time.monotonic() + 60
+        while (job := scheduler.get(job["job_id"], limit=100))["status"] == "running":
+            assert time.monotonic() < deadline, "sweep never finished"
+            time.sleep(0.1)
+        return job
+    finally:
+        scheduler.shutdown()
+
+
+def test_hanging_cell_times_out_and_the_rest_complete(tmp_path, pubsub):
+    job = run_sweep(tmp_path, pubsub, STRATEGY, {"fast": [1, 2], "hang": [False, True]}, timeout=1.0)
+    assert job["status"] == "completed"
+    assert job["done"] == 4
+    errors = job["errors"]
+    assert sorted(e["params"]["fast"] for e in errors) == [1, 2]
+    assert all(e["params"]["hang"] and "timed out" in e["error"] for e in errors)
+
+
+def test_worker_ignoring_the_alarm_is_recycled(tmp_path, pubsub):
+    job = run_sweep(tmp_path, pubsub, STUBBORN, {"fast": [1]}, timeout=0.5)
+    assert job["status"] == "completed"
+    assert len(job["errors"]) == 1 and "timed out" in job["errors"][0]["error"]
@@ -0,0 +1,81 @@
+import atexit
+import uuid
+
+import pytest
+
+from cogs.bar_channel import BarChannels, unlink_segments
+from cogs.database import PubSubDatabase
+from cogs.indicators import EMA, IndicatorEngine
+
+
+@pytest.fixture
+def channel(tmp_path):
+    producer = f"producer-{uuid.uuid4().hex[:8]}"
+    bars = BarChannels(PubSubDatabase(str(tmp_path / "pubsub.db")), capacity=8, persist=False)
+    yield producer, bars
+    bars.close()
+    unlink_segments(producer)
+
+
+def publish(bars, producer, count: int, first_close: float = 100.0):
+    for i in range(count):
+        close = first_close + i
+        bars.publish(producer, close, close, close, close, 1.0, "BTC")
+
+
+def test_first_read_is_a_warm_up(channel):
+    producer, bars = channel
+    publish(bars, producer, 3)
+    source, new_bars, reset = bars.bars_since(producer, "BTC")
+    assert (source, reset) == ("ring", True)
+    assert [bar[0] for bar in new_bars] == [1, 2, 3]
+
+
+def test_incremental_reads_continue_after_the_last_id(channel):
+    producer, bars = channel
+    publish(bars, producer, 3)
+    publish(bars, producer, 2, first_close=103.0)
+    source, new_bars, reset = bars.bars_since(producer, "BTC", after_id=3, source="ring")
+    assert (source, reset) == ("ring", False)
+    assert new_bars == [(4, 103.0, 103.0, 103.0, 103.0, 1.0), (5, 104.0, 104.0, 104.0, 104.0, 1.0)]
+
+
+def test_falling_more_than_a_ring_behind_is_reported(channel):
+    producer, bars = channel
+    publish(bars, producer, 20)
+    source, new_bars, reset = bars.bars_since(producer, "BTC", after_id=3, source="ring")
+    assert (source, reset) == ("ring", True)
+    # The window that is still in the ring, for re-warming
+    assert [bar[0] for bar in new_bars] == list(range(13, 21))
+
+
+def test_indicator_engine_rewarms_after_a_gap(channel):
+    producer, bars = channel
+    engine = IndicatorEngine(bars, factories={"ema": lambda: EMA(4)})
+    publish(bars, producer, 4)
+    engine.latest(producer, "BTC")
+    publish(bars, producer, 20, first_close=200.0)
+    # Only closes 212..219 survive in the ring; the EMA must be rebuilt from them alone
+    expected = EMA(4)
+    for close in range(212, 220):
+        expected.update(float(close))
+    assert engine.latest(producer, "BTC")["ema"] == pytest.approx(expected.value)
+    assert engine._states[(producer, "BTC")].last_id == 24
+
+
+def test_exit_flush_is_registered_once(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, "register", registered.append)
+    producer = f"producer-{uuid.uuid4().hex[:8]}"
+    pubsub = PubSubDatabase(str(tmp_path / "pubsub.db"))
+    bars = BarChannels(pubsub, capacity=8)
+    try:
+        for _ in range(3):
+            publish(bars, producer, 2)
+            # Stops the persister; the next publish starts a new one
+            bars.flush()
+        assert len(registered) == 1
+        assert pubsub.inserted_row_count() == 6
+    finally:
+        bars.close()
+        unlink_segments(producer)
@@ -0,0 +1,35 @@
+import importlib.util
+import os
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "bench_api_load.py")
+spec = importlib.util.spec_from_file_location("bench_api_load", SCRIPT)
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+
+
+def result(slowest_ms: float, errors: int = 0, count: int = 100, measured_s: float = 10.0) -> dict:
+    """Latencies spread evenly up to slowest_ms; the first `errors` requests fail."""
+    samples = [("get", slowest_ms * (i + 1) / count / 1000, 500 if i < errors else 200) for i in range(count)]
+    return bench.summarize(samples, measured_s)
+
+
+def test_summary_uses_nearest_rank_percentiles():
+    summary = bench.summarize([("get", s / 1000, 200) for s in range(1, 101)] + [("list", 0.5, None)], 10.0)
+    get = summary["ops"]["get"]
+    assert (get["p50_ms"], get["p95_ms"], get["p99_ms"]) == (50.0, 95.0, 99.0)
+    assert summary["ops"]["list"]["error_rate"] == 1.0
+    assert summary["overall"]["throughput_rps"] == 10.1
+
+
+def test_compare_flags_only_regressions_beyond_tolerance():
+    baseline = result(slowest_ms=10.0)
+    assert bench.compare(result(slowest_ms=11.0), baseline, tolerance=0.25, min_delta_ms=0.5) == []
+    assert bench.compare(result(slowest_ms=20.0), baseline, tolerance=0.25, min_delta_ms=0.5) == [
+        "get p50_ms: 5.00 -> 10.00", "get p95_ms: 9.50 -> 19.00", "get p99_ms: 9.90 -> 19.80",
+    ]
+    # Small absolute changes on fast operations are noise, not regressions
+    assert bench.compare(result(slowest_ms=20.0), baseline, tolerance=0.25, min_delta_ms=50) == []
+    assert bench.compare(result(slowest_ms=10.0, errors=5), baseline, 0.25, 0.5) == ["get error rate: 0.0% -> 5.0%"]
+    assert bench.compare(result(slowest_ms=10.0, measured_s=20.0), baseline, 0.25, 0.5) == [
+        "throughput: 10.0 -> 5.0 req/s",
+    ]
@@ -0,0 +1,78 @@
+from cogs.catalog_cache import CatalogCache, etag_matches
+
+
+def create_agent(client, title: str) -> str:
+    response = client.post("/agents/", json={"code": "print('hello')", "title": title, "description": "x" * 200})
+    assert response.status_code == 201, response.text
+    return response.json()["agent_id"]
+
+
+def test_unchanged_catalog_answers_304(client):
+    first = client.get("/agents/", headers={"Accept-Encoding": "identity"})
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    again = client.get("/agents/", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+
+
+def test_catalog_write_changes_the_etag(client):
+    etag = client.get("/agents/").headers["etag"]
+    create_agent(client, "etag-change")
+    after = client.get("/agents/", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["etag"].removeprefix("W/") != etag.removeprefix("W/")
+
+
+def test_compressed_catalog_has_weak_etag_that_revalidates(client):
+    for i in range(10):
+        create_agent(client, f"bulk-{i}")
+    raw = client.get("/agents/", headers={"Accept-Encoding": "gzip"})
+    assert raw.status_code == 200
+    assert raw.headers["content-encoding"] == "gzip"
+    assert raw.headers["etag"].startswith("W/")
+    assert "Accept-Encoding" in raw.headers["vary"]
+    plain = client.get("/agents/", headers={"Accept-Encoding": "identity"})
+    assert raw.json() == plain.json()
+    assert raw.headers["etag"] == "W/" + plain.headers["etag"]
+    assert client.get("/agents/", headers={"If-None-Match": raw.headers["etag"]}).status_code == 304
+
+
+def test_agent_details_revalidate(client):
+    agent_id = create_agent(client, "details")
+    first = client.get(f"/agents/{agent_id}", headers={"Accept-Encoding": "identity"})
+    assert first.status_code == 200
+    again = client.get(f"/agents/{agent_id}", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert client.get("/agents/missing-agent", headers={"If-None-Match": "*"}).status_code == 404
+
+
+def test_cache_serves_one_version_until_invalidated():
+    cache = CatalogCache(max_age=60)
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"agents": len(builds)}
+
+    first = cache.get(("agents",), build)
+    assert cache.get(("agents",), build) is first
+    cache.invalidate()
+    assert cache.get(("agents",), build).body != first.body
+    assert len(builds) == 2
+
+
+def test_result_built_across_a_write_is_not_kept():
+    cache = CatalogCache(max_age=60)
+    # A write lands while the listing is being built
+    stale = cache.get(("agents",), lambda: cache.invalidate() or {"agents": "old"})
+    fresh = cache.get(("agents",), lambda: {"agents": "new"})
+    assert (stale.body, fresh.body) == (b'{"agents":"old"}', b'{"agents":"new"}')
+
+
+def test_if_none_match_accepts_lists_weak_tags_and_star():
+    assert etag_matches('"a", W/"b"', '"b"')
+    assert etag_matches("*", '"c"')
+    assert not etag_matches('"a"', '"b"')
+    assert not etag_matches(None, '"b"')
@@ -0,0 +1,78 @@
+import ast
+
+import pytest
+
+from cogs.code_compiler import (
+    AgentCompiler, CodeCompileError, _check_mappings, find_inject_sites, load_mappings, parse_agent_code,
+)
+
+AGENT = '''
+@agent.on_interval(period=5.0)
+@inject_selected("price", "volume")
+async def tick(ctx, price, volume):
+    ctx.logger.info(price())
+'''
+
+
+def check(code: str, agent_mapping: dict = None, args_mapping: dict = None) -> list[str]:
+    tree = ast.parse(code)
+    names, _ = find_inject_sites(tree)
+    return [e["message"] for e in _check_mappings(names, tree, agent_mapping or {}, args_mapping or {})]
+
+
+def test_valid_mappings_pass():
+    assert check(AGENT, {"price": "producer-1", "volume": None}, {"price": "symbol"}) == []
+
+
+def test_mapping_without_inject_site():
+    assert check(AGENT, {"spread": "producer-1"}) == ["mapping for 'spread' but no inject_selected site requests it"]
+
+
+def test_args_mapping_without_inject_site():
+    assert check(AGENT, args_mapping={"spread": "symbol"}) == [
+        "mapping for 'spread' but no inject_selected site requests it"
+    ]
+
+
+def test_producer_must_be_a_string():
+    assert check(AGENT, {"price": 42}) == ["agent mapping for 'price' must be an agent id string"]
+
+
+def test_argument_name_must_be_an_identifier():
+    assert check(AGENT, args_mapping={"price": "not valid"}) == ["argument name for 'price' must be an identifier"]
+
+
+def test_injected_name_defined_in_agent_code():
+    code = AGENT + "\ndef price():\n    return 1\n"
+    assert check(code) == ["'price' is injected but also defined in the agent code"]
+
+
+def test_errors_are_deduplicated_and_sorted():
+    messages = check(AGENT, {"spread": 1}, {"spread": "x y"})
+    assert messages == sorted(messages)
+    assert messages.count("mapping for 'spread' but no inject_selected site requests it") == 1
+
+
+def test_parse_agent_code_raises_with_every_error():
+    with pytest.raises(CodeCompileError) as excinfo:
+        parse_agent_code(AGENT, {"spread": "producer-1", "price": 42})
+    assert len(excinfo.value.errors) == 2
+
+
+def test_load_mappings_splits_agent_and_args():
+    raw = '{"price": {"agent_id": "p1", "args": "symbol"}, "volume": "p2"}'
+    assert load_mappings(raw) == ({"price": "p1", "volume": "p2"}, {"price": "symbol"})
+
+
+def test_compiled_agent_keeps_user_line_numbers_and_is_cached():
+    compiler = AgentCompiler()
+    compiled = compiler.compile(AGENT, {"price": "producer-1"}, {}, 9000, "ticker", "agent-1")
+    assert compiled.injected == ("price", "volume")
+    assert compiled.source.endswith(AGENT)
+    lines = compiled.source.splitlines()
+    assert any(line.startswith("def price(") for line in lines)
+    # Tracebacks point at the emitted source, not at the prelude
+    tick = next(c for c in compiled.code.co_consts if getattr(c, "co_name", None) == "tick")
+    assert lines[tick.co_firstlineno - 1] == "@agent.on_interval(period=5.0)"
+    assert compiler.compile(AGENT, {"price": "producer-1"}, {}, 9000, "ticker", "agent-1") is compiled
+    assert compiler.compile(AGENT, {"price": "producer-2"}, {}, 9000, "ticker", "agent-1") is not compiled
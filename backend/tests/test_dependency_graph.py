@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from cogs.dependency_graph import DependencyCycleError, DependencyGraph
+
+
+def mapping(*producers) -> str:
+    return json.dumps({f"f{i}": producer for i, producer in enumerate(producers)})
+
+
+def test_levels_put_producers_before_consumers():
+    graph = DependencyGraph({
+        "feed": None,
+        "signal": mapping("feed"),
+        "trader": mapping("signal", "feed"),
+        "other": mapping("missing-agent"),
+    })
+    assert graph.levels(["trader", "signal", "feed", "other"]) == [["feed", "other"], ["signal"], ["trader"]]
+    assert graph.upstream(["trader"]) == {"trader", "signal", "feed"}
+    assert graph.downstream(["signal"]) == {"signal", "trader"}
+
+
+def test_cycles_are_reported_with_their_path():
+    graph = DependencyGraph({"a": mapping("c"), "b": mapping("a"), "c": mapping("b"), "d": mapping("a")})
+    assert graph.find_cycle() == ["a", "b", "c", "a"]
+    with pytest.raises(DependencyCycleError) as e:
+        graph.levels(["a", "b", "c", "d"])
+    assert e.value.cycle == ["a", "b", "c", "a"]
+    assert graph.to_dict()["levels"] is None
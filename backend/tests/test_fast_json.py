@@ -0,0 +1,53 @@
+import json
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+
+from cogs.compression import CompressionMiddleware, choose_encoding, merge_vary
+from cogs.fast_json import dumps
+
+
+def test_dumps_matches_json_and_writes_non_finite_floats_as_null():
+    content = {"name": "ünïcode", "values": [1, 2.5, None], "nested": {"ok": True}}
+    assert json.loads(dumps(content)) == content
+    assert dumps({"a": float("nan"), "b": [float("inf"), 1.0]}) == b'{"a":null,"b":[null,1.0]}'
+    assert json.loads(dumps({"array": np.arange(3), "tags": ("x",)})) == {"array": [0, 1, 2], "tags": ["x"]}
+
+
+def test_encoding_follows_accept_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding(None) is None
+
+
+def test_vary_keeps_existing_tokens():
+    assert merge_vary([b"Origin"], b"Accept-Encoding") == b"Origin, Accept-Encoding"
+    assert merge_vary([b"accept-encoding"], b"Accept-Encoding") == b"accept-encoding"
+    assert merge_vary([b"*"], b"Accept-Encoding") == b"*"
+
+
+def test_middleware_compresses_large_bodies_only():
+    app = FastAPI()
+    big = b'{"agents":"' + b"x" * 4000 + b'"}'
+
+    @app.get("/big")
+    def big_body():
+        return Response(big, media_type="application/json", headers={"ETag": '"abc"', "Vary": "Origin"})
+
+    @app.get("/small")
+    def small_body():
+        return Response(b"{}", media_type="application/json")
+
+    app.add_middleware(CompressionMiddleware)
+    client = TestClient(app)
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == 'W/"abc"'
+    assert response.headers["vary"] == "Origin, Accept-Encoding"
+    assert int(response.headers["content-length"]) < len(big)
+    assert response.content == big
+
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
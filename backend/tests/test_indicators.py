@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from cogs import indicators as ind
+
+
+@pytest.fixture(scope="module")
+def bars():
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 1, 300))
+    # A flat stretch hits the zero-range and zero-loss branches
+    close[100:130] = close[100]
+    spread = np.abs(rng.normal(0, 0.5, 300))
+    return close + spread, close - spread, close, rng.uniform(1, 100, 300)
+
+
+def run(indicator, values):
+    return np.array([np.nan if v is None else v for v in map(indicator.update, *values)], dtype=float)
+
+
+def test_ema_is_seeded_with_the_simple_average():
+    ema = ind.EMA(3)
+    assert [ema.update(x) for x in (1.0, 2.0, 3.0, 7.0)] == [None, None, 2.0, 4.5]
+
+
+def test_incremental_indicators_match_batch(bars):
+    high, low, close, volume = bars
+    assert np.allclose(run(ind.EMA(20), [close]), ind.ema(close, 20), equal_nan=True)
+    assert np.allclose(run(ind.RSI(14), [close]), ind.rsi(close, 14), equal_nan=True)
+    assert np.allclose(run(ind.VWAP(30), [high, low, close, volume]), ind.vwap(high, low, close, volume, 30))
+
+    stochastic = ind.Stochastic(14, 3)
+    rows = [stochastic.update(h, l, c) for h, l, c in zip(high, low, close)]
+    percent_k, percent_d = ind.stochastic(high, low, close, 14, 3)
+    assert np.allclose([np.nan if r is None else r["k"] for r in rows], percent_k, equal_nan=True)
+    assert np.allclose([np.nan if r is None or r["d"] is None else r["d"] for r in rows], percent_d, equal_nan=True)
+
+
+def test_rsi_of_a_flat_series_is_100():
+    rsi = ind.RSI(3)
+    assert [rsi.update(x) for x in (5.0, 5.0, 5.0, 5.0)][-1] == 100.0
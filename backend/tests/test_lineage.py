@@ -0,0 +1,28 @@
+import time
+
+from cogs.database import PubSubDatabase
+from cogs.lineage import LineageRecorder, summarize
+
+
+def test_reads_are_summarized_per_edge(tmp_path):
+    pubsub = PubSubDatabase(str(tmp_path / "pubsub.db"))
+    recorder = LineageRecorder(pubsub, "consumer", flush_interval=3600)
+    now = time.time_ns()
+    for _ in range(10):
+        # Each bar was produced 0.3 s before it is read
+        recorder.record_read("producer", {"produced_ns": now - 300_000_000}, started_ns=time.time_ns())
+    recorder.record_read("producer", None, started_ns=time.time_ns())
+    recorder.observe("", "producer", "persist_lag", 0.002)
+    recorder.flush()
+    # Counts are handed over once; a second flush adds nothing
+    recorder.flush()
+
+    summary = summarize(pubsub.get_lineage_counts(["consumer"]))
+    edge = summary[("consumer", "producer")]
+    assert edge["read_latency"]["count"] == 11
+    assert edge["read_interval"]["count"] == 10
+    assert edge["staleness"]["count"] == 10
+    assert 0.3 <= edge["staleness"]["mean_s"] < 1.0
+    assert edge["staleness"]["p50_s"] == 0.5
+    assert edge["staleness"]["buckets"][-1]["count"] == 10
+    assert summarize(pubsub.get_lineage_counts(["producer"]))[("", "producer")]["persist_lag"]["p99_s"] == 0.0025
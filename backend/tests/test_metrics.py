@@ -0,0 +1,33 @@
+from cogs.metrics import GaugeFunc, Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("op_seconds", "Op latency", ("op",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.5, 0.5, 3.0):
+        histogram.labels("read").observe(seconds)
+    assert histogram.render() == [
+        "# HELP op_seconds Op latency",
+        "# TYPE op_seconds histogram",
+        'op_seconds_bucket{op="read",le="0.1"} 1',
+        'op_seconds_bucket{op="read",le="1.0"} 3',
+        'op_seconds_bucket{op="read",le="+Inf"} 4',
+        'op_seconds_sum{op="read"} 4.05',
+        'op_seconds_count{op="read"} 4',
+    ]
+
+
+def test_failing_gauge_does_not_break_the_scrape():
+    def broken():
+        raise RuntimeError("database is locked")
+
+    lines = GaugeFunc("queue_depth", "Depth", (), broken).render()
+    assert lines[-1] == "# collect failed: database is locked"
+
+
+def test_requests_are_recorded_by_route_template(client):
+    agent_id = client.post("/agents/", json={"code": "print('m')", "title": "metrics", "description": "x"}).json()["agent_id"]
+    assert client.get(f"/agents/{agent_id}").status_code == 200
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/agents/{agent_id}",status="200"}' in body
+    # One series per route, not per agent
+    assert f'route="/agents/{agent_id}"' not in body
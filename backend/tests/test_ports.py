@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+
+from cogs.database import AgentDatabase
+from cogs.ports import PortAllocator
+
+
+def make_db(tmp_path, agent_ids) -> AgentDatabase:
+    db = AgentDatabase(str(tmp_path / "agents.db"))
+    # Allocations of agents without a live lease are reclaimed as stale
+    for agent_id in agent_ids:
+        db.acquire_agent_lease(agent_id, "test-worker", ttl=60)
+    return db
+
+
+def test_concurrent_allocators_never_share_a_port(tmp_path):
+    agent_ids = [f"agent-{i}" for i in range(40)]
+    db = make_db(tmp_path, agent_ids)
+    # Two workers on the same host, each with its own in-memory free list
+    allocators = [PortAllocator(db, host="node-1", port_range="41000-41099") for _ in range(2)]
+    ports = {}
+    errors = []
+
+    def allocate(allocator, ids):
+        try:
+            for agent_id in ids:
+                ports[agent_id] = allocator.allocate(agent_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=allocate, args=(allocators[i % 2], agent_ids[i::4]))
+        for i in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(ports) == len(agent_ids)
+    assert len(set(ports.values())) == len(agent_ids)
+    assert db.list_port_allocations("node-1") == {port: agent_id for agent_id, port in ports.items()}
+
+
+def test_allocate_is_idempotent_and_release_frees_the_port(tmp_path):
+    db = make_db(tmp_path, ["a"])
+    allocator = PortAllocator(db, host="node-1", port_range="41100-41100")
+    port = allocator.allocate("a")
+    assert allocator.allocate("a") == port
+    assert allocator.release("a") == port
+    assert db.list_port_allocations("node-1") == {}
+    assert allocator.allocate("a") == port
+
+
+def test_stale_allocation_is_reclaimed_at_startup(tmp_path):
+    db = make_db(tmp_path, ["b"])
+    # Left behind by a worker that died; "gone" holds no lease
+    db.add_port_allocation("node-1", 41200, "gone")
+    allocator = PortAllocator(db, host="node-1", port_range="41200-41200")
+    assert allocator.allocate("b") == 41200
+    assert db.list_port_allocations("node-1") == {41200: "b"}
+
+
+def test_stale_allocation_is_reclaimed_when_the_range_runs_dry(tmp_path):
+    db = make_db(tmp_path, ["c"])
+    allocator = PortAllocator(db, host="node-1", port_range="41300-41300")
+    db.add_port_allocation("node-1", 41300, "gone")
+    assert allocator.allocate("c") == 41300
+    assert db.list_port_allocations("node-1") == {41300: "c"}
+
+
+def test_port_claimed_by_a_live_agent_is_skipped(tmp_path):
+    db = make_db(tmp_path, ["d", "other"])
+    allocator = PortAllocator(db, host="node-1", port_range="41400-41401")
+    # Claimed by another worker after this one built its free list
+    db.add_port_allocation("node-1", 41400, "other")
+    assert allocator.allocate("d") == 41401
+
+
+def test_reserved_ports_are_skipped_and_a_dry_range_raises(tmp_path):
+    db = make_db(tmp_path, ["e", "f", "g"])
+    allocator = PortAllocator(db, host="node-1", port_range="41500-41502")
+    allocator.reserve(41500, 41501, reason="metrics exporter")
+    assert allocator.allocate("e") == 41502
+    with pytest.raises(RuntimeError, match="No free agent ports"):
+        allocator.allocate("f")
+    # A released port returns to the free list; a reserved one never does
+    allocator.release("e")
+    assert allocator.allocate("g") == 41502
+    assert allocator.stats()["free"] == 0
@@ -0,0 +1,39 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from cogs import profiling
+
+
+def on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def test_profiles_are_stored_off_the_event_loop(tmp_path, monkeypatch):
+    store = profiling.ProfileStore(str(tmp_path))
+    calls = []
+    save = store.save
+
+    def recording_save(*args):
+        calls.append(on_event_loop())
+        return save(*args)
+
+    monkeypatch.setattr(store, "save", recording_save)
+    monkeypatch.setattr(profiling, "store", store)
+    app = FastAPI()
+
+    @app.get("/agents/search")
+    def search():
+        return {"agents": []}
+
+    app.add_middleware(profiling.ProfilingMiddleware, sample_rate=1.0, paths=("/agents/search",))
+    response = TestClient(app).get("/agents/search")
+
+    assert response.status_code == 200
+    assert calls == [False]
+    assert [p["id"] for p in store.list()] == [response.headers["x-profile-id"]]
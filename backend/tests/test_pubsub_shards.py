@@ -0,0 +1,39 @@
+import sqlite3
+
+from cogs.database import PubSubDatabase, shard_index
+
+
+def bar(agent_id: str, close: float, timestamp: float) -> tuple:
+    return (agent_id, close, close, close, close, 1.0, timestamp, "BTC")
+
+
+def test_shard_index_is_stable_and_spreads_agents():
+    agent_ids = [f"agent-{i}" for i in range(400)]
+    assert shard_index("agent-1", 4) == shard_index("agent-1", 4)
+    assert shard_index("agent-1", 1) == 0
+    counts = [sum(1 for a in agent_ids if shard_index(a, 4) == shard) for shard in range(4)]
+    assert min(counts) > 50
+
+
+def test_rows_land_on_their_agents_shard_and_read_back(tmp_path):
+    pubsub = PubSubDatabase(str(tmp_path / "pubsub.db"), shards=4)
+    agent_ids = [f"agent-{i}" for i in range(8)]
+    pubsub.insert_rows([bar(agent_id, 100.0 + t, float(t)) for agent_id in agent_ids for t in range(3)])
+    pubsub.insert_row("agent-0", 1, 1, 1, 103.0, 1, "BTC", timestamp=3.0)
+
+    for agent_id in agent_ids:
+        path = pubsub.shard_paths[shard_index(agent_id, 4)]
+        with sqlite3.connect(path) as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM ohlcv_data WHERE agent_id = ?", (agent_id,)).fetchone()[0]
+        assert stored == (4 if agent_id == "agent-0" else 3)
+    assert pubsub.get_latest_row("agent-0")["close_price"] == 103.0
+    assert [row[3] for row in pubsub.get_history("agent-5")] == [100.0, 101.0, 102.0]
+    # Queries not scoped to one agent add up every shard
+    assert pubsub.inserted_row_count() == 25
+
+
+def test_shard_count_is_remembered(tmp_path, capsys):
+    path = str(tmp_path / "pubsub.db")
+    PubSubDatabase(path, shards=4)
+    PubSubDatabase(path, shards=2)
+    assert "created with 4 shard(s)" in capsys.readouterr().out
@@ -0,0 +1,78 @@
+from uuid import UUID
+
+from cogs.database import AgentDatabase
+from cogs.rating_indexer import CHECKPOINT_NAME, RATING_SUBMITTED_TOPIC, RatingIndexer, RpcResponseError
+
+AGENT_UUID = "12345678-1234-5678-1234-567812345678"
+
+
+def rating_log(item_id: int, rating: int, block: int) -> dict:
+    return {
+        "topics": [RATING_SUBMITTED_TOPIC, hex(item_id)],
+        "data": "0x" + f"{rating:064x}" + "00" * 12 + "ab" * 20,
+        "blockNumber": hex(block),
+    }
+
+
+class FakeNode:
+    """eth_blockNumber/eth_getLogs over an in-memory log list; refuses ranges wider than max_range."""
+
+    def __init__(self, head: int, logs: list, max_range: int = 10_000):
+        self.head = head
+        self.logs = logs
+        self.max_range = max_range
+        self.ranges = []
+
+    def call(self, method: str, params: list):
+        if method == "eth_blockNumber":
+            return hex(self.head)
+        start, end = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+        if end - start + 1 > self.max_range:
+            raise RpcResponseError("query returned more than 10000 results")
+        self.ranges.append((start, end))
+        return [log for log in self.logs if start <= int(log["blockNumber"], 16) <= end]
+
+
+def make_indexer(tmp_path, node: FakeNode, updates: list) -> RatingIndexer:
+    db = AgentDatabase(str(tmp_path / "agents.db"))
+    db.add_agent("7", "print('seven')", title="numeric id")
+    db.add_agent(AGENT_UUID, "print('uuid')", title="uuid id")
+    indexer = RatingIndexer(db, "http://node.invalid", batch_blocks=64, on_update=updates.append)
+    indexer.rpc = node
+    return indexer
+
+
+def test_ratings_are_summed_per_agent_and_checkpointed(tmp_path):
+    node = FakeNode(100, [
+        rating_log(7, 5, 10), rating_log(7, 3, 20), rating_log(UUID(AGENT_UUID).int, 4, 90), rating_log(999, 1, 95),
+    ])
+    updates = []
+    indexer = make_indexer(tmp_path, node, updates)
+    assert indexer.run_once() == 4
+    assert updates == [{"7": (8, 2)}, {AGENT_UUID: (4, 1)}]
+    assert indexer.db.get_checkpoint(CHECKPOINT_NAME) == 100
+    ratings = indexer.db.get_chain_ratings()
+    assert (ratings["7"]["total"], ratings["7"]["count"]) == (8, 2)
+
+    # Nothing new: the next pass resumes after the checkpoint and applies nothing
+    node.head = 120
+    assert indexer.run_once() == 0
+    assert node.ranges[-1] == (101, 120)
+    assert len(updates) == 2
+
+
+def test_refused_ranges_are_halved(tmp_path):
+    node = FakeNode(100, [rating_log(7, 5, 50)], max_range=20)
+    updates = []
+    indexer = make_indexer(tmp_path, node, updates)
+    assert indexer.run_once() == 1
+    assert all(end - start + 1 <= 20 for start, end in node.ranges)
+    assert node.ranges[-1][1] == 100
+    assert updates == [{"7": (5, 1)}]
+
+
+def test_a_range_indexed_by_another_worker_is_not_counted_twice(tmp_path):
+    indexer = make_indexer(tmp_path, FakeNode(0, []), [])
+    assert indexer.db.apply_rating_batch(CHECKPOINT_NAME, 0, 10, {"7": (5, 1)}, {"7": "7"}) == {"7": (5, 1)}
+    assert indexer.db.apply_rating_batch(CHECKPOINT_NAME, 0, 10, {"7": (5, 1)}, {"7": "7"}) is None
+    assert indexer.db.get_chain_ratings()["7"]["count"] == 1
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+from cogs import resources
+from cogs.resources import ResourceMonitor, limited_command, read_proc_stats
+
+
+def test_reads_stats_of_a_live_process():
+    stats = read_proc_stats(os.getpid())
+    assert stats["pid"] == os.getpid()
+    assert stats["rss_bytes"] > 0
+    assert stats["nice"] == os.getpriority(os.PRIO_PROCESS, os.getpid())
+
+
+def test_exited_process_has_no_stats():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    assert read_proc_stats(process.pid) is None
+
+
+def test_process_exiting_between_reads_is_skipped(monkeypatch):
+    gone = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    real_getpriority = os.getpriority
+
+    def getpriority(which, pid):
+        if pid == gone.pid:
+            # Exited after /proc/<pid>/stat and status were read
+            raise ProcessLookupError(pid)
+        return real_getpriority(which, pid)
+
+    monkeypatch.setattr(resources.os, "getpriority", getpriority)
+    try:
+        monitor = ResourceMonitor(lambda: {"gone": gone.pid, "self": os.getpid()})
+        monitor.sample()
+        assert monitor.get("gone") is None
+        assert monitor.get("self")["pid"] == os.getpid()
+    finally:
+        gone.kill()
+        gone.wait()
+
+
+def test_limited_command_applies_limits_in_the_child():
+    command = limited_command([sys.executable, "-c", "import os; print(os.getpriority(os.PRIO_PROCESS, 0))"], {"nice": 5})
+    base = os.getpriority(os.PRIO_PROCESS, 0)
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run(command, cwd=backend_dir, capture_output=True, text=True, check=True).stdout
+    assert int(out) == min(19, base + 5)
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from cogs.spawn_scheduler import AdmissionRejected, SpawnScheduler
+from cogs.subsystems import SUBSYSTEMS
+
+
+def full_scheduler(**kwargs) -> SpawnScheduler:
+    """A scheduler whose single running slot is taken, so nothing queued is admitted."""
+    return SpawnScheduler(lambda: {"busy": None}, max_running=1, **kwargs)
+
+
+def test_full_queue_rejects_with_retry_after():
+    spawns = full_scheduler(queue_size=2)
+    queued = [spawns.submit(f"a{i}", None, 0, lambda: True) for i in range(2)]
+    rejected = spawns.submit("a2", None, 0, lambda: True)
+    with pytest.raises(AdmissionRejected) as e:
+        rejected.result(timeout=1)
+    assert e.value.retry_after >= 1
+    assert not any(future.done() for future in queued)
+    assert spawns.stats()["counters"]["rejected"] == 1
+    # Asking again for a queued agent shares its place in the queue
+    assert spawns.submit("a0", None, 0, lambda: True) is queued[0]
+
+
+def test_queued_request_times_out():
+    spawns = full_scheduler(queue_timeout=0.1)
+    with pytest.raises(AdmissionRejected, match="Timed out"):
+        spawns.submit("a", None, 0, lambda: True).result(timeout=5)
+    assert spawns.stats()["counters"]["timed_out"] == 1
+
+
+def test_higher_priority_and_creator_limits_decide_the_order():
+    running = {}
+    lock = threading.Lock()
+    order = []
+
+    def spawn(agent_id, creator):
+        with lock:
+            order.append(agent_id)
+            running[agent_id] = creator
+        return True
+
+    spawns = SpawnScheduler(lambda: dict(running), max_running=3, max_per_creator=1, max_inflight=1)
+    futures = [
+        spawns.submit("low", "bob", 1, lambda: spawn("low", "bob")),
+        spawns.submit("high", "alice", 5, lambda: spawn("high", "alice")),
+        spawns.submit("second-alice", "alice", 4, lambda: spawn("second-alice", "alice")),
+    ]
+    assert all(future.result(timeout=5) for future in futures[:2])
+    # alice is at her limit until her first agent stops
+    assert not futures[2].done()
+    with lock:
+        del running["high"]
+    spawns.notify()
+    assert futures[2].result(timeout=5)
+    assert order == ["high", "low", "second-alice"]
+
+
+def test_api_answers_429_with_retry_after(client, monkeypatch):
+    response = client.post("/agents/", json={"code": "print('hello')", "title": "admission", "description": "x"})
+    agent_id = response.json()["agent_id"]
+    manager = SUBSYSTEMS["manager"].get()
+    monkeypatch.setattr(manager, "spawns", full_scheduler(queue_size=0))
+
+    for url in (f"/agents/{agent_id}/start", f"/agents/deploy?agent_id={agent_id}"):
+        response = client.post(url)
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
@@ -0,0 +1,30 @@
+import pytest
+
+from cogs import strategy_manager
+from cogs.database import AgentDatabase
+from cogs.shared_state import SharedRuntimeState
+from cogs.strategy_manager import StrategyManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = StrategyManager(AgentDatabase(str(tmp_path / "agents.db")))
+    yield manager
+    manager.shutdown()
+
+
+def test_failed_deploy_frees_the_port_and_the_lease(manager, monkeypatch):
+    agent_id = manager.create_agent(code="print('hello')", title="deploy-fails")
+
+    def broken_build(store, agent):
+        raise RuntimeError("artifact build failed")
+
+    monkeypatch.setattr(strategy_manager, "build_agent_artifact", broken_build)
+    with pytest.raises(RuntimeError):
+        manager._deploy_agent(agent_id)
+
+    assert manager.ports.port_of(agent_id) is None
+    assert manager.db.list_port_allocations(manager.ports.host) == {}
+    assert manager.db.get_agent_runtime(agent_id) is None
+    # Another API worker can take the agent over at once
+    assert SharedRuntimeState(manager.db, owner="other-worker").acquire(agent_id)
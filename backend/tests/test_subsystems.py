@@ -0,0 +1,55 @@
+import threading
+import time
+
+import pytest
+
+from cogs.subsystems import LazyProxy, Subsystem
+
+
+class Slow:
+    built = 0
+
+    def __init__(self):
+        time.sleep(0.1)
+        Slow.built += 1
+        self.answer = 42
+
+
+def test_concurrent_callers_share_one_build():
+    Slow.built = 0
+    subsystem = Subsystem("slow", Slow)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(subsystem.get())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert Slow.built == 1
+    assert len({id(result) for result in results}) == 1
+    assert subsystem.status()["state"] == "ready"
+
+
+def test_failed_build_is_retried_on_next_use():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("database is locked")
+        return Slow()
+
+    subsystem = Subsystem("flaky", flaky)
+    proxy = LazyProxy(subsystem)
+    assert subsystem.state == "cold"
+    with pytest.raises(OSError):
+        proxy.answer
+    assert subsystem.status()["error"] == "OSError: database is locked"
+    assert proxy.answer == 42
+    assert subsystem.state == "ready" and len(attempts) == 2
+
+
+def test_first_request_builds_the_manager_and_ready_reports_it(client):
+    assert client.get("/agents/spawns").status_code == 200
+    report = client.get("/ready").json()
+    assert report["subsystems"]["manager"]["state"] == "ready"
+    assert report["subsystems"]["manager"]["seconds"] is not None
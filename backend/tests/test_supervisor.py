@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import Process
+
+from cogs.supervisor import AgentSupervisor
+
+
+def _exit_with(code: int):
+    os._exit(code)
+
+
+def _sleep(seconds: float):
+    time.sleep(seconds)
+
+
+class Exits:
+    """on_exit callback that records (agent_id, status, exitcode) and lets tests wait for them."""
+
+    def __init__(self):
+        self.seen = {}
+        self._cond = threading.Condition()
+
+    def __call__(self, agent_id, kind, status, exitcode):
+        with self._cond:
+            self.seen[agent_id] = (status, exitcode)
+            self._cond.notify_all()
+
+    def wait_for(self, *agent_ids, timeout: float = 5.0) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: all(a in self.seen for a in agent_ids), timeout)
+
+
+def make_supervisor(exits: Exits) -> AgentSupervisor:
+    supervisor = AgentSupervisor(on_exit=exits, on_restart=lambda agent_id, kind: None, poll_interval=0.05)
+    supervisor.start()
+    return supervisor
+
+
+def test_reports_exit_of_deployed_process():
+    exits = Exits()
+    supervisor = make_supervisor(exits)
+    try:
+        ok = subprocess.Popen([sys.executable, "-c", "pass"])
+        failing = subprocess.Popen([sys.executable, "-c", "raise SystemExit(3)"])
+        supervisor.watch("ok", "deployed", ok)
+        supervisor.watch("failing", "deployed", failing)
+        assert exits.wait_for("ok", "failing")
+        assert exits.seen["ok"] == ("exited", 0)
+        assert exits.seen["failing"] == ("crashed", 3)
+        assert supervisor.stats()["supervised"] == 0
+    finally:
+        supervisor.shutdown()
+
+
+def test_reports_local_exit_reaped_by_a_later_process_start():
+    # Process.start() reaps every finished multiprocessing child before forking,
+    # so waitid() never sees this exit; the periodic sweep still reports it
+    exits = Exits()
+    supervisor = AgentSupervisor(on_exit=exits, on_restart=lambda agent_id, kind: None)
+    first = Process(target=_exit_with, args=(2,))
+    first.start()
+    supervisor.watch("first", "local", first)
+    while first.is_alive():
+        time.sleep(0.01)
+    second = Process(target=_sleep, args=(5,))
+    second.start()
+    try:
+        supervisor.watch("second", "local", second)
+        supervisor._reap()
+        assert exits.seen == {}
+        supervisor._reap(sweep=True)
+        assert exits.seen == {"first": ("crashed", 2)}
+        assert supervisor.status("second")["status"] == "running"
+    finally:
+        second.terminate()
+        second.join()
+
+
+class IdleHandle:
+    """Stands in for a running agent and counts how often it is polled."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.polls = 0
+
+    def poll(self):
+        self.polls += 1
+        return None
+
+
+def test_wake_up_reaps_only_exited_children():
+    exits = Exits()
+    supervisor = AgentSupervisor(on_exit=exits, on_restart=lambda agent_id, kind: None)
+    idle = [IdleHandle(pid) for pid in range(10_000_000, 10_000_200)]
+    for i, handle in enumerate(idle):
+        supervisor.watch(f"idle{i}", "deployed", handle)
+    done = subprocess.Popen([sys.executable, "-c", "pass"])
+    supervisor.watch("done", "deployed", done)
+    # Exited but not yet reaped, as when SIGCHLD wakes the supervisor
+    while os.waitid(os.P_PID, done.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None:
+        time.sleep(0.01)
+    supervisor._reap()
+    assert exits.seen == {"done": ("exited", 0)}
+    assert sum(handle.polls for handle in idle) == 0
+
+
+def test_foreign_child_does_not_hide_watched_exits():
+    exits = Exits()
+    supervisor = make_supervisor(exits)
+    # Exited but not reaped: waitid(P_ALL) keeps returning it until its owner waits
+    foreign = subprocess.Popen([sys.executable, "-c", "pass"])
+    try:
+        time.sleep(0.3)
+        watched = [subprocess.Popen([sys.executable, "-c", "pass"]) for _ in range(3)]
+        for i, handle in enumerate(watched):
+            supervisor.watch(f"a{i}", "deployed", handle)
+        assert exits.wait_for("a0", "a1", "a2")
+        time.sleep(0.2)
+        assert supervisor.stats()["counters"]["foreign_children"] == 1
+    finally:
+        supervisor.shutdown()
+        foreign.wait()
+
+
+def test_unwatched_process_is_not_reported():
+    exits = Exits()
+    supervisor = make_supervisor(exits)
+    try:
+        handle = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(0.3)"])
+        supervisor.watch("stopped", "deployed", handle)
+        supervisor.unwatch("stopped")
+        handle.wait()
+        time.sleep(0.3)
+        assert "stopped" not in exits.seen
+    finally:
+        supervisor.shutdown()
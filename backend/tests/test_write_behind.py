@@ -0,0 +1,67 @@
+import pytest
+
+from cogs.database import AgentDatabase
+from cogs.strategy_manager import StrategyManager
+from cogs.write_behind import ReputationBuffer
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = AgentDatabase(str(tmp_path / "agents.db"))
+    db.add_agent("a", "print('a')", title="rated")
+    return db
+
+
+def stored(db):
+    agent = db.get_agent("a")
+    return {key: agent[key] for key in ("reputation", "rating_total", "rating_count")}
+
+
+def test_reads_see_buffered_ratings_before_the_flush(db):
+    buffer = ReputationBuffer(db, interval=60)
+    buffer.add_rating("a", 4.0)
+    buffer.add_rating("a", 2.0)
+    agent = buffer.overlay(db.get_agent("a"))
+    assert (agent["reputation"], agent["rating_total"], agent["rating_count"]) == (3.0, 6.0, 2)
+    assert stored(db)["rating_count"] == 0
+
+
+def test_flushed_ratings_are_not_counted_twice(db):
+    seen = []
+    buffer = ReputationBuffer(db, interval=60)
+    # A reader reloading the row while on_flush runs must see each rating once
+    buffer.on_flush = lambda written: seen.append(buffer.overlay(db.get_agent("a")))
+    buffer.add_rating("a", 4.0)
+    assert buffer.flush() == 1
+    assert stored(db) == {"reputation": 4.0, "rating_total": 4.0, "rating_count": 1}
+    assert buffer.overlay(db.get_agent("a"))["rating_count"] == 1
+    assert seen[0]["rating_count"] == 1
+
+
+def test_failed_flush_keeps_the_batch(db, monkeypatch):
+    buffer = ReputationBuffer(db, interval=60)
+    buffer.add_rating("a", 4.0)
+
+    def broken(updates):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(db, "apply_reputation_updates", broken)
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+    buffer.add_rating("a", 2.0)
+    monkeypatch.undo()
+    assert buffer.flush() == 1
+    assert stored(db) == {"reputation": 3.0, "rating_total": 6.0, "rating_count": 2}
+
+
+def test_flush_invalidates_the_catalog(tmp_path):
+    manager = StrategyManager(AgentDatabase(str(tmp_path / "agents.db")))
+    try:
+        agent_id = manager.create_agent(code="print('a')", title="rated")
+        manager.rate_agent(agent_id, 5.0)
+        version = manager.catalog.version
+        manager.reputations.flush()
+        assert manager.catalog.version > version
+        assert manager.registry.record(agent_id)["rating_count"] == 1
+    finally:
+        manager.shutdown()